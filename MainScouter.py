@@ -1,10 +1,68 @@
-from flask import Flask, request, session
-import pandas as pd
-from itertools import combinations
+from flask import Flask, Response, request, session
+import numpy as np
 import io
+import json
+from pairEngine import team_pairs, PairPager, best_partners, top_pair_check
+from datasetCache import Dataset, DatasetCache, ResultCache, content_key, stream_key
+from datasetStore import DatasetStore
+from scoutingLoader import stream_scouting_sheets
+from pairRanking import PairRanking, count_role_pairs_above
+from stageTimer import StageTimer
+from oprSolver import load_match_results, solve_match_results
+from matchPredictor import predict_matchups, team_spread, DEFAULT_SIMULATIONS, MAX_SIMULATIONS
+import qualsForecast
+from qualsForecast import Standings, add_teams, forecast_rankings, standings_from_results
+from draftSimulator import DraftSimulator, POLICIES, DEFAULT_TEMPERATURE
+from sessionStore import ServerSessionInterface
+from jobQueue import JobQueue, QueueFull
+from liveRanking import LiveRankings
+from allianceOptimizer import top_alliances_with, score_alliances
+from matchIngest import MatchFeeds, MAX_BATCH
 
 app = Flask(__name__)
 app.secret_key = "CHANGE_ME_TO_SOMETHING_RANDOM"  # Replace with a secure key for production
+# Session data (dataset key, removed teams, my team, ...) stays on the server; the cookie only has an ID.
+app.session_interface = ServerSessionInterface()
+
+# Parsed uploads, keyed by a hash of the file contents. The session only holds the key.
+# Uploads are also saved to disk and reopened at startup, so a restart keeps them.
+dataset_store = DatasetStore()
+dataset_cache = DatasetCache(store=dataset_store)
+dataset_store.restore(dataset_cache)
+
+# Match observations posted to /matches, one feed per live channel, logged in the data directory.
+match_feeds = MatchFeeds(dataset_store.root)
+
+# Rendered /analyze results, keyed by (dataset, event, match feed version, my team, removed teams).
+result_cache = ResultCache()
+
+# Per-stage timings (Server-Timing header and /metrics), on when SCOUTER_TIMING=1.
+timer = StageTimer().init_app(app)
+
+# Worker processes for Monte Carlo and OPR solving, plus GET /jobs/<id> for polling.
+jobs = JobQueue().init_app(app)
+
+# Rough cost per byte of a match results file for the job queue (parsing plus the solve).
+OPR_COST_PER_BYTE = 20
+
+# Top-10 rankings pushed to open pages (GET /stream) when a dataset changes.
+live = LiveRankings()
+
+# Pools up to this size keep every pair ranked for fast re-ranking during selection.
+# Bigger sheets (championship divisions, season exports) walk pairs lazily, best first.
+RANKING_MAX_TEAMS = 600
+
+# How many lazy pair pagers (one per removed-team set) each big dataset keeps.
+MAX_PAGERS = 4
+
+# How many draft simulators (one per captains/policy setup) each dataset keeps.
+MAX_DRAFTS = 4
+
+# Most captains /draft searches a draft for (alliance selection has at most 8).
+MAX_CAPTAINS = 8
+
+# Largest alliance /alliances ranks (pairs are the default elsewhere).
+MAX_ALLIANCE_SIZE = 4
 
 HTML_CODE = """
 <!DOCTYPE html>
@@ -86,6 +144,14 @@ HTML_CODE = """
       font-size: 0.9em;
       color: #555;
     }
+    /* Live ranking updates */
+    li.entered {
+      background-color: #fff3c4;
+    }
+    #liveStatus {
+      font-size: 0.9em;
+      color: #555;
+    }
   </style>
 </head>
 <body>
@@ -98,9 +164,15 @@ HTML_CODE = """
         <input type="file" id="csvFile" name="csvFile" accept=".csv">
       </div>
       <div>
-        <label for="myTeam">Enter your team number (include .0 if applicable):</label>
+        <label for="myTeam">Enter your team number (11770 and 11770.0 both work):</label>
         <input type="text" id="myTeam" name="myTeam" value="11770" required>
       </div>
+      <div>
+        <label for="event">Event (for sheets with an Event column):</label>
+        <select id="event" name="event">
+          <option value="">All events</option>
+        </select>
+      </div>
       
       <div class="dropdown-container">
         <label for="removeTeam">Select teams to eliminate from pairing:</label>
@@ -112,6 +184,15 @@ HTML_CODE = """
       
       <button type="submit">Run Analysis</button>
     </form>
+
+    <!-- Optional: compute OPR from raw match results instead of the sheet's OPR columns -->
+    <form id="matchForm" enctype="multipart/form-data">
+      <div>
+        <label for="matchFile">Or compute OPR from match results (Red 1, Red 2, Blue 1, Blue 2, Red/Blue Sample, Red/Blue Specimen):</label>
+        <input type="file" id="matchFile" name="matchFile" accept=".csv">
+      </div>
+      <button type="submit">Compute OPR</button>
+    </form>
     
     <div id="resultContainer" class="output-container"></div>
   </div>
@@ -138,15 +219,187 @@ HTML_CODE = """
       });
     }
 
+    // Fill the event dropdown from the sheet's events, keeping the one being analyzed selected.
+    function populateEvents(events, current) {
+      const eventSelect = document.getElementById('event');
+      eventSelect.innerHTML = "<option value=''>All events</option>";
+      (events || []).forEach(name => {
+        const opt = document.createElement("option");
+        opt.value = name;
+        opt.textContent = name;
+        opt.selected = name === current;
+        eventSelect.appendChild(opt);
+      });
+    }
+
+    // Live top-10 updates for the dataset on screen (Server-Sent Events).
+    let liveSource = null;
+    let liveChannel = null;
+
+    function watchRanking(channel) {
+      if (!channel || channel === liveChannel) return;
+      if (liveSource) liveSource.close();
+      liveChannel = channel;
+      liveSource = new EventSource("/stream?channel=" + encodeURIComponent(channel));
+      liveSource.addEventListener("ranking", e => showRanking(JSON.parse(e.data)));
+    }
+
+    // Redraw the top pairs list from a ranking update, marking what changed.
+    function showRanking(data) {
+      const list = document.getElementById("topPairs");
+      if (!list) return;
+      const entered = new Set(data.entered.map(p => p.rank));
+      const moved = {};
+      data.moved.forEach(m => { moved[m.to] = m.from; });
+      list.innerHTML = "";
+      data.top.forEach((p, i) => {
+        const rank = i + 1;
+        const li = document.createElement("li");
+        let text = rank + ". " + p.team1 + " (" + p.role1 + ") & " + p.team2 +
+          " (" + p.role2 + ") => Combined OPR: " + p.score.toFixed(2) +
+          " (Option A: " + p.optionA.toFixed(2) + ", Option B: " + p.optionB.toFixed(2) + ")";
+        if (moved[rank]) text += moved[rank] > rank ? " \u25B2" + (moved[rank] - rank) : " \u25BC" + (rank - moved[rank]);
+        li.textContent = text;
+        if (entered.has(rank)) li.classList.add("entered");
+        list.appendChild(li);
+      });
+      // Later pages no longer follow on from this top 10; start them again.
+      const more = document.querySelector("button[data-page]");
+      if (more) more.dataset.page = 1;
+      let status = document.getElementById("liveStatus");
+      if (!status) {
+        status = document.createElement("p");
+        status.id = "liveStatus";
+        list.after(status);
+      }
+      const left = data.left.map(p => p.team1 + " & " + p.team2);
+      status.textContent = "Updated (" + data.reason + "): " + data.entered.length + " pair(s) entered, " +
+        (left.length ? left.join(", ") + " left" : "none left") + ", " + data.moved.length + " moved.";
+    }
+
+    // Fetch the next page of overall pairs and append it to the top pairs list.
+    function loadMorePairs(button) {
+      const page = parseInt(button.dataset.page, 10);
+      fetch("/pairs?page=" + page)
+        .then(response => response.json())
+        .then(data => {
+          const list = document.getElementById("topPairs");
+          data.pairs.forEach((p, i) => {
+            const li = document.createElement("li");
+            li.textContent = (data.start + i) + ". " + p.team1 + " (" + p.role1 + ") & " + p.team2 +
+              " (" + p.role2 + ") => Combined OPR: " + p.score.toFixed(2) +
+              " (Option A: " + p.optionA.toFixed(2) + ", Option B: " + p.optionB.toFixed(2) + ")";
+            list.appendChild(li);
+          });
+          button.dataset.page = page + 1;
+          if (!data.hasMore) button.remove();
+        })
+        .catch(err => {
+          button.textContent = "Error: " + err;
+        });
+    }
+
+    // Simulate the top pairs against each other and list each one's average win chance.
+    function loadPredictions(button) {
+      fetch("/predict")
+        .then(response => response.json())
+        .then(data => {
+          if (data.error) {
+            button.textContent = data.error;
+            return;
+          }
+          const list = document.createElement("ul");
+          data.pairs.forEach(p => {
+            const li = document.createElement("li");
+            const rate = p.winRate === null ? "n/a" : (100 * p.winRate).toFixed(1) + "%";
+            li.textContent = p.team1 + " & " + p.team2 + ": wins " + rate + " vs. the other top pairs" +
+              " (scores " + p.mean.toFixed(1) + " \u00b1 " + p.std.toFixed(1) + ")";
+            list.appendChild(li);
+          });
+          button.replaceWith(list);
+        })
+        .catch(err => {
+          button.textContent = "Error: " + err;
+        });
+    }
+
+    // List the best three-team alliances, overall and with my team.
+    function loadAlliances(button) {
+      fetch("/alliances?size=3")
+        .then(response => response.json())
+        .then(data => {
+          if (data.error) {
+            button.textContent = data.error;
+            return;
+          }
+          const box = document.createElement("div");
+          const describe = a => a.teams.map((t, i) => t + " (" + a.roles[i] + ")").join(" & ") +
+            " => Combined OPR: " + a.score.toFixed(2);
+          const addList = (title, rows) => {
+            const heading = document.createElement("h3");
+            heading.textContent = title;
+            const list = document.createElement("ol");
+            rows.forEach(a => {
+              const li = document.createElement("li");
+              li.textContent = describe(a);
+              list.appendChild(li);
+            });
+            box.append(heading, list);
+          };
+          addList("Top Three-Team Alliances", data.alliances);
+          if (data.myTeam) addList("Top Three-Team Alliances with Team " + data.myTeam, data.myAlliances);
+          button.replaceWith(box);
+        })
+        .catch(err => {
+          button.textContent = "Error: " + err;
+        });
+    }
+
+    // Compute OPR from match results, then run the analysis on the computed values.
+    document.getElementById("matchForm").addEventListener("submit", function(e) {
+      e.preventDefault();
+      fetch("/opr", { method: "POST", body: new FormData(document.getElementById("matchForm")) })
+        .then(response => response.json())
+        .then(data => {
+          if (data.error) {
+            document.getElementById("resultContainer").innerHTML = "<p>" + data.error + "</p>";
+            return;
+          }
+          document.getElementById("csvFile").value = "";
+          document.getElementById("oprForm").requestSubmit();
+        })
+        .catch(err => {
+          document.getElementById("resultContainer").innerHTML = "<p>Error: " + err + "</p>";
+        });
+    });
+
+    // ETag of the result on screen; an unchanged re-run gets a 304 and keeps it.
+    let resultEtag = null;
+
     // Intercept form submission and update the page with JSON response.
     document.getElementById("oprForm").addEventListener("submit", function(e) {
       e.preventDefault();
       const formData = new FormData(document.getElementById("oprForm"));
-      fetch("/analyze", { method: "POST", body: formData })
-        .then(response => response.json())
+      const headers = {};
+      if (resultEtag && !document.getElementById("csvFile").value) {
+        headers["If-None-Match"] = resultEtag;
+      }
+      fetch("/analyze", { method: "POST", body: formData, headers: headers })
+        .then(response => {
+          if (response.status === 304) {
+            return null;
+          }
+          resultEtag = response.headers.get("ETag");
+          return response.json();
+        })
         .then(data => {
+          if (!data) {
+            return;
+          }
           document.getElementById("resultContainer").innerHTML = data.resultHTML;
           populateDropdown(data.teams, data.removedTeams);
+          populateEvents(data.events, data.event);
+          watchRanking(data.channel);
         })
         .catch(err => {
           document.getElementById("resultContainer").innerHTML = "<p>Error: " + err + "</p>";
@@ -161,38 +414,161 @@ HTML_CODE = """
 def index():
     return HTML_CODE
 
+def get_ranking(dataset):
+    """
+    Returns the dataset's incremental PairRanking, building it on first use,
+    or None if the pool is too big to rank every pair.
+    """
+    if len(dataset) > RANKING_MAX_TEAMS:
+        return None
+    if dataset.ranking is None:
+        dataset.ranking = PairRanking(dataset.sample, dataset.specimen)
+        dataset_cache.trim()
+    return dataset.ranking
+
+def get_pager(dataset, alive):
+    """
+    Returns the dataset's PairPager for this set of teams, reusing it across
+    requests so "Show more pairs" never recomputes earlier pages.
+    """
+    key = tuple(np.flatnonzero(~alive).tolist())
+    pager = dataset.pagers.get(key)
+    if pager is None:
+        pager = PairPager(dataset.teams, dataset.sample, dataset.specimen, alive)
+        dataset.pagers[key] = pager
+        while len(dataset.pagers) > MAX_PAGERS:
+            dataset.pagers.popitem(last=False)
+    else:
+        dataset.pagers.move_to_end(key)
+    return pager
+
+def get_partners(dataset, alive):
+    """
+    Returns the dataset's best-partner index (pairEngine.BestPartners) for the
+    teams still in the pool, rebuilding it in O(n) when the pool changes.
+    """
+    key = tuple(np.flatnonzero(~alive).tolist())
+    if dataset.partners is None or dataset.partners[0] != key:
+        dataset.partners = (key, best_partners(dataset.sample, dataset.specimen, alive))
+    return dataset.partners[1]
+
+def page_pairs(dataset, alive, page, size=10):
+    """
+    Returns (pairs, has_more) for one page of the overall pair ranking,
+    where pairs are the usual 7-tuples.
+    """
+    with timer.stage("ranking") as stage:
+        ranking = get_ranking(dataset)
+        if ranking is not None:
+            stage.count(pairs=len(ranking.best))
+    if ranking is not None:
+        # Only pairs of teams whose removal state changed are touched.
+        with ranking.lock:
+            ranking.set_removed(np.flatnonzero(~alive))
+            pairs = ranking.top_pairs(dataset.teams, k=size, start=page * size)
+            has_more = len(ranking) > (page + 1) * size
+        return pairs, has_more
+    pager = get_pager(dataset, alive)
+    return pager.page(page, size), pager.has_more(page, size)
+
+def pair_json(pair):
+    """
+    Converts a pair 7-tuple into a JSON-friendly dict.
+    """
+    t1, t2, r1, r2, score, optA, optB = pair
+    return {
+        "team1": t1, "team2": t2, "role1": r1, "role2": r2,
+        "score": float(score), "optionA": float(optA), "optionB": float(optB)
+    }
+
+def parse_scouting_csv(stream):
+    """
+    Streams an uploaded scouting sheet (binary file object) into a Dataset,
+    with one Dataset per event in dataset.events.
+    """
+    with timer.stage("parse") as stage:
+        sheets = stream_scouting_sheets(stream)
+        stage.count(events=len(sheets) - 1)
+    with timer.stage("numeric"):
+        return Dataset.from_sheets(sheets)
+
+def session_dataset():
+    """
+    The session's dataset (narrowed to the session's event, if one is picked,
+    with any match observations applied), or None.
+    """
+    dataset = dataset_cache.get(session.get("dataset_key"))
+    if dataset is None:
+        return None
+    dataset = dataset.events.get(session.get("event"), dataset)
+    feed = match_feeds.get(live_channel(), dataset)
+    return feed.dataset if feed is not None else dataset
+
+def live_channel():
+    """
+    The live ranking channel the session follows: its upload (or match results
+    file, through every match added since) and event.
+    """
+    channel = session.get("channel") or session.get("dataset_key")
+    event = session.get("event")
+    return f"{channel}:{event}" if event else channel
+
+def publish_ranking(dataset, reason, pairs=None):
+    """
+    Publishes the session's current top 10 (`pairs`, computed if not given) to
+    its live channel.
+    """
+    removed = session.get("removed_teams", [])
+    if pairs is None:
+        pairs, _ = page_pairs(dataset, dataset.alive_mask(removed), 0)
+    live.publish(
+        live_channel(), [pair_json(pair) for pair in pairs], reason,
+        datasetKey=session["dataset_key"], removed=sorted(set(removed))
+    )
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """
-    1) If a new CSV file is uploaded, parse it and store its text in session.
-    2) Otherwise, retrieve the CSV data from session.
+    1) If a new CSV file is uploaded, parse it (unless the same file is already cached)
+       and store only its dataset key in session.
+    2) Otherwise, look up the parsed dataset from the key in session, narrowed to the
+       'event' picked in the form (all events when blank).
     3) Read the 'myTeam' input (and store it in session).
     4) Persist a removal list in session; any teams submitted for removal are added permanently.
     5) Remove those teams from pairing calculations.
     6) Return JSON with the analysis result HTML, full list of teams, and removed teams.
     """
-    # 1) CSV file upload handling.
+    # 1) CSV file upload handling. The upload is hashed and parsed in chunks.
     file = request.files.get("csvFile")
     if file and file.filename:
-        try:
-            df = pd.read_csv(file, header=1)
-        except Exception as e:
-            return {"resultHTML": f"<p>Error reading CSV: {e}</p>", "teams": [], "removedTeams": []}
-        session["csv_data"] = df.to_csv(index=False)
+        dataset_key = stream_key(file.stream)
+        if dataset_cache.get(dataset_key) is None:
+            try:
+                dataset = dataset_cache.put(dataset_key, parse_scouting_csv(file.stream))
+            except Exception as e:
+                return {"resultHTML": f"<p>Error reading CSV: {e}</p>", "teams": [], "removedTeams": []}
+            dataset_store.save(dataset_key, dataset)
+        session["dataset_key"] = dataset_key
+        session["channel"] = dataset_key
         # Initialize removal list when a new CSV is uploaded.
         session["removed_teams"] = []
-    else:
-        if "csv_data" not in session:
-            return {
-                "resultHTML": "<p>No CSV data found. Please upload a CSV first.</p>",
-                "teams": [],
-                "removedTeams": []
-            }
-        csv_text = session["csv_data"]
-        df = pd.read_csv(io.StringIO(csv_text))
+    elif "dataset_key" not in session:
+        return {
+            "resultHTML": "<p>No CSV data found. Please upload a CSV first.</p>",
+            "teams": [],
+            "removedTeams": []
+        }
     
-    # 2) Clean up column names.
-    df.columns = df.columns.str.strip()
+    # 2) Get the parsed dataset from the server-side cache, narrowed to the picked event.
+    session["event"] = request.form.get("event", "").strip() or None
+    dataset = session_dataset()
+    events = dataset_cache.get(session["dataset_key"]).events if dataset is not None else {}
+    if dataset is None:
+        return {
+            "resultHTML": "<p>This CSV is no longer loaded on the server. Please upload it again.</p>",
+            "teams": [],
+            "removedTeams": []
+        }
     
     # 3) Get the user's team from the form (or session).
     my_team = request.form.get("myTeam", "").strip()
@@ -210,57 +586,40 @@ def analyze():
         if t not in current_removed:
             current_removed.append(t)
     session["removed_teams"] = current_removed
+    live_reason = "removed" if new_removed else "upload" if file and file.filename else "refresh"
 
-    # Define CSV column names.
-    team_col = "Team #"
-    sample_opr_col = "Observed SAMPLEOPR"
-    specimen_opr_col = "Observed SPECIMEN OPR"
-    
-    # 5) Convert OPR columns to numeric.
-    df[sample_opr_col] = pd.to_numeric(df[sample_opr_col], errors='coerce').fillna(0)
-    df[specimen_opr_col] = pd.to_numeric(df[specimen_opr_col], errors='coerce').fillna(0)
-    
-    # Build a dictionary of teams from CSV.
-    teams_dict = {}
-    for _, row in df.iterrows():
-        team_str = str(row[team_col]).strip()
-        teams_dict[team_str] = {
-            "sample": row[sample_opr_col],
-            "specimen": row[specimen_opr_col]
-        }
-    
-    # Remove all teams in the persistent removal list.
+    # The same upload, team and removals always render the same result, so reuse it.
+    removed_key = tuple(sorted(set(current_removed)))
+    feed_version = match_feeds.version(live_channel())
+    result_key = (session["dataset_key"], session["event"], feed_version, my_team, removed_key)
+    cached = result_cache.get(result_key)
+    if cached is not None:
+        if live.has_subscribers(live_channel()):
+            publish_ranking(dataset, live_reason)
+        return analyze_response(cached, dataset, events, current_removed)
+
+    # 5) Remove all teams in the persistent removal list.
     removal_message = ""
-    for t in current_removed:
-        if t in teams_dict:
-            del teams_dict[t]
+    for t in removed_key:
+        if dataset.lookup(t) is not None:
             removal_message += f"Removed team <del>{t}</del> from pairing calculations.<br>"
         else:
             removal_message += f"Team {t} not found, so not removed.<br>"
+    alive = dataset.alive_mask(current_removed)
+    team_names = dataset.teams
+    sample_values = dataset.sample
+    specimen_values = dataset.specimen
 
-    # 6) Generate all possible two-team pairings.
-    pair_details = []
-    for team1, team2 in combinations(teams_dict.keys(), 2):
-        s1 = teams_dict[team1]["sample"]
-        p1 = teams_dict[team1]["specimen"]
-        s2 = teams_dict[team2]["sample"]
-        p2 = teams_dict[team2]["specimen"]
-
-        optionA = s1 + p2
-        optionB = p1 + s2
-        if optionA >= optionB:
-            best_score = optionA
-            team1_role = "SAMPLE"
-            team2_role = "SPECIMEN"
-        else:
-            best_score = optionB
-            team1_role = "SPECIMEN"
-            team2_role = "SAMPLE"
-        pair_details.append((team1, team2, team1_role, team2_role, best_score, optionA, optionB))
-    
-    pair_details.sort(key=lambda x: x[4], reverse=True)
+    my_index = dataset.lookup(my_team) if my_team else None
+    my_team_found = my_index is not None and alive[my_index]
+
+    # 6) Rank the two-team pairings and keep only the top 10.
+    with timer.stage("pairs", teams=int(alive.sum())):
+        pair_details, more_pairs = page_pairs(dataset, alive, 0)
+    publish_ranking(dataset, live_reason, pair_details)
     
     # Build HTML output (three output boxes).
+    html_stage = timer.start("html")
     result_html = ""
     # Box 1: Overall Top Pair Combinations.
     result_html += "<div class='output-box'>"
@@ -268,20 +627,46 @@ def analyze():
         result_html += f"<p>{removal_message}</p>"
     result_html += "<h2>Overall Top Pair Combinations</h2>"
     if pair_details:
-        result_html += "<ul>"
+        result_html += "<ul id='topPairs'>"
         for i, (t1, t2, r1, r2, score, optA, optB) in enumerate(pair_details[:10], start=1):
             result_html += (
                 f"<li>{i}. {t1} ({r1}) &amp; {t2} ({r2}) => Combined OPR: {score:.2f} "
                 f"(Option A: {optA:.2f}, Option B: {optB:.2f})</li>"
             )
         result_html += "</ul>"
+        # Can anyone catch the top pair? Checked from the team arrays in O(n).
+        check = top_pair_check(sample_values, specimen_values, alive)
+        if check.runner_up is not None:
+            t1, t2, score = check.runner_up
+            if check.unbeatable:
+                result_html += (
+                    f"<p>The top pair is unbeatable: it leads the next pair "
+                    f"({team_names[t1]} &amp; {team_names[t2]}) by {check.margin:.2f}.</p>"
+                )
+            else:
+                result_html += (
+                    f"<p>The top pair is not unbeatable: {team_names[t1]} &amp; "
+                    f"{team_names[t2]} tie it at {score:.2f}.</p>"
+                )
+        if more_pairs:
+            result_html += "<button type='button' data-page='1' onclick='loadMorePairs(this)'>Show more pairs</button>"
+        result_html += "<button type='button' onclick='loadPredictions(this)'>Simulate win chances</button>"
+        result_html += "<button type='button' onclick='loadAlliances(this)'>Show three-team alliances</button>"
     else:
         result_html += "<p>No pairings found.</p>"
     result_html += "</div>"
     
     # Box 2: Top Pairings Including Your Team.
-    if my_team in teams_dict:
-        my_team_pairs = [pd for pd in pair_details if my_team in (pd[0], pd[1])]
+    if my_team_found:
+        ranking = get_ranking(dataset)
+        if ranking is not None:
+            with ranking.lock:
+                ranking.set_removed(np.flatnonzero(~alive))
+                my_team_pairs = ranking.team_pairs(team_names, my_index, k=10)
+        else:
+            my_team_pairs = team_pairs(
+                team_names, sample_values, specimen_values, my_index, k=10, alive=alive
+            )
         result_html += "<div class='output-box'>"
         result_html += f"<h2>Top Pairings with Team {my_team}</h2>"
         if my_team_pairs:
@@ -299,36 +684,29 @@ def analyze():
         # Box 3: Analysis & Recommendation for Your Team.
         result_html += "<div class='output-box'>"
         result_html += f"<h2>Analysis & Recommendation for Team {my_team}</h2>"
-        # Best partner if playing as SAMPLE.
+        # Best partner in each role, from the dataset's partner index.
+        partners = get_partners(dataset, alive)
+        row = int(np.searchsorted(partners.teams, my_index))
         best_sample_partner = None
-        best_sample_score = -float('inf')
+        best_sample_score = partners.sample_score[row]
         best_sample_details = ""
-        for other in teams_dict:
-            if other == my_team:
-                continue
-            cur_score = teams_dict[my_team]["sample"] + teams_dict[other]["specimen"]
-            if cur_score > best_sample_score:
-                best_sample_score = cur_score
-                best_sample_partner = other
-                best_sample_details = (
-                    f"{my_team} as SAMPLE ({teams_dict[my_team]['sample']}) + "
-                    f"{other} as SPECIMEN ({teams_dict[other]['specimen']})"
-                )
-        # Best partner if playing as SPECIMEN.
+        other = partners.sample_partner[row]
+        if other >= 0:
+            best_sample_partner = team_names[other]
+            best_sample_details = (
+                f"{my_team} as SAMPLE ({sample_values[my_index]}) + "
+                f"{team_names[other]} as SPECIMEN ({specimen_values[other]})"
+            )
         best_specimen_partner = None
-        best_specimen_score = -float('inf')
+        best_specimen_score = partners.specimen_score[row]
         best_specimen_details = ""
-        for other in teams_dict:
-            if other == my_team:
-                continue
-            cur_score = teams_dict[my_team]["specimen"] + teams_dict[other]["sample"]
-            if cur_score > best_specimen_score:
-                best_specimen_score = cur_score
-                best_specimen_partner = other
-                best_specimen_details = (
-                    f"{my_team} as SPECIMEN ({teams_dict[my_team]['specimen']}) + "
-                    f"{other} as SAMPLE ({teams_dict[other]['sample']})"
-                )
+        other = partners.specimen_partner[row]
+        if other >= 0:
+            best_specimen_partner = team_names[other]
+            best_specimen_details = (
+                f"{my_team} as SPECIMEN ({specimen_values[my_index]}) + "
+                f"{team_names[other]} as SAMPLE ({sample_values[other]})"
+            )
         result_html += (
             f"<p>Best partner if playing as SAMPLE: Team {best_sample_partner} => OPR {best_sample_score:.2f}<br>"
             f"Details: {best_sample_details}</p>"
@@ -337,8 +715,18 @@ def analyze():
             f"<p>Best partner if playing as SPECIMEN: Team {best_specimen_partner} => OPR {best_specimen_score:.2f}<br>"
             f"Details: {best_specimen_details}</p>"
         )
-        s_val = teams_dict[my_team]["sample"]
-        p_val = teams_dict[my_team]["specimen"]
+        # Where that best pairing ranks among every pair still in the pool.
+        if best_sample_partner is not None:
+            best_pair_score = max(best_sample_score, best_specimen_score)
+            pair_rank = count_role_pairs_above(
+                best_pair_score, sample_values[alive], specimen_values[alive]
+            ) + 1
+            result_html += (
+                f"<p>Your best pairing (OPR {best_pair_score:.2f}) ranks #{pair_rank} "
+                f"among all remaining pairs.</p>"
+            )
+        s_val = sample_values[my_index]
+        p_val = specimen_values[my_index]
         if s_val > p_val:
             recommended_side = "SAMPLE"
         elif p_val > s_val:
@@ -352,20 +740,535 @@ def analyze():
         result_html += "</div>"
     else:
         result_html += f"<div class='output-box'><p>Team {my_team} not found in the data.</p></div>"
+    html_stage.stop(bytes=len(result_html))
     
-    # Build list of all teams from the original CSV for the dropdown.
-    df_all_teams = sorted(str(x).strip() for x in df[team_col].unique())
-    
+    return analyze_response(result_cache.put(result_key, result_html), dataset, events, current_removed)
+
+def analyze_response(cached, dataset, events, removed):
+    """
+    The /analyze JSON for a cached result (html, etag), with an ETag header.
+    A request whose If-None-Match holds this result's ETag gets an empty 304.
+    The ETag is the only validator: a POST's result depends on its form, not
+    on when it was rendered.
+    """
+    result_html, etag = cached
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.json.response({
+            "resultHTML": result_html,
+            "teams": dataset.all_teams,
+            "removedTeams": removed,
+            "events": list(events),
+            "event": session["event"] if session["event"] in events else "",
+            "channel": live_channel()
+        })
+    response.set_etag(etag)
+    # Clients may keep the result but must check back before reusing it.
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/pairs')
+def pairs():
+    """
+    Returns one more page of the overall pair ranking as JSON, for the
+    "Show more pairs" button. Uses the dataset and removed teams in session.
+    Query parameters: page (0 is the top 10 already shown) and size.
+    """
+    dataset = session_dataset()
+    if dataset is None:
+        return {"error": "No CSV data found. Please upload a CSV first."}, 400
+    page = max(request.args.get("page", 1, type=int), 0)
+    size = min(max(request.args.get("size", 10, type=int), 1), 100)
+    alive = dataset.alive_mask(session.get("removed_teams", []))
+    pair_page, has_more = page_pairs(dataset, alive, page, size)
+    return {
+        "page": page,
+        "start": page * size + 1,
+        "pairs": [pair_json(p) for p in pair_page],
+        "hasMore": has_more
+    }
+
+@app.route('/alliances')
+def alliances():
+    """
+    The best alliances of more than two teams (see allianceOptimizer.top_alliances)
+    overall and with the session's team, using the dataset and removed teams in session.
+    Query parameters: size (default 3) and k (default 10). Big pools run in
+    the job queue (see jobQueue for ?async=1).
+    """
+    dataset = session_dataset()
+    if dataset is None:
+        return {"error": "No CSV data found. Please upload a CSV first."}, 400
+    size = min(max(request.args.get("size", 3, type=int), 2), MAX_ALLIANCE_SIZE)
+    k = min(max(request.args.get("k", 10, type=int), 1), 50)
+    alive = dataset.alive_mask(session.get("removed_teams", []))
+    my_team = session.get("my_team", "")
+    my_index = dataset.lookup(my_team) if my_team else None
+
+    def alliance_rows(ranked):
+        if not ranked:
+            return []
+        members = [indices for _, indices in ranked]
+        _, _, _, on_sample = score_alliances(dataset.sample, dataset.specimen, members)
+        return [
+            {
+                "teams": [dataset.teams[i] for i in indices],
+                "roles": ["SAMPLE" if role else "SPECIMEN" for role in roles],
+                "score": float(score)
+            }
+            for (score, indices), roles in zip(ranked, on_sample.tolist())
+        ]
+
+    def finish(result):
+        overall, mine = result
+        return {
+            "size": size,
+            "alliances": alliance_rows(overall),
+            "myTeam": my_team if my_index is not None else None,
+            "myAlliances": alliance_rows(mine)
+        }
+
+    team = my_index if my_index is not None and alive[my_index] else None
+    # The search is usually far below its brute-force cost, but that's the worst case.
+    pool = int(alive.sum())
+    with timer.stage("alliances", teams=pool, size=size):
+        return jobs.run(
+            "alliances", top_alliances_with, dataset.sample, dataset.specimen, k, size, alive, team,
+            cost=pool ** (size - 1), finish=finish
+        )
+
+def pair_alliance(dataset, pair):
+    """
+    The (sample_team, specimen_team) dataset indices of a pair 7-tuple.
+    """
+    t1, t2, r1 = pair[0], pair[1], pair[2]
+    first, second = dataset.index[t1], dataset.index[t2]
+    return (first, second) if r1 == "SAMPLE" else (second, first)
+
+def optional_number(value, digits=4):
+    return None if np.isnan(value) else round(float(value), digits)
+
+@app.route('/predict')
+def predict():
+    """
+    Monte Carlo win chances for the current top pairs against each other, using
+    the dataset and removed teams in session (see matchPredictor).
+    Query parameters: count (pairs, default 10), simulations, and seed for
+    repeatable results.
+    """
+    dataset = session_dataset()
+    if dataset is None:
+        return {"error": "No CSV data found. Please upload a CSV first."}, 400
+    count = min(max(request.args.get("count", 10, type=int), 2), 50)
+    simulations = min(max(request.args.get("simulations", DEFAULT_SIMULATIONS, type=int), 100), MAX_SIMULATIONS)
+    seed = request.args.get("seed", type=int)
+    alive = dataset.alive_mask(session.get("removed_teams", []))
+    pair_page, _ = page_pairs(dataset, alive, 0, count)
+    if not pair_page:
+        return {"simulations": simulations, "seed": seed, "pairs": [], "wins": []}
+
+    alliances = [pair_alliance(dataset, pair) for pair in pair_page]
+    sample_spread, specimen_spread = team_spread(dataset)
+
+    def finish(result):
+        rows = []
+        for i, pair in enumerate(pair_page):
+            row = pair_json(pair)
+            row["mean"] = round(float(result["mean"][i]), 2)
+            row["std"] = round(float(result["std"][i]), 2)
+            row["winRate"] = optional_number(result["win_rate"][i])
+            rows.append(row)
+        return {
+            "simulations": simulations,
+            "seed": seed,
+            "pairs": rows,
+            "wins": [[optional_number(x) for x in row] for row in result["wins"].tolist()]
+        }
+
+    with timer.stage("predict", alliances=len(alliances), simulations=simulations):
+        return jobs.run(
+            "predict", predict_matchups,
+            dataset.sample, dataset.specimen, sample_spread, specimen_spread, alliances, simulations, seed,
+            cost=simulations * len(alliances), finish=finish
+        )
+
+def standings_from_json(payload):
+    """
+    (Standings, remaining schedule of (red, blue) team lists) from a /forecast JSON body.
+    Raises ValueError on a malformed body.
+    """
+    rows = payload.get("rankings", [])
+    if not isinstance(rows, list) or not all(isinstance(row, dict) and "team" in row for row in rows):
+        raise ValueError("rankings must be a list of objects with a team")
+    matches = payload.get("schedule", [])
+    if not isinstance(matches, list) or not all(isinstance(match, dict) for match in matches):
+        raise ValueError("schedule must be a list of objects")
+    schedule = []
+    for number, match in enumerate(matches, start=1):
+        red, blue = match.get("red"), match.get("blue")
+        if not all(
+            isinstance(teams, list) and len(teams) == 2 and all(isinstance(t, str) for t in teams)
+            for teams in (red, blue)
+        ):
+            raise ValueError(f"match {number}: red and blue must each be a list of two team numbers (strings)")
+        red, blue = [t.strip() for t in red], [t.strip() for t in blue]
+        if len(set(red + blue)) != 4:
+            raise ValueError(f"match {number}: a team can only play once per match")
+        schedule.append((red, blue))
+    standings = Standings(
+        [str(row["team"]).strip() for row in rows],
+        np.array([float(row.get("rankingPoints", 0)) for row in rows]),
+        np.array([float(row.get("tiebreaker", 0)) for row in rows]),
+        np.array([int(row.get("played", 0)) for row in rows], dtype=np.int64),
+    )
+    return add_teams(standings, [t for red, blue in schedule for t in red + blue]), schedule
+
+@app.route('/forecast', methods=['POST'])
+def forecast():
+    """
+    Forecasts the final quals rankings by simulating the remaining matches
+    with the session dataset's OPRs (see qualsForecast). Takes either a match
+    results CSV as "scheduleFile" (scored rows make the current standings,
+    rows without scores are the remaining schedule) or JSON:
+      {"rankings": [{"team", "rankingPoints", "tiebreaker", "played"}, ...],
+       "schedule": [{"red": [team, team], "blue": [team, team]}, ...]}
+    Both accept "simulations" and "seed".
+    """
+    dataset = session_dataset()
+    if dataset is None:
+        return {"error": "No CSV data found. Please upload a CSV first."}, 400
+    file = request.files.get("scheduleFile")
+    try:
+        if file and file.filename:
+            results = load_match_results(io.BytesIO(file.read()))
+            standings, schedule = standings_from_results(results), results.unplayed
+            options = request.form
+        else:
+            options = request.get_json(silent=True) or {}
+            standings, schedule = standings_from_json(options)
+        simulations = min(max(int(options.get("simulations", qualsForecast.DEFAULT_SIMULATIONS)), 100),
+                          qualsForecast.MAX_SIMULATIONS)
+        seed = options.get("seed")
+        seed = None if seed in (None, "") else int(seed)
+    except Exception as e:
+        return {"error": f"Error reading rankings or schedule: {e}"}, 400
+    if not standings.teams:
+        return {"error": "No teams in the rankings or schedule."}, 400
+
+    # OPRs for the ranked teams; teams missing from the sheet play like an average team.
+    positions = [dataset.lookup(team) for team in standings.teams]
+    known = np.array([p is not None for p in positions])
+    rows = np.array([p if p is not None else 0 for p in positions], dtype=np.int64)
+    sample_spread, specimen_spread = team_spread(dataset)
+
+    def aligned(values):
+        return np.where(known, values[rows], values.mean() if len(values) else 0.0)
+
+    index = {team: i for i, team in enumerate(standings.teams)}
+    remaining = [([index[t] for t in red], [index[t] for t in blue]) for red, blue in schedule]
+
+    def finish(result):
+        distribution = result["distribution"]
+        captains = distribution[:, :qualsForecast.CAPTAINS].sum(axis=1)
+        teams = []
+        for i in np.argsort(result["expected"], kind="stable").tolist():
+            teams.append({
+                "team": standings.teams[i],
+                "currentRank": int(result["current"][i]) + 1,
+                "expectedRank": round(float(result["expected"][i]) + 1, 2),
+                "captainChance": round(float(captains[i]), 4),
+                "rankChances": [round(p, 4) for p in distribution[i].tolist()],
+                "inSheet": bool(known[i])
+            })
+        return {"simulations": simulations, "remainingMatches": len(remaining), "teams": teams}
+
+    # A schedule with three-team alliances fails in the job with a ValueError, reported as a 400.
+    with timer.stage("forecast", teams=len(standings.teams), matches=len(remaining)):
+        return jobs.run(
+            "forecast", forecast_rankings,
+            standings, remaining,
+            aligned(dataset.sample), aligned(dataset.specimen),
+            aligned(sample_spread), aligned(specimen_spread),
+            simulations, seed,
+            cost=simulations * (2 * len(remaining) + len(standings.teams)), finish=finish
+        )
+
+def get_draft(dataset, captains, me, policy, temperature, rounds):
+    """
+    Returns the dataset's DraftSimulator for this setup, reusing it (and its
+    memoized draft states) across picks.
+    """
+    key = (tuple(captains), me, policy, temperature, rounds)
+    simulator = dataset.drafts.get(key)
+    if simulator is None:
+        simulator = DraftSimulator(
+            dataset.sample, dataset.specimen, captains, me, range(len(dataset)),
+            policy, temperature, rounds
+        )
+        dataset.drafts[key] = simulator
+        while len(dataset.drafts) > MAX_DRAFTS:
+            dataset.drafts.popitem(last=False)
+    else:
+        dataset.drafts.move_to_end(key)
+    return simulator
+
+@app.route('/draft', methods=['POST'])
+def draft():
+    """
+    Alliance-selection advice: who will still be available at our next pick
+    and whom to take (see draftSimulator). Expects JSON:
+      {"captains": [teams in pick order], "myTeam": our captain,
+       "policy": "greedy" | "opr" | "softmax", "temperature": x, "rounds": 1 | 2,
+       "picks": [teams picked so far, in draft order]}
+    myTeam defaults to the session's team, and picks to the session's removed
+    teams that aren't captains. Picks must be different non-captain teams, no
+    more than the draft has. At most MAX_CAPTAINS captains; "complete" is
+    false when the search ran out of time before the end of the draft.
+    """
+    dataset = session_dataset()
+    if dataset is None:
+        return {"error": "No CSV data found. Please upload a CSV first."}, 400
+    payload = request.get_json(silent=True) or {}
+    policy = payload.get("policy", "greedy")
+    if policy not in POLICIES:
+        return {"error": f"Unknown policy: {policy}"}, 400
+    try:
+        temperature = float(payload.get("temperature", DEFAULT_TEMPERATURE))
+        rounds = min(max(int(payload.get("rounds", 1)), 1), 2)
+    except (TypeError, ValueError):
+        return {"error": "temperature and rounds must be numbers"}, 400
+
+    def indices(teams):
+        found = [dataset.lookup(str(t).strip()) for t in teams]
+        unknown = [str(t) for t, i in zip(teams, found) if i is None]
+        return found, unknown
+
+    captains = payload.get("captains", [])
+    if not isinstance(captains, list) or len(captains) > MAX_CAPTAINS:
+        return {"error": f"captains must be a list of at most {MAX_CAPTAINS} teams."}, 400
+    captains, unknown = indices(captains)
+    my_team = str(payload.get("myTeam") or session.get("my_team", "")).strip()
+    me = dataset.lookup(my_team)
+    if unknown:
+        return {"error": f"Unknown team(s): {', '.join(unknown)}"}, 400
+    if me is None or me not in captains:
+        return {"error": f"Team {my_team} must be one of the captains."}, 400
+    if len(set(captains)) != len(captains):
+        return {"error": "Captains must be different teams."}, 400
+    picked = payload.get("picks")
+    if picked is None:
+        picked = [t for t in session.get("removed_teams", []) if dataset.lookup(t) not in captains]
+    if not isinstance(picked, list) or not all(isinstance(t, str) for t in picked):
+        return {"error": "picks must be a list of team numbers (strings)."}, 400
+    picks, unknown = indices(picked)
+    if unknown:
+        return {"error": f"Unknown team(s): {', '.join(unknown)}"}, 400
+    if any(i in captains for i in picks):
+        return {"error": "Captains can't be picked."}, 400
+    if len(set(picks)) != len(picks):
+        return {"error": "A team can only be picked once."}, 400
+
+    simulator = get_draft(dataset, captains, captains.index(me), policy, temperature, rounds)
+    if len(picks) > len(simulator.order):
+        return {"error": f"This draft only has {len(simulator.order)} picks."}, 400
+    with simulator.lock, timer.stage("draft", picks=len(picks)) as stage:
+        advice = simulator.advise(picks)
+        stage.count(states=len(simulator.memo))
+    dataset_cache.trim()
+    if advice is None:
+        return {"error": f"Team {my_team} has no picks left."}, 400
     return {
-        "resultHTML": result_html,
-        "teams": df_all_teams,
-        "removedTeams": current_removed
+        "policy": policy,
+        "nextPick": advice["position"] + 1,
+        "picksBefore": advice["position"] - len(picks),
+        "expectedScore": round(advice["expected"], 2),
+        "options": [
+            {"team": dataset.teams[team], "available": round(chance, 4), "expectedScore": round(value, 2)}
+            for team, chance, value in advice["options"]
+        ],
+        "complete": advice["complete"],
+        "states": len(simulator.memo)
     }
 
+@app.route('/partners')
+def partners():
+    """
+    Returns every remaining team's best partner in each role as JSON,
+    using the dataset and removed teams in session.
+    """
+    dataset = session_dataset()
+    if dataset is None:
+        return {"error": "No CSV data found. Please upload a CSV first."}, 400
+    alive = dataset.alive_mask(session.get("removed_teams", []))
+    index = get_partners(dataset, alive)
+    teams = dataset.teams
+
+    def partner_json(partner, score):
+        if partner < 0:
+            return None
+        return {"team": teams[partner], "score": float(score)}
+
+    rows = []
+    for i, team in enumerate(index.teams.tolist()):
+        s_val = float(dataset.sample[team])
+        p_val = float(dataset.specimen[team])
+        rows.append({
+            "team": teams[team],
+            "sample": s_val,
+            "specimen": p_val,
+            "asSample": partner_json(index.sample_partner[i], index.sample_score[i]),
+            "asSpecimen": partner_json(index.specimen_partner[i], index.specimen_score[i]),
+            "recommendedSide": "SAMPLE" if s_val > p_val else "SPECIMEN" if p_val > s_val else "either"
+        })
+    return {"partners": rows, "removedTeams": session.get("removed_teams", [])}
+
+def opr_json(dataset):
+    """
+    Every team's computed OPRs as JSON rows.
+    """
+    return [
+        {"team": team, "sample": sample, "specimen": specimen}
+        for team, sample, specimen in zip(dataset.teams, dataset.sample.tolist(), dataset.specimen.tolist())
+    ]
+
+def use_solver(dataset_key, solver):
+    """
+    Caches the solver's OPRs as a dataset under `dataset_key` and makes it the session's dataset.
+    """
+    dataset = Dataset.from_sheet(solver.sheet())
+    dataset.solver = solver
+    dataset_cache.put(dataset_key, dataset)
+    session["dataset_key"] = dataset_key
+    return dataset
+
+@app.route('/opr', methods=['POST'])
+def opr():
+    """
+    Computes sample and specimen OPR from an uploaded match results CSV
+    (see oprSolver.load_match_results) and makes them the session's dataset,
+    so "Run Analysis" ranks pairs by the computed OPRs.
+    """
+    file = request.files.get("matchFile")
+    if not file or not file.filename:
+        return {"error": "No match results file provided"}, 400
+    data = file.read()
+    dataset_key = content_key(data)
+    dataset = dataset_cache.get(dataset_key)
+    if dataset is None or dataset.solver is None:
+        # The session is updated from the result, so this request always waits for the job.
+        with timer.stage("opr", bytes=len(data)) as stage:
+            try:
+                job = jobs.submit("opr", solve_match_results, data, cost=OPR_COST_PER_BYTE * len(data))
+            except QueueFull as e:
+                return {"error": str(e)}, 503
+            if not job.wait(jobs.timeout):
+                return {"error": "Solving the match results took too long."}, 504
+            try:
+                solver = job.result()
+            except Exception as e:
+                return {"error": f"Error reading match results: {e}"}, 400
+            stage.count(teams=len(solver), rows=solver.rows)
+        dataset = use_solver(dataset_key, solver)
+    session["dataset_key"] = dataset_key
+    session["channel"] = dataset_key
+    session["event"] = None
+    session["removed_teams"] = []
+    publish_ranking(dataset, "opr")
+    return {"datasetKey": dataset_key, "alliances": dataset.solver.rows, "opr": opr_json(dataset)}
+
+@app.route('/opr/match', methods=['POST'])
+def opr_match():
+    """
+    Adds one played match to the session's match-results dataset, updating the
+    OPRs incrementally instead of re-solving. Expects JSON:
+      {"red": [teams], "blue": [teams], "redSample": x, "redSpecimen": x,
+       "blueSample": x, "blueSpecimen": x}
+    Teams are strings, and a team plays at most once per match. The updated
+    OPRs are cached as a new dataset; removed teams carry over.
+    """
+    dataset = dataset_cache.get(session.get("dataset_key"))
+    if dataset is None or dataset.solver is None:
+        return {"error": "No match results loaded. Please upload them to /opr first."}, 400
+    payload = request.get_json(silent=True) or {}
+    red, blue = payload.get("red", []), payload.get("blue", [])
+    if not all(isinstance(teams, list) and all(isinstance(t, str) for t in teams) for teams in (red, blue)):
+        return {"error": "Bad match: red and blue must be lists of team numbers (strings)"}, 400
+    red, blue = [t.strip() for t in red], [t.strip() for t in blue]
+    if len(set(red + blue)) != len(red) + len(blue):
+        return {"error": "Bad match: a team can only play once per match"}, 400
+    try:
+        red_points = (float(payload["redSample"]), float(payload["redSpecimen"]))
+        blue_points = (float(payload["blueSample"]), float(payload["blueSpecimen"]))
+    except (KeyError, TypeError, ValueError) as e:
+        return {"error": f"Bad match: {e}"}, 400
+    if not red or not blue:
+        return {"error": "Bad match: both alliances need teams"}, 400
+
+    # The cached solver stays untouched; the copy takes the update.
+    solver = dataset.solver.copy()
+    with timer.stage("opr_update", teams=len(solver)):
+        solver.add_match(red, blue, red_points, blue_points)
+    match = json.dumps([red, blue, red_points, blue_points])
+    dataset_key = content_key(f"{session['dataset_key']}:{match}".encode())
+    dataset = use_solver(dataset_key, solver)
+    publish_ranking(dataset, "match")
+    return {"datasetKey": dataset_key, "alliances": solver.rows, "opr": opr_json(dataset)}
+
+@app.route('/matches', methods=['POST'])
+def matches():
+    """
+    Appends match observations to the session's dataset (see matchIngest).
+    Expects JSON: one row {"team": t, "sample": x, "specimen": x, "match": m},
+    a list of rows, or {"rows": [...]}, at most MAX_BATCH rows. Each team's
+    sample and specimen become the means of its observations so far; only the
+    pairs of the teams in the batch are re-ranked.
+    """
+    dataset = dataset_cache.get(session.get("dataset_key"))
+    if dataset is None:
+        return {"error": "No CSV data found. Please upload a CSV first."}, 400
+    if dataset.solver is not None:
+        return {"error": "This dataset comes from match results; add whole matches with /opr/match."}, 400
+    payload = request.get_json(silent=True)
+    rows = payload.get("rows") if isinstance(payload, dict) and "rows" in payload else payload
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not isinstance(rows, list) or not rows:
+        return {"error": "Expected a row, a list of rows or {\"rows\": [...]}"}, 400
+    if len(rows) > MAX_BATCH:
+        return {"error": f"At most {MAX_BATCH} rows per request"}, 400
+
+    feed = match_feeds.get(live_channel(), dataset.events.get(session.get("event"), dataset), create=True)
+    with timer.stage("ingest", rows=len(rows)):
+        try:
+            changed = feed.ingest(rows)
+        except ValueError as e:
+            return {"error": f"Bad row: {e}"}, 400
+    publish_ranking(feed.dataset, "match")
+    return {"accepted": len(rows), "version": feed.version, "teams": feed.team_json(changed)}
+
+@app.route('/stream')
+def stream():
+    """
+    Server-Sent Events with the live top 10 of a channel (see liveRanking):
+    the "channel" query parameter, or the session's own. Pages get the
+    channel from /analyze.
+    """
+    channel = request.args.get("channel") or (live_channel() if "dataset_key" in session else None)
+    if not channel:
+        return {"error": "No CSV data found. Please upload a CSV first."}, 400
+    return Response(
+        live.subscribe(channel),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 def is_top_pair_unbeatable(pair_details):
     """
     Returns True if the top pair (first element in the sorted list) has a combined OPR
-    that no other pair matches or exceeds.
+    that no other pair matches or exceeds. Only the sorted head of the list matters,
+    so the top-k list from pairEngine.top_pairs works as well as every pair.
+    pairEngine.top_pair_check answers the same question from the team arrays.
     """
     if not pair_details:
         return False
@@ -1,10 +1,33 @@
 from flask import Flask, request, jsonify, session
-import pandas as pd
-import io
+from scoutingLoader import stream_scouting_sheets
+from datasetCache import Dataset, DatasetCache, stream_key
+from datasetStore import DatasetStore
+from allianceOptimizer import optimize_alliances, score_alliances, best_roles, pair_score, OBJECTIVES
+from bracketSimulator import simulate_bracket, DEFAULT_SIMULATIONS, MAX_SIMULATIONS, SERIES_LENGTH, MAX_ALLIANCES
+from matchPredictor import team_spread
+from stageTimer import StageTimer
+from jobQueue import JobQueue
 
 app = Flask(__name__)
 app.secret_key = "CHANGE_ME_TO_SOMETHING_RANDOM"  # For production, use a secure key
 
+# Parsed uploads, keyed by a hash of the file contents. The page keeps the key.
+# Uploads are also saved to disk (shared with MainScouter) and reopened at startup.
+dataset_store = DatasetStore()
+dataset_cache = DatasetCache(store=dataset_store)
+dataset_store.restore(dataset_cache)
+
+
+# Per-stage timings (Server-Timing header and /metrics), on when SCOUTER_TIMING=1.
+timer = StageTimer().init_app(app)
+
+# Worker processes for matching and bracket simulations, plus GET /jobs/<id> for polling.
+jobs = JobQueue().init_app(app)
+
+# Alliance sizes /score takes, and how many alliances one request may score.
+ALLIANCE_SIZES = (2, 3)
+MAX_SCORED = 1000
+
 HTML_CODE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -120,6 +143,15 @@ HTML_CODE = """
     <div id="builtAlliancesSection" style="display:none;">
       <h2>Formed Alliances</h2>
       <ul id="alliancesList"></ul>
+      <button id="simulateBracket" type="button">Simulate elimination bracket</button>
+      <ul id="bracketList"></ul>
+    </div>
+    
+    <!-- Optimal Alliances Section; filled in by "Suggest optimal alliances" -->
+    <div id="optimalSection" style="display:none;">
+      <h2>Optimal Alliances</h2>
+      <p id="optimalSummary"></p>
+      <ul id="optimalList"></ul>
     </div>
     
     <!-- Alliance Builder UI; hidden until CSV is uploaded -->
@@ -142,11 +174,22 @@ HTML_CODE = """
         <!-- Center: Current alliance selection -->
         <div id="currentAlliance" class="box">
           <h2>Current Alliance</h2>
-          <p>Select two teams to form an alliance:</p>
+          <p>Select two or three teams to form an alliance:</p>
           <ul id="selectedTeams"></ul>
           <button id="buildAlliance" type="button" disabled>add this alliance!</button>
           <button id="clearSelection" type="button">clear the current alliance you are working on</button>
         </div>
+        
+        <!-- Right side: Server-side optimizer for the remaining teams -->
+        <div id="optimizer" class="box">
+          <h2>Optimizer</h2>
+          <p>Split the remaining teams into alliances to compare against your builds:</p>
+          <select id="objective">
+            <option value="total" selected>Maximize total combined OPR</option>
+            <option value="bottleneck">Maximize the weakest alliance</option>
+          </select>
+          <button id="optimizeAlliances" type="button">Suggest optimal alliances</button>
+        </div>
       </div>
     </div>
   </div>
@@ -155,8 +198,10 @@ HTML_CODE = """
     // Global variables to store team and alliance data.
     let teamsData = {};          // { teamNum: { sample: number, specimen: number } }
     let availableTeams = [];     // Teams available for alliance formation.
-    let currentSelection = [];   // Temporary selection for a two–team alliance.
+    let currentSelection = [];   // Temporary selection for a two- or three-team alliance.
+    const ALLIANCE_SIZES = [2, 3];
     let alliances = [];          // List of formed alliances.
+    let datasetKey = null;       // Server-side key of the uploaded CSV.
 
     // Render the list of available teams, sorted based on the chosen criterion.
     function renderAvailableTeams() {
@@ -182,8 +227,8 @@ HTML_CODE = """
         li.textContent = team;
         selectedList.appendChild(li);
       });
-      // Enable the "Build Alliance" button only when exactly 2 teams are selected.
-      document.getElementById('buildAlliance').disabled = (currentSelection.length !== 2);
+      // Enable the "Build Alliance" button only when 2 or 3 teams are selected.
+      document.getElementById('buildAlliance').disabled = !ALLIANCE_SIZES.includes(currentSelection.length);
     }
     
     // Render the formed alliances sorted by best combined OPR.
@@ -195,7 +240,7 @@ HTML_CODE = """
       sortedAlliances.forEach((alliance, index) => {
         let li = document.createElement('li');
         li.className = "alliance-item";
-        li.innerHTML = "<strong>" + alliance.teams[0] + " & " + alliance.teams[1] + "</strong> => Combined OPR: " + alliance.bestScore.toFixed(2) + "<br><small>" + alliance.details + "</small>";
+        li.innerHTML = "<strong>" + alliance.teams.join(" & ") + "</strong> => Combined OPR: " + alliance.bestScore.toFixed(2) + "<br><small>" + alliance.details + "</small>";
         
         // Remove alliance button
         let removeBtn = document.createElement('button');
@@ -211,44 +256,50 @@ HTML_CODE = """
     // Called when a team is clicked from the available list.
     function selectTeam(team) {
       if (currentSelection.includes(team)) return;
-      if (currentSelection.length >= 2) return;
+      if (currentSelection.length >= Math.max(...ALLIANCE_SIZES)) return;
       currentSelection.push(team);
       renderCurrentSelection();
     }
     
+    // Ask the server to score alliances (lists of teams); resolves to the scored alliances in order.
+    function scoreAlliances(candidates) {
+      return fetch("/score", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ datasetKey: datasetKey, alliances: candidates })
+      })
+        .then(response => response.json())
+        .then(data => {
+          if (data.error) throw new Error(data.error);
+          return data.alliances;
+        });
+    }
+
     // Form an alliance from currentSelection when the button is clicked.
     function formAlliance() {
-      if (currentSelection.length !== 2) return;
-      let team1 = currentSelection[0];
-      let team2 = currentSelection[1];
-      
-      // Calculate both options:
-      let optionA = teamsData[team1].sample + teamsData[team2].specimen;
-      let optionB = teamsData[team1].specimen + teamsData[team2].sample;
-      let bestScore = Math.max(optionA, optionB);
-      let option = (optionA >= optionB) ? "A" : "B";
-      let details = (option === "A") ?
-          (team1 + " as SAMPLE (" + teamsData[team1].sample + ") + " + team2 + " as SPECIMEN (" + teamsData[team2].specimen + ")") :
-          (team1 + " as SPECIMEN (" + teamsData[team1].specimen + ") + " + team2 + " as SAMPLE (" + teamsData[team2].sample + ")");
-      
-      alliances.push({
-        teams: [team1, team2],
-        bestScore: bestScore,
-        option: option,
-        details: details
-      });
-      
-      // Remove the two teams from available teams.
-      availableTeams = availableTeams.filter(t => t !== team1 && t !== team2);
-      
-      // Reset current selection.
-      currentSelection = [];
+      if (!ALLIANCE_SIZES.includes(currentSelection.length)) return;
+      let selection = currentSelection.slice();
       
-      renderCurrentSelection();
-      renderAvailableTeams();
-      renderAlliances();
-      // Make sure the built alliances section is visible.
-      document.getElementById('builtAlliancesSection').style.display = "block";
+      // The server picks the roles and scores both options.
+      scoreAlliances([selection])
+        .then(scored => {
+          alliances.push(scored[0]);
+          
+          // Remove the selected teams from available teams.
+          availableTeams = availableTeams.filter(t => !selection.includes(t));
+          
+          // Reset current selection.
+          currentSelection = [];
+          
+          renderCurrentSelection();
+          renderAvailableTeams();
+          renderAlliances();
+          // Make sure the built alliances section is visible.
+          document.getElementById('builtAlliancesSection').style.display = "block";
+        })
+        .catch(err => {
+          alert("Error scoring alliance: " + err.message);
+        });
     }
     
     // Remove an alliance and add its teams back to available teams.
@@ -265,6 +316,67 @@ HTML_CODE = """
       renderAlliances();
     }
     
+    // Ask the server for the best way to split the remaining teams into alliances.
+    function suggestAlliances() {
+      const objective = document.getElementById('objective').value;
+      fetch("/optimize", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ datasetKey: datasetKey, teams: availableTeams, objective: objective })
+      })
+        .then(response => response.json())
+        .then(data => {
+          if (data.error) {
+            alert(data.error);
+            return;
+          }
+          const list = document.getElementById('optimalList');
+          list.innerHTML = "";
+          data.alliances.forEach(alliance => {
+            let li = document.createElement('li');
+            li.className = "alliance-item";
+            li.innerHTML = "<strong>" + alliance.teams[0] + " & " + alliance.teams[1] + "</strong> => Combined OPR: " + alliance.bestScore.toFixed(2) + "<br><small>" + alliance.details + "</small>";
+            list.appendChild(li);
+          });
+          let summary = "Total: " + data.total.toFixed(2);
+          if (data.weakest !== null) summary += ", weakest alliance: " + data.weakest.toFixed(2);
+          if (data.bye !== null) summary += " (team " + data.bye + " sits out)";
+          document.getElementById('optimalSummary').textContent = summary;
+          document.getElementById('optimalSection').style.display = "block";
+        })
+        .catch(err => {
+          alert("Error optimizing alliances: " + err);
+        });
+    }
+    
+    // Simulate the elimination bracket for the formed alliances.
+    function simulateBracket() {
+      fetch("/bracket", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ datasetKey: datasetKey, alliances: alliances.map(a => a.teams) })
+      })
+        .then(response => response.json())
+        .then(data => {
+          if (data.error) {
+            alert(data.error);
+            return;
+          }
+          const list = document.getElementById('bracketList');
+          list.innerHTML = "";
+          data.alliances.forEach(alliance => {
+            let li = document.createElement('li');
+            let chances = data.rounds.map(name => name + " " + (100 * alliance.rounds[name]).toFixed(1) + "%");
+            li.innerHTML = "<strong>Seed " + alliance.seed + ": " + alliance.teams[0] + " & " + alliance.teams[1] +
+              "</strong><br><small>Wins " + chances.join(", ") + "</small>";
+            list.appendChild(li);
+          });
+        })
+        .catch(err => {
+          alert("Error simulating bracket: " + err);
+        });
+    }
+    
     // Event listeners for build alliance button, clearing selection, and changing sort order.
     document.getElementById('buildAlliance').addEventListener("click", function() {
       formAlliance();
@@ -279,6 +391,14 @@ HTML_CODE = """
       renderAvailableTeams();
     });
     
+    document.getElementById('optimizeAlliances').addEventListener("click", function() {
+      suggestAlliances();
+    });
+    
+    document.getElementById('simulateBracket').addEventListener("click", function() {
+      simulateBracket();
+    });
+    
     // Handle CSV file upload.
     document.getElementById('csvForm').addEventListener("submit", function(e) {
       e.preventDefault();
@@ -300,6 +420,7 @@ HTML_CODE = """
           }
           // The server returns an object mapping team numbers to their OPR values.
           teamsData = data.teamsData;
+          datasetKey = data.datasetKey;
           availableTeams = Object.keys(teamsData);
           currentSelection = [];
           alliances = [];
@@ -328,34 +449,202 @@ def upload():
       - "Team #"
       - "Observed SAMPLEOPR"
       - "Observed SPECIMEN OPR"
-    The CSV is parsed, and a dictionary of team data is returned in JSON.
+    The CSV is parsed (or reused, if the same file is already cached), and a dictionary
+    of team data is returned in JSON along with the dataset key for later requests.
     """
     file = request.files.get("csvFile")
     if not file or file.filename == "":
         return jsonify({"error": "No file provided"}), 400
-    try:
-        # Assuming the CSV has a header row that starts on the second row (header=1)
-        df = pd.read_csv(file, header=1)
-    except Exception as e:
-        return jsonify({"error": f"Error reading CSV: {e}"}), 400
-    
-    df.columns = df.columns.str.strip()
-    team_col = "Team #"
-    sample_opr_col = "Observed SAMPLEOPR"
-    specimen_opr_col = "Observed SPECIMEN OPR"
-    
-    # Convert the OPR columns to numbers.
-    df[sample_opr_col] = pd.to_numeric(df[sample_opr_col], errors='coerce').fillna(0)
-    df[specimen_opr_col] = pd.to_numeric(df[specimen_opr_col], errors='coerce').fillna(0)
+    dataset_key = stream_key(file.stream)
+    dataset = dataset_cache.get(dataset_key)
+    if dataset is None:
+        try:
+            # Assuming the CSV has a header row that starts on the second row (header=1)
+            with timer.stage("parse"):
+                sheets = stream_scouting_sheets(file.stream)
+            with timer.stage("numeric"):
+                dataset = Dataset.from_sheets(sheets)
+        except Exception as e:
+            return jsonify({"error": f"Error reading CSV: {e}"}), 400
+        dataset_cache.put(dataset_key, dataset)
+        dataset_store.save(dataset_key, dataset)
     
-    teamsData = {}
-    for _, row in df.iterrows():
-        team_str = str(row[team_col]).strip()
-        teamsData[team_str] = {
-            "sample": row[sample_opr_col],
-            "specimen": row[specimen_opr_col]
+    with timer.stage("serialize", teams=len(dataset)):
+        teamsData = {
+            team: {"sample": sample, "specimen": specimen}
+            for team, sample, specimen in zip(dataset.teams, dataset.sample.tolist(), dataset.specimen.tolist())
         }
-    return jsonify({"teamsData": teamsData})
+        response = jsonify({"teamsData": teamsData, "datasetKey": dataset_key})
+    return response
+
+def alliance_json(dataset, sample_team, specimen_team, score):
+    """
+    Describes one alliance (dataset indices, SAMPLE team first) the way the page shows it.
+    """
+    s_team, p_team = dataset.teams[sample_team], dataset.teams[specimen_team]
+    return {
+        "teams": [s_team, p_team],
+        "bestScore": float(score),
+        "details": (
+            f"{s_team} as SAMPLE ({dataset.sample[sample_team]}) + "
+            f"{p_team} as SPECIMEN ({dataset.specimen[specimen_team]})"
+        )
+    }
+
+@app.route('/score', methods=["POST"])
+def score():
+    """
+    Scores candidate alliances (pairs or triples) in one pass.
+    Expects JSON: {"datasetKey": ..., "alliances": [[team, team], [team, team, team], ...]}
+    Returns them in the same order, each with its best score, the option used
+    ("A": first team on SAMPLE, "B": on SPECIMEN), both options' scores and
+    every team's role (see allianceOptimizer.score_alliances).
+    """
+    payload = request.get_json(silent=True) or {}
+    dataset = dataset_cache.get(payload.get("datasetKey"))
+    if dataset is None:
+        return jsonify({"error": "This CSV is no longer loaded on the server. Please upload it again."}), 400
+    candidates = payload.get("alliances", [])
+    if not isinstance(candidates, list) or not candidates:
+        return jsonify({"error": "No alliances to score."}), 400
+    if len(candidates) > MAX_SCORED:
+        return jsonify({"error": f"At most {MAX_SCORED} alliances per request."}), 400
+    # Check the shape before any lookup: every alliance is a list of 2-3 team strings.
+    if any(
+        not isinstance(teams, list) or len(teams) not in ALLIANCE_SIZES
+        or not all(isinstance(t, str) for t in teams)
+        for teams in candidates
+    ):
+        return jsonify({"error": "Every alliance needs to be a list of two or three team numbers (strings)."}), 400
+    if any(len(set(teams)) != len(teams) for teams in candidates):
+        return jsonify({"error": "A team can't be in an alliance twice."}), 400
+    unknown = sorted({t for teams in candidates for t in teams if t not in dataset.index})
+    if unknown:
+        return jsonify({"error": f"Unknown team(s): {', '.join(unknown)}"}), 400
+
+    rows = [None] * len(candidates)
+    with timer.stage("score", alliances=len(candidates)):
+        for size in ALLIANCE_SIZES:
+            positions = [i for i, teams in enumerate(candidates) if len(teams) == size]
+            if not positions:
+                continue
+            indices = [[dataset.index[t] for t in candidates[i]] for i in positions]
+            best, option_a, option_b, on_sample = score_alliances(dataset.sample, dataset.specimen, indices)
+            for row, i in enumerate(positions):
+                teams = candidates[i]
+                roles = ["SAMPLE" if role else "SPECIMEN" for role in on_sample[row].tolist()]
+                details = [
+                    f"{team} as {role} ({dataset.sample[j] if role == 'SAMPLE' else dataset.specimen[j]})"
+                    for team, role, j in zip(teams, roles, indices[row])
+                ]
+                rows[i] = {
+                    "teams": teams,
+                    "bestScore": float(best[row]),
+                    "option": "A" if roles[0] == "SAMPLE" else "B",
+                    "optionA": float(option_a[row]),
+                    "optionB": float(option_b[row]),
+                    "roles": roles,
+                    "details": " + ".join(details)
+                }
+    return jsonify({"alliances": rows})
+
+@app.route('/optimize', methods=["POST"])
+def optimize():
+    """
+    Splits a pool of teams into the best possible alliances.
+    Expects JSON: {"datasetKey": ..., "teams": [...], "objective": "total" | "bottleneck"}
+    where teams defaults to every team in the upload.
+    """
+    payload = request.get_json(silent=True) or {}
+    dataset = dataset_cache.get(payload.get("datasetKey"))
+    if dataset is None:
+        return jsonify({"error": "This CSV is no longer loaded on the server. Please upload it again."}), 400
+    objective = payload.get("objective", "total")
+    if objective not in OBJECTIVES:
+        return jsonify({"error": f"Unknown objective: {objective}"}), 400
+    teams = payload.get("teams", dataset.teams)
+    if not isinstance(teams, list) or not all(isinstance(t, str) for t in teams):
+        return jsonify({"error": "teams must be a list of team numbers (strings)."}), 400
+    unknown = [t for t in teams if t not in dataset.index]
+    if unknown:
+        return jsonify({"error": f"Unknown team(s): {', '.join(unknown)}"}), 400
+    pool = sorted({dataset.index[t] for t in teams})
+
+    def finish(result):
+        return {
+            "objective": objective,
+            "alliances": [alliance_json(dataset, a, b, score) for a, b, score in result["alliances"]],
+            "bye": dataset.teams[result["bye"]] if result["bye"] is not None else None,
+            "total": result["total"],
+            "weakest": result["weakest"]
+        }
+
+    # Matching is cubic in the pool size.
+    with timer.stage("optimize", teams=len(pool)):
+        return jobs.run(
+            "optimize", optimize_alliances, dataset.sample, dataset.specimen, pool, objective,
+            cost=len(pool) ** 3, finish=finish
+        )
+
+@app.route('/bracket', methods=["POST"])
+def bracket():
+    """
+    Simulates the elimination bracket for the formed alliances.
+    Expects JSON: {"datasetKey": ..., "alliances": [[team, team], ...], "simulations": n, "seed": n}
+    At most MAX_ALLIANCES alliances, and no team on two of them. Alliances are
+    seeded by best combined OPR; the response gives each one's chance of
+    winning every round (see bracketSimulator).
+    """
+    payload = request.get_json(silent=True) or {}
+    dataset = dataset_cache.get(payload.get("datasetKey"))
+    if dataset is None:
+        return jsonify({"error": "This CSV is no longer loaded on the server. Please upload it again."}), 400
+    formed = payload.get("alliances", [])
+    if not isinstance(formed, list) or len(formed) < 2:
+        return jsonify({"error": "Form at least two alliances to simulate a bracket."}), 400
+    if len(formed) > MAX_ALLIANCES:
+        return jsonify({"error": f"A bracket holds at most {MAX_ALLIANCES} alliances."}), 400
+    if any(
+        not isinstance(teams, list) or len(teams) != 2 or not all(isinstance(t, str) for t in teams)
+        for teams in formed
+    ):
+        return jsonify({"error": "The bracket simulation takes two-team alliances (lists of two team numbers as strings)."}), 400
+    teams = [t for pair in formed for t in pair]
+    if len(set(teams)) != len(teams):
+        return jsonify({"error": "Every team can only be on one alliance."}), 400
+    unknown = [t for t in teams if t not in dataset.index]
+    if unknown:
+        return jsonify({"error": f"Unknown team(s): {', '.join(unknown)}"}), 400
+    try:
+        simulations = min(max(int(payload.get("simulations", DEFAULT_SIMULATIONS)), 100), MAX_SIMULATIONS)
+        seed = payload.get("seed")
+        seed = None if seed is None else int(seed)
+    except (TypeError, ValueError):
+        return jsonify({"error": "simulations and seed must be integers"}), 400
+
+    sample, specimen = dataset.sample, dataset.specimen
+    alliances = [best_roles(sample, specimen, dataset.index[a], dataset.index[b]) for a, b in formed]
+    # Seed 1 is the alliance with the best combined OPR (ties keep their order).
+    alliances.sort(key=lambda ab: -pair_score(sample, specimen, *ab))
+    sample_spread, specimen_spread = team_spread(dataset)
+
+    def finish(result):
+        rows = []
+        for seed_number, ((a, b), wins) in enumerate(zip(alliances, result["wins"].tolist()), start=1):
+            row = alliance_json(dataset, a, b, pair_score(sample, specimen, a, b))
+            row["seed"] = seed_number
+            row["rounds"] = dict(zip(result["rounds"], wins))
+            rows.append(row)
+        return {"simulations": simulations, "rounds": result["rounds"], "alliances": rows}
+
+    # Scores are drawn for every alliance, round and game of every simulation.
+    rounds = max(1, (len(alliances) - 1).bit_length())
+    with timer.stage("bracket", alliances=len(alliances), simulations=simulations):
+        return jobs.run(
+            "bracket", simulate_bracket,
+            sample, specimen, sample_spread, specimen_spread, alliances, simulations, seed,
+            cost=simulations * len(alliances) * rounds * SERIES_LENGTH, finish=finish
+        )
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,459 @@
+"""
+Splits a pool of teams into two-team alliances for allianceBuild.
+
+Two objectives are supported:
+  "total"      - maximize the summed best score of all alliances
+  "bottleneck" - maximize the score of the weakest alliance
+
+With an odd number of teams, one team sits out (the "bye").
+
+For "total", every alliance has one SAMPLE and one SPECIMEN team, so the sum of
+all alliances is the sum of SAMPLE OPRs of one half of the pool plus SPECIMEN
+OPRs of the other half, no matter how the halves are paired. The best split
+puts the teams with the largest (sample - specimen) on SAMPLE, which gives the
+maximum-weight matching exactly with a sort instead of a general blossom search.
+
+For "bottleneck", the answer is the highest score threshold T for which the
+"scores at least T together" graph still has a perfect matching. Thresholds are
+binary-searched and each one is checked with Edmonds' blossom algorithm.
+
+top_alliances ranks alliances of three (or more) teams without scoring every
+one: no alliance scores more than the sum of its teams' better roles, so a
+depth-first search over teams in order of their better role stops as soon as
+that bound can't beat the current k-th best (ties included, so pools full
+of equal or zero OPRs stop right away).
+"""
+import heapq
+from collections import deque
+
+import numpy as np
+
+from pairEngine import score_pairs
+
+OBJECTIVES = ("total", "bottleneck")
+
+
+def pair_score(sample, specimen, a, b):
+    """
+    Best score of teams a and b together (the better of their two role assignments).
+    """
+    return max(sample[a] + specimen[b], specimen[a] + sample[b])
+
+
+def alliance_score(sample, specimen, teams):
+    """
+    Best score of an alliance of any size where every team plays one role and
+    both roles are covered: each team takes its better role, unless that puts
+    everyone on the same side, in which case the team losing least switches.
+    For two teams this is pair_score.
+    """
+    teams = list(teams)
+    s, p = sample[teams], specimen[teams]
+    best = float(np.maximum(s, p).sum())
+    if len(teams) < 2:
+        return best
+    gain = s - p
+    if (gain > 0).all() or (gain < 0).all():
+        best -= float(np.abs(gain).min())
+    return best
+
+
+def score_alliances(sample, specimen, alliances):
+    """
+    Scores many alliances of the same size at once. `alliances` is an (m, k)
+    array of team indices, k >= 2. Option A puts each alliance's first team on
+    SAMPLE and option B on SPECIMEN, the others taking their better role while
+    both roles stay covered (for pairs these are the usual options A and B);
+    the best score is the larger, option A on ties, and equals alliance_score.
+    Returns (best, option_a, option_b, on_sample), where on_sample is an
+    (m, k) boolean array of the best assignment's roles.
+    """
+    alliances = np.asarray(alliances, dtype=np.int64)
+    s, p = sample[alliances], specimen[alliances]
+    first_s, first_p = s[:, 0], p[:, 0]
+    rest_s, rest_p = s[:, 1:], p[:, 1:]
+    gain = rest_s - rest_p
+    rest_best = np.maximum(rest_s, rest_p).sum(axis=1)
+    rows = np.arange(len(alliances))
+
+    # A: the others need a SPECIMEN team; if all of them prefer SAMPLE, the one losing least switches.
+    roles_a = gain > 0
+    switch_a = roles_a.all(axis=1)
+    roles_a[rows[switch_a], np.argmin(gain[switch_a], axis=1)] = False
+    option_a = first_s + rest_best - np.where(switch_a, gain.min(axis=1), 0.0)
+    # B: the others need a SAMPLE team.
+    roles_b = gain >= 0
+    switch_b = ~roles_b.any(axis=1)
+    roles_b[rows[switch_b], np.argmax(gain[switch_b], axis=1)] = True
+    option_b = first_p + rest_best + np.where(switch_b, gain.max(axis=1), 0.0)
+
+    use_a = option_a >= option_b
+    on_sample = np.column_stack((use_a, np.where(use_a[:, None], roles_a, roles_b)))
+    return np.maximum(option_a, option_b), option_a, option_b, on_sample
+
+
+def top_alliances(sample, specimen, k=10, size=3, alive=None, team=None):
+    """
+    The k best alliances of `size` teams (scored like alliance_score) among
+    the `alive` teams (all by default), or only those including `team`, as
+    (score, indices) with indices ascending, best first. Among equal scores
+    the first found are kept (teams taken by better role, then index) and
+    listed in combinations order.
+
+    Mixed alliances (some team can play each side) score the sum of their
+    teams' better roles; one-sided ones (every team better at SAMPLE, or
+    every team at SPECIMEN) lose the smallest difference, since one team has
+    to switch. Each kind is searched with its own bound, sharing one top-k heap.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    pool = np.flatnonzero(alive) if alive is not None else np.arange(len(sample))
+    fixed = []
+    if team is not None:
+        pool = pool[pool != team]
+        fixed = [team]
+    if k <= 0 or size - len(fixed) < 1 or len(pool) < size - len(fixed):
+        return []
+    # Min-heap of (score, negated indices): its root is the worst alliance kept.
+    heap = []
+
+    def threshold():
+        # Anything scoring at most this can't get into the heap.
+        return heap[0][0] + 1e-9 if len(heap) == k else -np.inf
+
+    def push(scores, candidates, chosen):
+        for score, candidate in zip(scores.tolist(), candidates.tolist()):
+            if score <= threshold():
+                continue
+            entry = (score, tuple(-i for i in sorted(chosen + [candidate])))
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heapreplace(heap, entry)
+
+    gain = sample - specimen
+    _search_mixed(np.maximum(sample, specimen), gain, pool, fixed, size, threshold, push)
+    _search_one_sided(sample, specimen, pool, fixed, size, threshold, push)
+    _search_one_sided(specimen, sample, pool, fixed, size, threshold, push)
+    return [(score, tuple(-i for i in negated)) for score, negated in sorted(heap, reverse=True)]
+
+
+def top_alliances_with(sample, specimen, k, size, alive, team=None):
+    """
+    (top_alliances overall, top_alliances including `team`, [] without one),
+    as one job for the job queue.
+    """
+    mine = top_alliances(sample, specimen, k, size, alive, team) if team is not None else []
+    return top_alliances(sample, specimen, k, size, alive), mine
+
+
+def _suffix_max(values):
+    """
+    out[i] = max(values[i:]), -inf past the end.
+    """
+    out = np.full(len(values) + 1, -np.inf)
+    if len(values):
+        out[:-1] = np.maximum.accumulate(values[::-1])[::-1]
+    return out
+
+
+def _search_mixed(better, gain, pool, fixed, size, threshold, push):
+    """
+    top_alliances over mixed alliances: some team with gain <= 0 and some
+    with gain >= 0 (a team with equal OPRs is both).
+    """
+    order = pool[np.argsort(-better[pool], kind="stable")]
+    value, side = better[order], gain[order]
+    # Best value still to come on each side (value is sorted, so the first one found).
+    best_le = _suffix_max(np.where(side <= 0, value, -np.inf))
+    best_ge = _suffix_max(np.where(side >= 0, value, -np.inf))
+
+    def bound(start, left, has_le, has_ge):
+        top = value[start:start + left].sum()
+        rest = value[start:start + left - 1].sum()
+        # A side the alliance is still missing takes one of the spots.
+        if not has_le:
+            top = min(top, rest + best_le[start])
+        if not has_ge:
+            top = min(top, rest + best_ge[start])
+        return top
+
+    def search(start, chosen, total, has_le, has_ge):
+        left = size - len(chosen)
+        if left == 1:
+            ok = np.ones(len(order) - start, dtype=bool)
+            if not has_le:
+                ok &= side[start:] <= 0
+            if not has_ge:
+                ok &= side[start:] >= 0
+            push(total + value[start:][ok], order[start:][ok], chosen)
+            return
+        for position in range(start, len(order) - left + 1):
+            if total + bound(position, left, has_le, has_ge) <= threshold():
+                break
+            g = side[position]
+            search(position + 1, chosen + [int(order[position])], total + value[position],
+                   has_le or g <= 0, has_ge or g >= 0)
+
+    search(0, list(fixed), float(better[fixed].sum()),
+           bool((gain[fixed] <= 0).any()), bool((gain[fixed] >= 0).any()))
+
+
+def _search_one_sided(main, off, pool, fixed, size, threshold, push):
+    """
+    top_alliances over alliances where every team is better at `main` than
+    at `off`: their `main` values minus the smallest difference.
+    """
+    diff = main - off
+    if (diff[fixed] <= 0).any():
+        return
+    pool = pool[diff[pool] > 0]
+    order = pool[np.argsort(-main[pool], kind="stable")]
+    value, spare, margin = main[order], off[order], diff[order]
+    best_spare = _suffix_max(spare)
+
+    def bound(start, left, smallest):
+        # Either a chosen team switches (losing at least `smallest`), or one
+        # of the new ones does (worth at most the best `off` value left).
+        return max(
+            value[start:start + left].sum() - smallest,
+            value[start:start + left - 1].sum() + best_spare[start]
+        )
+
+    def search(start, chosen, total, smallest):
+        left = size - len(chosen)
+        if left == 1:
+            push(total + value[start:] - np.minimum(smallest, margin[start:]), order[start:], chosen)
+            return
+        for position in range(start, len(order) - left + 1):
+            if total + bound(position, left, smallest) <= threshold():
+                break
+            search(position + 1, chosen + [int(order[position])], total + value[position],
+                   min(smallest, margin[position]))
+
+    search(0, list(fixed), float(main[fixed].sum()), float(diff[fixed].min()) if fixed else np.inf)
+
+
+def best_roles(sample, specimen, a, b):
+    """
+    Returns (sample_team, specimen_team) for teams a and b in their better role
+    assignment (a on SAMPLE when both are equal, like option A).
+    """
+    if sample[a] + specimen[b] >= specimen[a] + sample[b]:
+        return a, b
+    return b, a
+
+
+def _split_by_role(sample, specimen, teams):
+    """
+    Returns (sample_teams, specimen_teams) for an even-sized list of teams,
+    putting the half with the biggest sample advantage on SAMPLE.
+    """
+    advantage = sample[teams] - specimen[teams]
+    order = teams[np.argsort(-advantage, kind="stable")]
+    half = len(teams) // 2
+    return order[:half], order[half:]
+
+
+def max_total_alliances(sample, specimen, teams=None):
+    """
+    Alliances maximizing the total score. Returns (alliances, bye) where
+    alliances is a list of (sample_team, specimen_team) index pairs.
+
+    Within the optimal split any pairing gives the same total, so the strongest
+    SAMPLE team is paired with the weakest SPECIMEN team (and so on), which also
+    makes the weakest alliance as strong as that split allows.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    teams = np.arange(len(sample)) if teams is None else np.asarray(teams, dtype=np.int64)
+    bye = None
+    if len(teams) % 2:
+        # Leaving team x out scores sum(p) - p_x plus the best m advantages among the rest.
+        m = len(teams) // 2
+        advantage = sample[teams] - specimen[teams]
+        order = np.argsort(-advantage, kind="stable")
+        prefix = np.concatenate(([0.0], np.cumsum(advantage[order])))
+        position = np.empty(len(teams), dtype=np.int64)
+        position[order] = np.arange(len(teams))
+        best_rest = np.where(position < m, prefix[m + 1] - advantage, prefix[m])
+        totals = specimen[teams].sum() - specimen[teams] + best_rest
+        out = int(np.argmax(totals))
+        bye = int(teams[out])
+        teams = np.delete(teams, out)
+    if len(teams) == 0:
+        return [], bye
+
+    sample_teams, specimen_teams = _split_by_role(sample, specimen, teams)
+    sample_teams = sample_teams[np.argsort(-sample[sample_teams], kind="stable")]
+    specimen_teams = specimen_teams[np.argsort(specimen[specimen_teams], kind="stable")]
+    return list(zip(sample_teams.tolist(), specimen_teams.tolist())), bye
+
+
+def _max_matching(adjacency, match):
+    """
+    Edmonds' blossom algorithm for maximum-cardinality matching in a general graph.
+    `match` (partner index or -1) is a starting matching and is grown in place.
+    """
+    n = len(adjacency)
+
+    def lowest_common_ancestor(base, parent, a, b):
+        seen = [False] * n
+        while True:
+            a = base[a]
+            seen[a] = True
+            if match[a] == -1:
+                break
+            a = parent[match[a]]
+        while True:
+            b = base[b]
+            if seen[b]:
+                return b
+            b = parent[match[b]]
+
+    def mark_path(base, parent, blossom, v, b, child):
+        while base[v] != b:
+            blossom[base[v]] = blossom[base[match[v]]] = True
+            parent[v] = child
+            child = match[v]
+            v = parent[match[v]]
+
+    def find_augmenting_path(root):
+        used = [False] * n
+        parent = [-1] * n
+        base = list(range(n))
+        used[root] = True
+        queue = deque([root])
+        while queue:
+            v = queue.popleft()
+            for to in adjacency[v]:
+                if base[v] == base[to] or match[v] == to:
+                    continue
+                if to == root or (match[to] != -1 and parent[match[to]] != -1):
+                    # Odd cycle: shrink the blossom onto its base.
+                    current = lowest_common_ancestor(base, parent, v, to)
+                    blossom = [False] * n
+                    mark_path(base, parent, blossom, v, current, to)
+                    mark_path(base, parent, blossom, to, current, v)
+                    for i in range(n):
+                        if blossom[base[i]]:
+                            base[i] = current
+                            if not used[i]:
+                                used[i] = True
+                                queue.append(i)
+                elif parent[to] == -1:
+                    parent[to] = v
+                    if match[to] == -1:
+                        return to, parent
+                    used[match[to]] = True
+                    queue.append(match[to])
+        return -1, parent
+
+    for root in range(n):
+        if match[root] != -1:
+            continue
+        end, parent = find_augmenting_path(root)
+        while end != -1:
+            previous = parent[end]
+            after = match[previous]
+            match[end] = previous
+            match[previous] = end
+            end = after
+    return match
+
+
+def _perfect_matching(scores, threshold, allow_bye):
+    """
+    A perfect matching using only pairs scoring at least `threshold`, or None.
+    With allow_bye, one extra "bye" vertex (index n) may be matched to anyone.
+    """
+    n = len(scores)
+    allowed = scores >= threshold
+    np.fill_diagonal(allowed, False)
+    adjacency = [np.flatnonzero(row).tolist() for row in allowed]
+    if allow_bye:
+        for row in adjacency:
+            row.append(n)
+        adjacency.append(list(range(n)))
+    size = len(adjacency)
+
+    # Greedy start (fewest options first) so the blossom search only fixes the leftovers.
+    match = [-1] * size
+    for v in sorted(range(size), key=lambda v: len(adjacency[v])):
+        if match[v] == -1:
+            for to in adjacency[v]:
+                if match[to] == -1:
+                    match[v], match[to] = to, v
+                    break
+    match = _max_matching(adjacency, match)
+    if any(m == -1 for m in match):
+        return None
+    return match
+
+
+def bottleneck_alliances(sample, specimen, teams=None):
+    """
+    Alliances maximizing the weakest alliance's score. Returns (alliances, bye)
+    like max_total_alliances, with each alliance as (sample_team, specimen_team).
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    teams = np.arange(len(sample)) if teams is None else np.asarray(teams, dtype=np.int64)
+    if len(teams) < 2:
+        return [], (int(teams[0]) if len(teams) else None)
+    pool_sample, pool_specimen = sample[teams], specimen[teams]
+    scores = np.maximum(
+        pool_sample[:, None] + pool_specimen[None, :],
+        pool_specimen[:, None] + pool_sample[None, :],
+    )
+    allow_bye = len(teams) % 2 == 1
+
+    # The max-total split is always feasible, so its weakest alliance is a lower bound.
+    start, _ = max_total_alliances(pool_sample, pool_specimen)
+    low = min(scores[a, b] for a, b in start)
+    candidates = np.unique(score_pairs(pool_sample, pool_specimen)[4])
+    candidates = candidates[candidates >= low]
+
+    best_match = _perfect_matching(scores, low, allow_bye)
+    lo, hi = 0, len(candidates) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        match = _perfect_matching(scores, candidates[mid], allow_bye)
+        if match is None:
+            hi = mid - 1
+        else:
+            lo, best_match = mid, match
+
+    alliances, bye = [], None
+    for a, b in enumerate(best_match[:len(teams)]):
+        if b == len(teams):
+            bye = int(teams[a])
+        elif a < b:
+            # Orient each alliance by its better role assignment.
+            sample_team, specimen_team = best_roles(pool_sample, pool_specimen, a, b)
+            alliances.append((int(teams[sample_team]), int(teams[specimen_team])))
+    alliances.sort(key=lambda ab: -pair_score(sample, specimen, *ab))
+    return alliances, bye
+
+
+def optimize_alliances(sample, specimen, teams=None, objective="total"):
+    """
+    Runs the chosen objective and returns a summary dict:
+      alliances - list of (sample_team, specimen_team, score), strongest first
+      bye       - team left out of an odd pool (or None)
+      total     - summed alliance score
+      weakest   - lowest alliance score (None without alliances)
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; use one of {', '.join(OBJECTIVES)}")
+    solve = max_total_alliances if objective == "total" else bottleneck_alliances
+    alliances, bye = solve(sample, specimen, teams)
+    scored = [(a, b, pair_score(sample, specimen, a, b)) for a, b in alliances]
+    scored.sort(key=lambda row: -row[2])
+    scores = [row[2] for row in scored]
+    return {
+        "alliances": scored,
+        "bye": bye,
+        "total": float(sum(scores)),
+        "weakest": float(min(scores)) if scores else None,
+    }
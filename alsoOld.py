@@ -198,8 +198,11 @@ HTML_CODE = """
 # The rest of the file is the Python code running a Flask app that uses your analysis.
 
 from flask import Flask, request
-import pandas as pd
+import numpy as np
 from itertools import combinations
+from scoutingLoader import load_scouting_sheet
+from pairEngine import best_other, top_pair_check
+from pairRanking import count_pairs_above
 
 app = Flask(__name__)
 
@@ -215,28 +218,13 @@ def analyze():
         return "No file uploaded.", 400
     try:
         # Note: header=1 because the first row is extra, and row 1 contains the proper headers.
-        df = pd.read_csv(file, header=1)
+        sheet = load_scouting_sheet(file)
     except Exception as e:
         return f"Error reading CSV file: {e}", 400
 
-    # Clean up column names
-    df.columns = df.columns.str.strip()
-    
-    # Define column names as used in your CSV
-    team_col = "Team #"
-    sample_opr_col = "Observed SAMPLEOPR"
-    specimen_opr_col = "Observed SPECIMEN OPR"
-    
-    # Convert OPR columns to numeric and fill NaN with 0
-    df[sample_opr_col] = pd.to_numeric(df[sample_opr_col], errors='coerce').fillna(0)
-    df[specimen_opr_col] = pd.to_numeric(df[specimen_opr_col], errors='coerce').fillna(0)
-    
-    # Create the 'Best OPR' column
-    df["Best OPR"] = df[[sample_opr_col, specimen_opr_col]].max(axis=1)
-    
-    # Ensure team numbers are strings and stripped of extra spaces
-    df[team_col] = df[team_col].astype(str).str.strip()
-    teams_dict = dict(zip(df[team_col], df["Best OPR"]))
+    # Best OPR is whichever of sample/specimen the team scores more with.
+    best_opr = np.maximum(sheet.sample, sheet.specimen)
+    teams_dict = dict(zip(sheet.teams, best_opr))
     
     # Generate all possible two-team combinations
     all_pairs = list(combinations(teams_dict.keys(), 2))
@@ -267,7 +255,7 @@ def analyze():
         
         # Get ranking for the pairing of my_team with its best partner
         best_partner = partners[0][0] if partners else None
-        rank = get_team_pair_rank(my_team, pair_scores, teams_dict)
+        rank = get_team_pair_rank(my_team, teams_dict)
         if rank is not None:
             output_lines.append(f"\nThe pairing of team {my_team} with its best partner (Team {best_partner}) is ranked #{rank} in combined OPR.")
         else:
@@ -275,11 +263,20 @@ def analyze():
     else:
         output_lines.append(f"\nTeam {my_team} not found in the data.")
     
-    # Competitiveness check of the top pair
-    if is_top_pair_unbeatable(pair_scores):
+    # Competitiveness check of the top pair, straight from the Best OPR values
+    best_values = np.array(list(teams_dict.values()), dtype=float)
+    check = top_pair_check(best_values, best_values)
+    team_names = list(teams_dict)
+    if check.unbeatable:
         output_lines.append("The top team combination is unbeatable.")
+        if check.runner_up is not None:
+            t1, t2, _ = check.runner_up
+            output_lines.append(f"It leads the next pair (Teams {team_names[t1]} & {team_names[t2]}) by {check.margin:.2f}.")
     else:
         output_lines.append("Another team combination can beat the top pair.")
+        if check.runner_up is not None:
+            t1, t2, score = check.runner_up
+            output_lines.append(f"Teams {team_names[t1]} & {team_names[t2]} tie it at {score:.2f}.")
     
     # Return the output as plain text
     return "\n".join(output_lines)
@@ -287,7 +284,8 @@ def analyze():
 def is_top_pair_unbeatable(pair_scores):
     """
     Returns True if the top pair (first element in the sorted list) has a combined OPR
-    that no other pair matches or exceeds.
+    that no other pair matches or exceeds. analyze() uses pairEngine.top_pair_check,
+    which answers this from the team values without the sorted list.
     """
     if not pair_scores:
         return False
@@ -296,27 +294,19 @@ def is_top_pair_unbeatable(pair_scores):
         return True
     return all(score < best_score for _, _, score in pair_scores[1:])
 
-def get_team_pair_rank(my_team, pair_scores, teams_dict):
+def get_team_pair_rank(my_team, teams_dict):
     """
-    Returns the 1-indexed rank of the pairing of my_team with its best partner among all combinations.
+    Returns the 1-indexed rank of the pairing of my_team with its best partner among all
+    combinations: 1 + the number of pairs with a strictly higher combined OPR.
+    Counted from the sorted team values, so the full pair list isn't needed.
     """
-    if my_team not in teams_dict:
+    if my_team not in teams_dict or len(teams_dict) < 2:
         return None
 
-    best_partner = None
-    best_score = -float('inf')
-    for team, opr in teams_dict.items():
-        if team == my_team:
-            continue
-        combined = teams_dict[my_team] + opr
-        if combined > best_score:
-            best_score = combined
-            best_partner = team
-
-    for rank, (t1, t2, score) in enumerate(pair_scores, start=1):
-        if {t1, t2} == {my_team, best_partner}:
-            return rank
-    return None
+    values = np.array(list(teams_dict.values()), dtype=float)
+    i = list(teams_dict).index(my_team)
+    _, partner_values = best_other(values)
+    return count_pairs_above(values[i] + partner_values[i], values) + 1
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,274 @@
+"""
+Benchmarks for MainScouter and allianceBuild on synthetic scouting sheets.
+
+Generates CSVs in the same shape as our spreadsheet export (an extra first row,
+headers on row 1, the Team # and OPR columns plus some extra ones) and times:
+  parse          - streaming the sheet the way uploads are read (scoutingLoader.stream_scouting_sheets)
+  numeric        - building the Dataset from the parsed sheets (Dataset.from_sheets)
+  parse_whole    - the single-read loader (scoutingLoader.load_scouting_sheet), for
+                   comparison; its teams and values must match the streamed sheet
+  pairs          - pair generation (all pairs, or the first page for big pools)
+  sort           - ranking the pairs; null for pools over RANKING_MAX_TEAMS, whose
+                   pager orders pairs while making the page (timed under pairs)
+  analyze_upload - POST /analyze with the file, through the Flask test client
+  analyze_cached - POST /analyze again with the same inputs (served from the result cache)
+  upload         - allianceBuild POST /upload
+  reopen         - reopening the saved upload from the on-disk dataset store
+Each stage records the best wall time over the repeats, plus its peak traced
+memory from one extra pass with tracemalloc on. The server-side breakdown of
+each request (its Server-Timing header) is saved under "server_timing".
+
+Usage:
+  python benchmark.py                                   # 30, 100, 1000, 10000 teams
+  python benchmark.py --sizes 30 100 --repeat 5
+  python benchmark.py --compare bench_results/<old>.json
+Results are written to bench_results/<git commit>.json unless --output is given.
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import allianceBuild
+import MainScouter
+from datasetCache import Dataset, content_key
+from datasetStore import DatasetStore
+from pairEngine import PairPager, score_pairs
+from scoutingLoader import load_scouting_sheet, stream_scouting_sheets
+from stageTimer import parse_server_timing
+
+DEFAULT_SIZES = (30, 100, 1000, 10000)
+
+# A stage this much slower than the compared run is flagged as a regression.
+REGRESSION_RATIO = 1.25
+
+
+def make_scouting_csv(n_teams, seed=0):
+    """
+    Returns the text of a realistic scouting sheet with n_teams teams.
+    Like a real export it has a preamble row, stray spaces in headers, a few
+    blank or non-numeric OPR cells and a trailing empty row (so team numbers
+    come back as "12345.0").
+    """
+    rng = np.random.default_rng(seed)
+    team_numbers = rng.choice(np.arange(100, 30000), size=n_teams, replace=False)
+    # Most teams lean towards one role; a few are strong at both.
+    skill = rng.gamma(2.0, 12.0, size=n_teams)
+    lean = rng.beta(2.0, 2.0, size=n_teams)
+    sample = np.round(skill * lean * 2, 1)
+    specimen = np.round(skill * (1 - lean) * 2, 1)
+
+    lines = [",".join(["2", "Match1"] + [""] * 5)]
+    lines.append("Team #,Name,Highest NP OPR, Observed SAMPLEOPR ,Observed SPECIMEN OPR,Notes,Auto")
+    for i, team in enumerate(team_numbers):
+        s_cell, p_cell = str(sample[i]), str(specimen[i])
+        roll = rng.random()
+        if roll < 0.02:
+            s_cell = ""
+        elif roll < 0.03:
+            p_cell = "n/a"
+        lines.append(
+            f"{team},Team {team},{max(sample[i], specimen[i])},{s_cell},{p_cell},"
+            f"\"scouted, ok\",{rng.integers(0, 30)}"
+        )
+    lines.append("," * 6)
+    return "\n".join(lines) + "\n"
+
+
+class Stage:
+    """
+    One stage's best wall time over the repeats and its peak traced memory.
+    Tracing slows Python down, so time is only recorded while tracemalloc is
+    off and memory only while it is on.
+    """
+
+    def __init__(self):
+        self.seconds = float("inf")
+        self.peak_bytes = 0
+
+    def run(self, func, *args):
+        if not tracemalloc.is_tracing():
+            start = time.perf_counter()
+            result = func(*args)
+            self.seconds = min(self.seconds, time.perf_counter() - start)
+            return result
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        result = func(*args)
+        self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1] - start_memory)
+        return result
+
+    def as_dict(self):
+        if self.seconds == float("inf"):
+            # The stage doesn't apply to this run.
+            return {"ms": None, "peak_kb": None}
+        return {"ms": round(self.seconds * 1000, 3), "peak_kb": round(self.peak_bytes / 1024, 1)}
+
+
+def stream_sheets(text):
+    return stream_scouting_sheets(io.StringIO(text))
+
+
+def load_sheet(text):
+    return load_scouting_sheet(io.StringIO(text))
+
+
+def check_same_sheet(streamed, whole):
+    """
+    Raises if the streaming and single-read loaders disagree on a sheet.
+    """
+    if (
+        streamed.teams != whole.teams
+        or not np.array_equal(streamed.sample, whole.sample)
+        or not np.array_equal(streamed.specimen, whole.specimen)
+    ):
+        raise RuntimeError("stream_scouting_sheets and load_scouting_sheet disagree")
+
+
+def generate_pairs(dataset):
+    """
+    The pair generation analyze() does: every pair for rankable pools, otherwise
+    only the first page from the lazy enumerator.
+    """
+    if len(dataset.teams) <= MainScouter.RANKING_MAX_TEAMS:
+        return score_pairs(dataset.sample, dataset.specimen)
+    return PairPager(dataset.teams, dataset.sample, dataset.specimen).page(0)
+
+
+def sort_pairs(pairs):
+    return np.argsort(-pairs[4], kind="stable")
+
+
+def post_file(client, route, text, form=None):
+    data = dict(form or {})
+    data["csvFile"] = (io.BytesIO(text.encode()), "bench.csv")
+    response = client.post(route, data=data, content_type="multipart/form-data")
+    if response.status_code != 200:
+        raise RuntimeError(f"{route} returned {response.status_code}")
+    return response
+
+
+def bench_size(n_teams, repeat, seed):
+    """
+    Runs every stage `repeat` times for one sheet size and returns the results.
+    """
+    text = make_scouting_csv(n_teams, seed)
+    stages = {name: Stage() for name in (
+        "parse", "numeric", "parse_whole", "pairs", "sort", "analyze_upload", "analyze_cached", "upload", "reopen"
+    )}
+    my_team = text.splitlines()[2].split(",")[0] + ".0"
+    MainScouter.timer.enabled = allianceBuild.timer.enabled = True
+    server_timing = {}
+
+    def timed(name, func, *args):
+        # Best server-side time per stage, read from the response headers.
+        response = stages[name].run(func, *args)
+        if not tracemalloc.is_tracing():
+            best = server_timing.setdefault(name, {})
+            for stage, ms in parse_server_timing(response.headers.get("Server-Timing")).items():
+                best[stage] = round(min(best.get(stage, ms), ms), 3)
+        return response
+
+    # The extra last pass measures memory with tracemalloc on.
+    for i in range(repeat + 1):
+        if i == repeat:
+            tracemalloc.start()
+        sheets = stages["parse"].run(stream_sheets, text)
+        dataset = stages["numeric"].run(Dataset.from_sheets, sheets)
+        check_same_sheet(sheets[None], stages["parse_whole"].run(load_sheet, text))
+        pairs = stages["pairs"].run(generate_pairs, dataset)
+        if isinstance(pairs, tuple):
+            stages["sort"].run(sort_pairs, pairs)
+        del sheets, dataset, pairs
+
+        # Fresh caches and stores so every repeat pays for the upload, then one cached re-run.
+        with tempfile.TemporaryDirectory() as data_dir:
+            store = DatasetStore(data_dir)
+            MainScouter.dataset_store = allianceBuild.dataset_store = store
+            MainScouter.dataset_cache = MainScouter.DatasetCache()
+            MainScouter.result_cache = MainScouter.ResultCache()
+            allianceBuild.dataset_cache = allianceBuild.DatasetCache()
+            client = MainScouter.app.test_client()
+            timed("analyze_upload", post_file, client, "/analyze", text, {"myTeam": my_team})
+            timed(
+                "analyze_cached",
+                lambda: client.post("/analyze", data={"myTeam": my_team}, content_type="multipart/form-data")
+            )
+            timed("upload", post_file, allianceBuild.app.test_client(), "/upload", text)
+            stages["reopen"].run(store.load, content_key(text.encode()))
+    tracemalloc.stop()
+
+    return {
+        "teams": n_teams,
+        "csv_bytes": len(text.encode()),
+        "stages": {name: stage.as_dict() for name, stage in stages.items()},
+        "server_timing": server_timing,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """
+    Prints stages that got slower than REGRESSION_RATIO times the baseline.
+    Returns True if any did.
+    """
+    old = {run["teams"]: run["stages"] for run in baseline["runs"]}
+    regressed = False
+    for run in results["runs"]:
+        for name, stage in run["stages"].items():
+            before = old.get(run["teams"], {}).get(name)
+            if not before or not before["ms"] or stage["ms"] is None:
+                continue
+            if stage["ms"] > before["ms"] * REGRESSION_RATIO:
+                regressed = True
+                print(f"REGRESSION {run['teams']} teams, {name}: {before['ms']} ms -> {stage['ms']} ms")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    runs = []
+    for n_teams in args.sizes:
+        run = bench_size(n_teams, args.repeat, args.seed)
+        runs.append(run)
+        cells = ", ".join(f"{name} {s['ms']} ms" for name, s in run["stages"].items() if s["ms"] is not None)
+        print(f"{n_teams} teams: {cells}")
+
+    results = {"commit": commit, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "runs": runs}
+    output = args.output or os.path.join("bench_results", f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f)):
+                raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Monte Carlo simulation of the elimination bracket for allianceBuild.
+
+Alliances are seeded in the order given (seed 1 first) into a standard
+single-elimination bracket: 1 v 4 and 2 v 3 for four alliances, 1 v 8, 4 v 5,
+2 v 7, 3 v 6 for eight, with byes for the top seeds when the count isn't a
+power of two. Every series is best-of-3; a tied game is settled with a coin
+flip. A bracket holds at most MAX_ALLIANCES alliances.
+
+Game scores come from matchPredictor.simulate_scores: one batch of draws for
+every simulation, round, game and alliance, CHUNK simulations at a time so
+memory stays bounded. Winners are then picked for a whole chunk at once with
+array indexing. With `workers`, the simulations are
+split over a process pool; each worker gets its own seed from the seed given,
+so results are repeatable for the same seed and worker count.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from matchPredictor import simulate_scores
+
+DEFAULT_SIMULATIONS = 20000
+MAX_SIMULATIONS = 500000
+SERIES_LENGTH = 3
+MAX_ALLIANCES = 8
+# Simulations drawn at once.
+CHUNK = 10000
+
+
+def bracket_order(size):
+    """
+    Seeds (0-indexed) in bracket position order for a bracket of `size`
+    (a power of two), so neighbouring positions meet in the first round.
+    """
+    order = [0]
+    while len(order) < size:
+        count = len(order) * 2
+        order = [seed for top in order for seed in (top, count - 1 - top)]
+    return order
+
+
+def round_names(rounds):
+    """
+    Names of the rounds, first to last: ..., "quarterfinal", "semifinal", "final".
+    """
+    names = []
+    for r in range(rounds):
+        remaining = 1 << (rounds - r)
+        names.append({2: "final", 4: "semifinal", 8: "quarterfinal"}.get(remaining, f"round of {remaining}"))
+    return names
+
+
+def _simulate(sample, specimen, sample_spread, specimen_spread, alliances, simulations, seed, series_length):
+    """
+    Runs `simulations` brackets and returns a (len(alliances), rounds) array of
+    how many times each alliance won each round. Top-level so worker processes can run it.
+    """
+    rng = np.random.default_rng(seed)
+    count = len(alliances)
+    size = 1 << max(1, (count - 1).bit_length())
+    rounds = size.bit_length() - 1
+    slots = np.array(bracket_order(size))
+    slots[slots >= count] = -1  # byes
+    wins = np.zeros((count, rounds), dtype=np.int64)
+    for start in range(0, simulations, CHUNK):
+        chunk = min(CHUNK, simulations - start)
+        scores = simulate_scores(
+            sample, specimen, sample_spread, specimen_spread, alliances,
+            chunk * rounds * series_length, rng
+        ).reshape(chunk, rounds, series_length, count)
+        current = np.tile(slots, (chunk, 1))
+        for r in range(rounds):
+            upper, lower = current[:, 0::2], current[:, 1::2]
+            games = scores[:, r]
+            upper_scores = np.take_along_axis(games, np.maximum(upper, 0)[:, None, :], axis=2)
+            lower_scores = np.take_along_axis(games, np.maximum(lower, 0)[:, None, :], axis=2)
+            coin = rng.random(upper_scores.shape) < 0.5
+            upper_games = (upper_scores > lower_scores) | ((upper_scores == lower_scores) & coin)
+            upper_wins = upper_games.sum(axis=1) * 2 > series_length
+            upper_wins = np.where(lower < 0, True, np.where(upper < 0, False, upper_wins))
+            current = np.where(upper_wins, upper, lower)
+            wins[:, r] += np.bincount(current[current >= 0], minlength=count)
+    return wins
+
+
+def simulate_bracket(sample, specimen, sample_spread, specimen_spread, alliances,
+                     simulations=DEFAULT_SIMULATIONS, seed=None, workers=None,
+                     series_length=SERIES_LENGTH):
+    """
+    Simulates the bracket for `alliances` ((sample_team, specimen_team) index
+    pairs in seed order) and returns a dict with
+      rounds - round names, first to last
+      wins   - (len(alliances), rounds) array of the chance of winning each round;
+               the last column is the chance of winning the event
+    """
+    if len(alliances) < 2:
+        raise ValueError("At least two alliances are needed for a bracket")
+    if len(alliances) > MAX_ALLIANCES:
+        raise ValueError(f"A bracket holds at most {MAX_ALLIANCES} alliances")
+    args = (sample, specimen, sample_spread, specimen_spread, alliances)
+    if workers and workers > 1:
+        chunks = np.full(workers, simulations // workers)
+        chunks[:simulations % workers] += 1
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_simulate, *args, int(chunk), child, series_length)
+                for chunk, child in zip(chunks, seeds) if chunk
+            ]
+            wins = sum(future.result() for future in futures)
+    else:
+        wins = _simulate(*args, simulations, seed, series_length)
+    return {
+        "rounds": round_names(wins.shape[1]),
+        "wins": wins / simulations,
+    }
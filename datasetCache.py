@@ -0,0 +1,245 @@
+"""
+In-process cache of parsed scouting sheets.
+
+Uploads are keyed by a hash of their bytes, so the Flask session only has to
+carry that key. Re-running an analysis (or re-uploading the same file) reuses
+the already-cleaned arrays instead of parsing the CSV again.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# What content_key returns: a SHA-256 hex digest.
+KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def content_key(data):
+    """
+    Returns the cache key for the raw bytes of an upload.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_dataset_key(key):
+    """
+    True if `key` looks like a content_key. Keys from clients are checked with
+    this before they reach the cache or become a path in the dataset store.
+    """
+    return isinstance(key, str) and KEY_PATTERN.fullmatch(key) is not None
+
+
+def stream_key(stream, block_size=1024 * 1024):
+    """
+    Same key as content_key, computed block by block from a binary file
+    object, so a big upload never has to be read into memory at once.
+    Rewinds the stream afterwards.
+    """
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(block_size), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class Dataset:
+    """
+    One parsed scouting sheet.
+      teams     - team numbers as strings, in sheet order (first appearance)
+      sample    - float array of Observed SAMPLEOPR, aligned with teams
+      specimen  - float array of Observed SPECIMEN OPR, aligned with teams
+      all_teams - sorted team list used for the removal dropdown
+      ranking   - pairRanking.PairRanking built on first use (None until then)
+      pagers    - pairEngine.PairPager per removed-team set, for big pools
+      partners  - (removed-team key, pairEngine.BestPartners) for the latest pool
+      solver    - oprSolver.OprSolver when the OPRs were computed from match results
+      drafts    - draftSimulator.DraftSimulator per draft setup, kept between picks
+      events    - {event name: Dataset} when the sheet has an "Event" column
+    """
+
+    def __init__(self, teams, sample, specimen, all_teams=None):
+        self.teams = list(teams)
+        self.sample = np.asarray(sample, dtype=float)
+        self.specimen = np.asarray(specimen, dtype=float)
+        self.all_teams = sorted(self.teams) if all_teams is None else list(all_teams)
+        self.index = {team: i for i, team in enumerate(self.teams)}
+        self.ranking = None
+        self.pagers = OrderedDict()
+        self.partners = None
+        self.solver = None
+        self.drafts = OrderedDict()
+        self.events = OrderedDict()
+
+    @classmethod
+    def from_sheet(cls, sheet):
+        """
+        Builds a Dataset from a scoutingLoader.ScoutingSheet.
+        """
+        return cls(sheet.teams, sheet.sample, sheet.specimen, sheet.all_teams)
+
+    @classmethod
+    def from_sheets(cls, sheets):
+        """
+        Builds a Dataset from scoutingLoader.stream_scouting_sheets output: the
+        None sheet is the dataset, the others become its events.
+        """
+        dataset = cls.from_sheet(sheets[None])
+        for name, sheet in sheets.items():
+            if name is not None:
+                dataset.events[name] = cls.from_sheet(sheet)
+        return dataset
+
+    def __len__(self):
+        return len(self.teams)
+
+    @property
+    def nbytes(self):
+        """
+        Rough memory footprint, used to bound the cache size.
+        """
+        names = sum(len(t) for t in self.teams) * 2
+        ranking = self.ranking.nbytes if self.ranking is not None else 0
+        solver = self.solver.nbytes if self.solver is not None else 0
+        drafts = sum(d.nbytes for d in self.drafts.values())
+        events = sum(d.nbytes for d in self.events.values())
+        return self.sample.nbytes + self.specimen.nbytes + names + ranking + solver + drafts + events
+
+    def lookup(self, team):
+        """
+        Index of `team`, or None. Also matches "11770" and "11770.0", since the
+        sheet stores team numbers as floats when its team column has blanks.
+        """
+        for name in (team, f"{team}.0", team[:-2] if team.endswith(".0") else None):
+            if name in self.index:
+                return self.index[name]
+        return None
+
+    def alive_mask(self, removed):
+        """
+        Boolean mask of teams still in the pool after `removed` are taken out.
+        Removed teams are matched with lookup, so "11770" and "11770.0" both work.
+        """
+        alive = np.ones(len(self.teams), dtype=bool)
+        for team in removed:
+            i = self.lookup(team)
+            if i is not None:
+                alive[i] = False
+        return alive
+
+
+class DatasetCache:
+    """
+    Least-recently-used cache of Dataset objects, bounded both by entry count
+    and by the total size of the arrays it holds. With a `store`
+    (datasetStore.DatasetStore), a key that isn't cached is looked up on disk.
+    Safe to share between request threads.
+    """
+
+    def __init__(self, max_entries=16, max_bytes=256 * 1024 * 1024, store=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the cached Dataset for `key` (marking it recently used), or None
+        (also for anything that isn't a dataset key).
+        """
+        if not is_dataset_key(key):
+            return None
+        with self._lock:
+            dataset = self._entries.get(key)
+            if dataset is not None:
+                self._entries.move_to_end(key)
+                return dataset
+        # Read from disk outside the lock; if two threads load the same key, the later put wins.
+        stored = self.store.load(key) if self.store is not None else None
+        return self.put(key, stored) if stored is not None else None
+
+    def put(self, key, dataset):
+        """
+        Stores a Dataset and evicts the least recently used ones past the limits.
+        The newest entry is always kept, even if it alone exceeds max_bytes.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = dataset
+            self._trim()
+        return dataset
+
+    def trim(self):
+        """
+        Evicts least recently used datasets until the cache is within its limits.
+        Call again after a cached dataset grows (e.g. once its ranking is built).
+        """
+        with self._lock:
+            self._trim()
+
+    def _trim(self):
+        # Sizes are re-measured each time because datasets grow lazily.
+        total = sum(d.nbytes for d in self._entries.values())
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or total > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.nbytes
+
+
+class ResultCache:
+    """
+    Least-recently-used cache of rendered results (strings), bounded by entry
+    count and total length. Each entry keeps an ETag (a hash of its key) for
+    conditional requests.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def etag(key):
+        return content_key(repr(key).encode())[:32]
+
+    def get(self, key):
+        """
+        Returns (text, etag) for `key` (marking it recently used), or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, text):
+        """
+        Stores a result and returns its (text, etag).
+        """
+        entry = (text, self.etag(key))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = entry
+            self._bytes += len(text)
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[0])
+        return entry
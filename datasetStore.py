@@ -0,0 +1,147 @@
+"""
+On-disk copy of parsed scouting datasets, so restarting the apps doesn't
+mean re-uploading (and re-parsing) every CSV.
+
+Each dataset is a folder under the data directory, named by its cache key:
+  manifest.json  - format version, team count and event names
+  teams.npy      - team IDs as a fixed-width unicode array
+  sample.npy     - float64 sample OPR, aligned with teams
+  specimen.npy   - float64 specimen OPR
+  event-<i>-*.npy for the i-th event in the manifest, same three files
+Arrays are opened with memory mapping, so reopening a dataset only reads the
+manifest and the array headers; pandas is not involved.
+
+The data directory is SCOUTER_DATA_DIR, or "scouter_data" next to this file.
+Set SCOUTER_DATA_DIR to an empty string to turn the store off.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from datasetCache import Dataset, is_dataset_key
+
+FORMAT_VERSION = 1
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scouter_data")
+
+# How many datasets are kept on disk; the least recently saved are deleted first.
+MAX_STORED = 32
+
+
+class DatasetStore:
+    """
+    Folder of saved datasets, keyed like DatasetCache. root None means the
+    environment's data directory; with an empty root, saving and loading do nothing.
+    """
+
+    def __init__(self, root=None, max_stored=MAX_STORED):
+        if root is None:
+            root = os.environ.get("SCOUTER_DATA_DIR", DEFAULT_DIR)
+        self.root = root or None
+        self.max_stored = max_stored
+
+    def _path(self, key, *parts):
+        # Keys name folders, so only real dataset keys are allowed (no "..", "/", ...).
+        if not is_dataset_key(key):
+            raise ValueError(f"Not a dataset key: {key!r}")
+        return os.path.join(self.root, key, *parts)
+
+    def keys(self):
+        """
+        Keys of the saved datasets, most recently saved first.
+        """
+        if self.root is None or not os.path.isdir(self.root):
+            return []
+        saved = []
+        for key in os.listdir(self.root):
+            if not is_dataset_key(key):
+                continue
+            manifest = self._path(key, "manifest.json")
+            if os.path.isfile(manifest):
+                saved.append((os.path.getmtime(manifest), key))
+        return [key for _, key in sorted(saved, reverse=True)]
+
+    def __contains__(self, key):
+        return self.root is not None and is_dataset_key(key) and os.path.isfile(self._path(key, "manifest.json"))
+
+    def save(self, key, dataset):
+        """
+        Writes a dataset (and its per-event datasets) under `key`, unless it is
+        already saved. The folder is written under a temporary name and renamed
+        into place, so a half-written dataset is never picked up.
+        """
+        if self.root is None or not is_dataset_key(key) or key in self:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        folder = tempfile.mkdtemp(prefix=f".{key[:16]}-", dir=self.root)
+        try:
+            _write_arrays(folder, "", dataset)
+            events = list(dataset.events)
+            for i, name in enumerate(events):
+                _write_arrays(folder, f"event-{i}-", dataset.events[name])
+            manifest = {"version": FORMAT_VERSION, "teams": len(dataset), "events": events}
+            with open(os.path.join(folder, "manifest.json"), "w") as f:
+                json.dump(manifest, f)
+            os.rename(folder, self._path(key))
+        except OSError:
+            # Another process saved the same key first (or the disk is full).
+            shutil.rmtree(folder, ignore_errors=True)
+            return
+        self.prune()
+
+    def load(self, key):
+        """
+        Reopens a saved dataset with memory-mapped arrays, or returns None if
+        `key` isn't saved (or was saved in another format version).
+        """
+        if key not in self:
+            return None
+        try:
+            with open(self._path(key, "manifest.json")) as f:
+                manifest = json.load(f)
+            if manifest.get("version") != FORMAT_VERSION:
+                return None
+            dataset = _read_arrays(self._path(key), "")
+            for i, name in enumerate(manifest["events"]):
+                dataset.events[name] = _read_arrays(self._path(key), f"event-{i}-")
+        except (OSError, ValueError, KeyError):
+            return None
+        return dataset
+
+    def restore(self, cache):
+        """
+        Loads the most recently saved datasets into a DatasetCache (as many as
+        it holds), so sessions from before a restart find their data. Returns
+        how many were loaded.
+        """
+        loaded = 0
+        for key in reversed(self.keys()[:cache.max_entries]):
+            dataset = self.load(key)
+            if dataset is not None:
+                cache.put(key, dataset)
+                loaded += 1
+        return loaded
+
+    def prune(self):
+        """
+        Deletes the least recently saved datasets past max_stored.
+        """
+        for key in self.keys()[self.max_stored:]:
+            shutil.rmtree(self._path(key), ignore_errors=True)
+
+
+def _write_arrays(folder, prefix, dataset):
+    np.save(os.path.join(folder, f"{prefix}teams.npy"), np.array(dataset.teams, dtype=str))
+    np.save(os.path.join(folder, f"{prefix}sample.npy"), np.asarray(dataset.sample, dtype=np.float64))
+    np.save(os.path.join(folder, f"{prefix}specimen.npy"), np.asarray(dataset.specimen, dtype=np.float64))
+
+
+def _read_arrays(folder, prefix):
+    teams = np.load(os.path.join(folder, f"{prefix}teams.npy"), mmap_mode="r")
+    return Dataset(
+        teams.tolist(),
+        np.load(os.path.join(folder, f"{prefix}sample.npy"), mmap_mode="r"),
+        np.load(os.path.join(folder, f"{prefix}specimen.npy"), mmap_mode="r"),
+    )
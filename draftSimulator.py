@@ -0,0 +1,311 @@
+"""
+Alliance-selection draft simulator.
+
+Captains pick in order (serpentine when there is more than one round). The
+other captains follow a policy:
+  "greedy"  - the team that makes their own alliance strongest
+  "opr"     - the team with the highest single OPR (max of sample/specimen)
+  "softmax" - like greedy, but any team can be picked, with probability
+              proportional to exp(score / temperature)
+Our picks are searched with expectimax over the rest of the draft: our
+nodes take the best choice, the other captains' nodes average over their
+policy. Values are alliance scores (allianceOptimizer.alliance_score).
+
+To stay fast enough for live selection:
+  - only a shortlist of candidates (the best for us and the best by OPR) is
+    tracked; picks outside it are assumed not to affect our options,
+  - draft states at our next pick reached with less than MIN_STATE
+    probability are dropped,
+  - softmax branches below MIN_BRANCH probability are dropped, and only the
+    TOP_BRANCHES most likely picks are averaged over,
+  - our choices are tried best bound first and skipped once their upper bound
+    (the sum of every member's better role) can't beat the best found (or,
+    when ranking backup picks, the OPTIONS-th best found),
+  - every draft state is memoized (up to MAX_MEMO states), and the simulator
+    is kept between requests, so the search after each real pick reuses
+    earlier work,
+  - advise() deepens the search one pick at a time within its time budget;
+    picks past the search horizon are played out quickly (the other captains
+    take the best team left by OPR, we take the best team for us), and when
+    time runs out the deepest finished search answers.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+
+from allianceOptimizer import alliance_score
+
+POLICIES = ("greedy", "opr", "softmax")
+CANDIDATES = 12
+DEFAULT_TEMPERATURE = 5.0
+MIN_BRANCH = 0.02
+TOP_BRANCHES = 4
+# Draft paths to our pick less likely than this are dropped (so there are at most 1 / MIN_STATE).
+MIN_STATE = 0.002
+# Seconds advise() searches before answering with the deepest finished search.
+SEARCH_BUDGET = 1.0
+# Memoized draft states kept; past this the memo starts over.
+MAX_MEMO = 200_000
+
+# How many ranked choices (our pick plus backups) advise() reports.
+OPTIONS = 6
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def pick_order(captains, rounds):
+    """
+    Seats (captain positions) in pick order: 0..n-1, then n-1..0, and so on.
+    """
+    order = []
+    for r in range(rounds):
+        seats = list(range(captains))
+        order += seats if r % 2 == 0 else seats[::-1]
+    return order
+
+
+class DraftSimulator:
+    """
+    Expectimax search of one draft: fixed captains, our seat, pool and policy.
+    Hold `lock` while calling advise() from several threads.
+    """
+
+    def __init__(self, sample, specimen, captains, me, pool, policy="greedy",
+                 temperature=DEFAULT_TEMPERATURE, rounds=1, candidates=CANDIDATES):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}; use one of {', '.join(POLICIES)}")
+        self.sample = np.asarray(sample, dtype=float)
+        self.specimen = np.asarray(specimen, dtype=float)
+        self.captains = list(captains)
+        self.me = me
+        self.policy = policy
+        self.temperature = max(float(temperature), 1e-6)
+        self.order = pick_order(len(self.captains), rounds)
+        self.our_positions = [i for i, seat in enumerate(self.order) if seat == me]
+
+        pool = [int(t) for t in pool if t not in set(self.captains)]
+        single = np.maximum(self.sample, self.specimen)
+        # Enough candidates that we never run out, even if everyone else picks from them.
+        size = max(candidates, len(self.order) + 1)
+        ours = sorted(pool, key=lambda t: -alliance_score(self.sample, self.specimen, [self.captains[me], t]))
+        theirs = sorted(pool, key=lambda t: -single[t])
+        self.candidates = list(dict.fromkeys(ours[:size] + theirs[:size]))
+        self.single = {t: float(single[t]) for t in self.candidates}
+        self.memo = {}
+        self.lock = threading.Lock()
+        self._deadline = None
+        self._nodes = 0
+
+    @property
+    def nbytes(self):
+        """
+        Rough memory footprint of the memo, for the dataset cache.
+        """
+        return 200 * len(self.memo)
+
+    def _members(self, alliances, seat):
+        return [self.captains[seat]] + list(alliances[seat])
+
+    def _with_pick(self, alliances, seat, team):
+        return alliances[:seat] + (alliances[seat] + (team,),) + alliances[seat + 1:]
+
+    def _available(self, alliances):
+        taken = {t for picks in alliances for t in picks}
+        return [t for t in self.candidates if t not in taken]
+
+    def preferences(self, seat, alliances, available):
+        """
+        [(team, probability)] for another captain's pick under the policy.
+        """
+        if not available:
+            return []
+        if self.policy == "opr":
+            scores = [self.single[t] for t in available]
+        else:
+            members = self._members(alliances, seat)
+            scores = [alliance_score(self.sample, self.specimen, members + [t]) for t in available]
+        if self.policy != "softmax":
+            return [(available[int(np.argmax(scores))], 1.0)]
+        top = max(scores)
+        weights = [math.exp((x - top) / self.temperature) for x in scores]
+        total = sum(weights)
+        kept = [(t, w / total) for t, w in zip(available, weights) if w / total >= MIN_BRANCH]
+        kept = sorted(kept, key=lambda row: -row[1])[:TOP_BRANCHES]
+        kept_total = sum(p for _, p in kept)
+        return [(t, p / kept_total) for t, p in kept]
+
+    def value(self, position, alliances, stop=None):
+        """
+        Expected final score of our alliance from this draft state, with our
+        best play, searching up to pick `stop` (the whole draft by default) and
+        playing out the rest greedily.
+        """
+        if not self.our_positions or position > self.our_positions[-1]:
+            return alliance_score(self.sample, self.specimen, self._members(alliances, self.me))
+        # Nothing after our last pick changes our alliance.
+        last = self.our_positions[-1] + 1
+        stop = last if stop is None else min(stop, last)
+        if position >= stop:
+            return self.playout(position, alliances)
+        key = (position, alliances, stop)
+        if key in self.memo:
+            return self.memo[key]
+        self._nodes += 1
+        if self._deadline is not None and self._nodes % 64 == 0 and time.monotonic() > self._deadline:
+            raise _OutOfTime
+        seat = self.order[position]
+        available = self._available(alliances)
+        if seat == self.me:
+            result = self._best_choice(position, alliances, available, stop)[1]
+        else:
+            branches = self.preferences(seat, alliances, available)
+            if branches:
+                result = sum(
+                    p * self.value(position + 1, self._with_pick(alliances, seat, t), stop) for t, p in branches
+                )
+            else:
+                result = self.value(position + 1, alliances, stop)
+        if len(self.memo) >= MAX_MEMO:
+            self.memo.clear()
+        self.memo[key] = result
+        return result
+
+    def playout(self, position, alliances):
+        """
+        Our final score if the rest of the draft goes greedily: every other
+        captain takes the best team left by OPR, we take the best team for us.
+        """
+        available = sorted(self._available(alliances), key=lambda t: -self.single[t])
+        members = self._members(alliances, self.me)
+        for position in range(position, self.our_positions[-1] + 1):
+            if not available:
+                break
+            if self.order[position] == self.me:
+                team = max(available, key=lambda t: alliance_score(self.sample, self.specimen, members + [t]))
+                members.append(team)
+            else:
+                team = available[0]
+            available.remove(team)
+        return alliance_score(self.sample, self.specimen, members)
+
+    def _bound(self, position, alliances, available):
+        """
+        Upper bound on our final score for each choice here: every member at its
+        better role, plus the best possible later picks.
+        """
+        members = self._members(alliances, self.me)
+        later = sum(1 for p in self.our_positions if p > position)
+        base = sum(max(self.sample[t], self.specimen[t]) for t in members)
+        by_single = sorted(available, key=lambda t: -self.single[t])
+
+        def bound(team):
+            extra = [self.single[t] for t in by_single[:later + 1] if t != team][:later]
+            return base + self.single[team] + sum(extra)
+
+        return bound
+
+    def _ranked_choices(self, position, alliances, available, keep, stop=None):
+        """
+        The `keep` best [(team, value)] picks here, best first, pruning choices by their upper bound.
+        """
+        bound = self._bound(position, alliances, available)
+        ranked = []
+        for team in sorted(available, key=bound, reverse=True):
+            if len(ranked) >= keep and bound(team) <= ranked[-1][1]:
+                break
+            ranked.append((team, self.value(position + 1, self._with_pick(alliances, self.me, team), stop)))
+            ranked.sort(key=lambda row: -row[1])
+            del ranked[keep:]
+        return ranked
+
+    def _best_choice(self, position, alliances, available, stop=None):
+        """
+        (team, value) of our best pick here (team None if nobody is left).
+        """
+        ranked = self._ranked_choices(position, alliances, available, 1, stop)
+        if not ranked:
+            return None, self.value(position + 1, alliances, stop)
+        return ranked[0]
+
+    def _states_at_our_pick(self, position, alliances, probability, states):
+        """
+        Collects {(position, alliances): probability} of the states at our next pick.
+        """
+        if position >= len(self.order):
+            return
+        seat = self.order[position]
+        if seat == self.me:
+            key = (position, alliances)
+            states[key] = states.get(key, 0.0) + probability
+            return
+        branches = self.preferences(seat, alliances, self._available(alliances))
+        if not branches:
+            self._states_at_our_pick(position + 1, alliances, probability, states)
+        for team, p in branches:
+            if probability * p >= MIN_STATE:
+                self._states_at_our_pick(position + 1, self._with_pick(alliances, seat, team), probability * p, states)
+
+    def advise(self, picks, budget=SEARCH_BUDGET):
+        """
+        Advice for our next pick, given the teams picked so far (in draft order).
+        Searches one more pick ahead at a time for up to `budget` seconds.
+        Returns None if we have no picks left, otherwise a dict with
+          position - our next pick's index in the draft (0-based)
+          expected - expected final score of our alliance
+          options  - [(team, chance it is still available at our pick,
+                      expected final score if we take it)], best first
+          complete - whether the search reached the end of the draft
+        """
+        alliances = tuple(() for _ in self.captains)
+        for position, team in enumerate(picks[:len(self.order)]):
+            alliances = self._with_pick(alliances, self.order[position], int(team))
+        states = {}
+        self._states_at_our_pick(min(len(picks), len(self.order)), alliances, 1.0, states)
+        if not states:
+            return None
+        # Spread the dropped paths' probability over the kept ones.
+        total = sum(states.values())
+        states = {key: probability / total for key, probability in states.items()}
+
+        deadline = time.monotonic() + budget
+        first = min(position for position, _ in states)
+        last = self.our_positions[-1] + 1
+        advice = None
+        for stop in range(first + 1, last + 1):
+            # The shallowest search (just our next pick) always finishes.
+            self._deadline = deadline if advice is not None else None
+            try:
+                advice = self._advice(states, stop)
+            except _OutOfTime:
+                break
+            finally:
+                self._deadline = None
+            advice["complete"] = stop == last
+        return advice
+
+    def _advice(self, states, stop):
+        expected = 0.0
+        available_chance, value_sum, ranked_chance = {}, {}, {}
+        for (position, state), probability in states.items():
+            expected += probability * self.value(position, state, stop)
+            available = self._available(state)
+            for team in available:
+                available_chance[team] = available_chance.get(team, 0.0) + probability
+            for team, value in self._ranked_choices(position, state, available, OPTIONS, stop):
+                value_sum[team] = value_sum.get(team, 0.0) + probability * value
+                ranked_chance[team] = ranked_chance.get(team, 0.0) + probability
+        # A choice's value is averaged over the states where it ranked among the best.
+        options = [
+            (team, available_chance[team], value_sum[team] / ranked_chance[team]) for team in value_sum
+        ]
+        options.sort(key=lambda row: (-row[2], -row[1]))
+        options = options[:OPTIONS]
+        return {
+            "position": min(position for position, _ in states),
+            "expected": expected,
+            "options": options,
+        }
@@ -0,0 +1,251 @@
+"""
+Bounded process pool for the CPU-heavy parts of a request.
+
+Monte Carlo runs, alliance matching and OPR solving go through a JobQueue so
+they run in worker processes instead of the request thread; other scouts'
+requests keep being served while one of them runs. Small jobs (by the cost
+estimate the caller passes) run inline, since shipping arrays to another
+process would take longer than the work itself. Light requests (dropdowns,
+pair pages, cached results) never touch the queue.
+
+A request either waits for its job (the default, up to the job's timeout) or,
+with ?async=1 (or "async": true in a JSON body), gets 202 and the job's ID
+right away and polls GET /jobs/<id>?wait=<seconds>.
+
+Workers are SCOUTER_WORKERS processes (default: CPU count, at most
+MAX_WORKERS); SCOUTER_WORKERS=0 runs every job inline. A job that isn't done
+within its timeout is reported as timed out and cancelled if it hasn't
+started; one that is already running can't be stopped, but it still counts
+against max_pending, so the queue stays bounded.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import request
+
+MAX_WORKERS = 4
+JOB_TIMEOUT = 60.0
+# Longest a /jobs poll is held open waiting for a job.
+MAX_WAIT = 30.0
+# Finished jobs kept for polling.
+KEEP_JOBS = 200
+# Jobs estimated below this cost run inline (roughly: simulated alliance-games,
+# or matrix entries touched).
+INLINE_COST = 2_000_000
+
+
+class QueueFull(RuntimeError):
+    """
+    Raised by JobQueue.submit when max_pending jobs are already waiting or running.
+    """
+
+
+class Job:
+    """
+    One submitted job. `finish` turns the worker's return value into the
+    response (it runs once, in this process, when the result is first read).
+    """
+
+    def __init__(self, job_id, name, future, timeout, finish=None):
+        self.id = job_id
+        self.name = name
+        self.future = future
+        self.submitted = time.time()
+        self.deadline = time.monotonic() + timeout
+        self._finish = finish
+        self._lock = threading.Lock()
+        self._result = None
+        self._finished = False
+        self._finish_error = None
+        self._timed_out = False
+
+    @property
+    def state(self):
+        """
+        "queued", "running", "done", "failed" or "timeout".
+        """
+        if self.future.done():
+            if self.future.cancelled() or self._timed_out:
+                return "timeout"
+            return "failed" if self.future.exception() is not None else "done"
+        if time.monotonic() > self.deadline:
+            # Once reported, a timeout stays a timeout even if the job finishes later.
+            self._timed_out = True
+            self.future.cancel()
+            return "timeout"
+        return "running" if self.future.running() else "queued"
+
+    def wait(self, timeout):
+        """
+        Waits up to `timeout` seconds (never past the job's deadline).
+        Returns True if the job has finished.
+        """
+        remaining = min(timeout, self.deadline - time.monotonic())
+        if remaining > 0:
+            try:
+                self.future.exception(timeout=remaining)
+            except Exception:
+                pass
+        return self.state in ("done", "failed")
+
+    def result(self):
+        """
+        The finished result; raises the job's own exception if it failed.
+        """
+        with self._lock:
+            if not self._finished:
+                value = self.future.result(timeout=0)
+                try:
+                    self._result = self._finish(value) if self._finish is not None else value
+                except Exception as e:
+                    self._finish_error = e
+                    raise
+                self._finished = True
+            return self._result
+
+    def exception(self):
+        """
+        What a failed job raised, in the worker or in `finish`; None otherwise.
+        """
+        if self.future.done() and not self.future.cancelled() and self.future.exception() is not None:
+            return self.future.exception()
+        return self._finish_error
+
+    def as_json(self):
+        state = self.state
+        status = {"job": self.id, "name": self.name, "state": state, "submitted": self.submitted}
+        if state == "done":
+            try:
+                status["result"] = self.result()
+            except Exception as e:
+                status["state"], status["error"] = "failed", str(e)
+        elif state == "failed":
+            status["error"] = str(self.future.exception())
+        elif state == "timeout":
+            status["error"] = f"{self.name} took too long"
+        return status
+
+
+class JobQueue:
+    """
+    Runs jobs on a lazily started process pool, keeping their state for polling.
+    """
+
+    def __init__(self, workers=None, max_pending=None, timeout=JOB_TIMEOUT, inline_cost=INLINE_COST):
+        if workers is None:
+            workers = int(os.environ.get("SCOUTER_WORKERS", min(os.cpu_count() or 1, MAX_WORKERS)))
+        self.workers = max(int(workers), 0)
+        self.max_pending = max_pending if max_pending is not None else max(self.workers, 1) * 4
+        self.timeout = timeout
+        self.inline_cost = inline_cost
+        self._pool = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return self._pool
+
+    def pending(self):
+        return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    def submit(self, name, func, *args, cost=None, finish=None, timeout=None):
+        """
+        Starts func(*args) and returns its Job. It runs inline when there are no
+        workers or `cost` is below inline_cost. Raises QueueFull when too many
+        jobs are already pending.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        job_id = secrets.token_urlsafe(12)
+        if self.workers == 0 or (cost is not None and cost < self.inline_cost):
+            future = Future()
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return self._add(Job(job_id, name, future, timeout, finish))
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise QueueFull("The server is busy with other analyses; try again shortly.")
+            try:
+                future = self._executor().submit(func, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); start a fresh pool.
+                self._pool = None
+                future = self._executor().submit(func, *args)
+            job = Job(job_id, name, future, timeout, finish)
+            self._jobs[job_id] = job
+            self._trim()
+        return job
+
+    def _add(self, job):
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        return job
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.future.done()]
+        for job_id in finished[:max(len(finished) - KEEP_JOBS, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def run(self, name, func, *args, cost=None, finish=None):
+        """
+        Submits a job for the current request and returns the Flask response:
+        202 with the job's status when the request asked for async, otherwise
+        its result once done. A failed job gives {"error": ...} with 400 if it
+        raised ValueError (bad input found by the job) and 500 for anything
+        else; a timeout gives 504, and a full queue 503.
+        """
+        try:
+            job = self.submit(name, func, *args, cost=cost, finish=finish)
+        except QueueFull as e:
+            return {"error": str(e)}, 503
+        payload = request.get_json(silent=True) if request.is_json else None
+        wants_async = request.args.get("async") in ("1", "true") or (
+            isinstance(payload, dict) and payload.get("async") is True
+        )
+        if wants_async:
+            return job.as_json(), 202
+        job.wait(self.timeout)
+        status = job.as_json()
+        if status["state"] == "done":
+            return status["result"]
+        if status["state"] == "failed":
+            return {"error": status["error"]}, 400 if isinstance(job.exception(), ValueError) else 500
+        return {"error": status["error"], "job": job.id}, 504
+
+    def init_app(self, app):
+        """
+        Adds GET /jobs/<id>?wait=<seconds> for polling. Returns self.
+        """
+
+        def job_status(job_id):
+            job = self.get(job_id)
+            if job is None:
+                return {"error": "Unknown or expired job"}, 404
+            wait = min(max(request.args.get("wait", 0, type=float), 0.0), MAX_WAIT)
+            if wait:
+                job.wait(wait)
+            return job.as_json()
+
+        app.add_url_rule("/jobs/<job_id>", "job_status", job_status)
+        return self
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,162 @@
+"""
+Live top-10 pair rankings pushed to open pages over Server-Sent Events.
+
+Each channel is one dataset as the pit screens follow it: an uploaded sheet
+(optionally narrowed to one event) or a match-results dataset together with
+the matches added to it since. Whenever its data changes (a removed team, a
+new match, new OPRs), the app publishes the new top 10; only the difference
+from the last published top 10 goes out:
+  entered - pairs now in the top 10, with their rank and scores
+  left    - pairs no longer in it
+  moved   - pairs still in it whose rank changed (from, to; 1-based)
+plus the new top 10 itself (ten short rows), so a screen can redraw without
+another request. A new subscriber first gets a "snapshot" of the current
+top 10. A publish that changes nothing sends nothing.
+
+Every subscriber has a small queue; one that falls behind is dropped, and the
+browser's EventSource reconnects and starts again from a snapshot.
+"""
+import json
+import queue
+import threading
+from collections import OrderedDict
+
+# Events a slow subscriber may have waiting before it's dropped.
+QUEUE_SIZE = 64
+# Seconds between keep-alive comments on an idle stream.
+KEEPALIVE = 15.0
+MAX_CHANNELS = 64
+
+
+def pair_id(row):
+    """
+    Identity of a pair row, whatever the order or roles of its teams.
+    """
+    return tuple(sorted((row["team1"], row["team2"])))
+
+
+def ranking_diff(old, new):
+    """
+    {"entered", "left", "moved"} between two ranked lists of pair rows.
+    """
+    old_rank = {pair_id(row): rank for rank, row in enumerate(old, start=1)}
+    new_rank = {pair_id(row): rank for rank, row in enumerate(new, start=1)}
+    entered = [dict(row, rank=rank) for rank, row in enumerate(new, start=1) if pair_id(row) not in old_rank]
+    left = [
+        {"team1": row["team1"], "team2": row["team2"], "rank": rank}
+        for rank, row in enumerate(old, start=1) if pair_id(row) not in new_rank
+    ]
+    moved = [
+        {"team1": row["team1"], "team2": row["team2"], "from": old_rank[pair_id(row)], "to": rank}
+        for rank, row in enumerate(new, start=1)
+        if pair_id(row) in old_rank and old_rank[pair_id(row)] != rank
+    ]
+    return {"entered": entered, "left": left, "moved": moved}
+
+
+def sse_message(event, data, event_id=None):
+    """
+    One Server-Sent Events message.
+    """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _close(subscriber):
+    """
+    Empties a dropped subscriber's queue and leaves None, which ends its stream
+    (the browser then reconnects).
+    """
+    while True:
+        try:
+            subscriber.get_nowait()
+        except queue.Empty:
+            break
+    subscriber.put_nowait(None)
+
+
+class _Channel:
+    def __init__(self):
+        self.top = []
+        self.info = {}
+        self.version = 0
+        self.subscribers = set()
+
+
+class LiveRankings:
+    """
+    Channels of top-10 rankings and their subscribers' queues.
+    """
+
+    def __init__(self, max_channels=MAX_CHANNELS, queue_size=QUEUE_SIZE):
+        self.max_channels = max_channels
+        self.queue_size = queue_size
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _channel(self, channel_id):
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self._channels[channel_id] = _Channel()
+            # Forget the least recently used channels nobody is watching.
+            idle = [key for key, c in self._channels.items() if not c.subscribers and key != channel_id]
+            for key in idle[:max(len(self._channels) - self.max_channels, 0)]:
+                del self._channels[key]
+        self._channels.move_to_end(channel_id)
+        return channel
+
+    def has_subscribers(self, channel_id):
+        channel = self._channels.get(channel_id)
+        return channel is not None and bool(channel.subscribers)
+
+    def publish(self, channel_id, top, reason, **info):
+        """
+        Records `top` (ranked pair rows) as the channel's ranking and sends the
+        diff to its subscribers. `info` (e.g. datasetKey, removed) is sent
+        along. Returns the message's data, or None if nothing changed.
+        """
+        with self._lock:
+            channel = self._channel(channel_id)
+            diff = ranking_diff(channel.top, top)
+            scores_changed = [row["score"] for row in top] != [row["score"] for row in channel.top]
+            if not any(diff.values()) and not scores_changed and info == channel.info:
+                return None
+            channel.top, channel.info = list(top), info
+            channel.version += 1
+            data = dict(diff, reason=reason, version=channel.version, top=channel.top, **info)
+            message = sse_message("ranking", data, channel.version)
+            for subscriber in list(channel.subscribers):
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    channel.subscribers.discard(subscriber)
+                    _close(subscriber)
+            return data
+
+    def subscribe(self, channel_id):
+        """
+        Generator of SSE text for one client: a snapshot, then every change,
+        with keep-alive comments in between. Ends when the client falls too far behind.
+        """
+        subscriber = queue.Queue(self.queue_size)
+        with self._lock:
+            channel = self._channel(channel_id)
+            channel.subscribers.add(subscriber)
+            snapshot = dict(top=channel.top, version=channel.version, **channel.info)
+        try:
+            yield sse_message("snapshot", snapshot, channel.version)
+            while True:
+                try:
+                    message = subscriber.get(timeout=KEEPALIVE)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            with self._lock:
+                channel.subscribers.discard(subscriber)
@@ -0,0 +1,239 @@
+"""
+Match-by-match observations for a scouting dataset, posted to /matches.
+
+A scout sends one row per team per match (or a small batch of them):
+  {"team": "11770", "sample": 42, "specimen": 18, "match": "Q12"}
+Rows are appended to a JSON-lines log under the data directory before they're
+applied, so a restart replays them. Each team keeps a running count and sums,
+updated in O(1) per row; once a team has observations, its sample and
+specimen are the means of those observations instead of the sheet's values.
+Teams not on the sheet are added.
+
+Every live channel (an upload, optionally narrowed to one event) has its own
+MatchFeed: a copy of the sheet's dataset, replaced by an updated copy with
+every batch. Its PairRanking carries over and only re-scores the pairs of the
+teams that changed (see pairRanking.PairRanking.update_values); new teams, or
+too many changed teams, rebuild the ranking on next use.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from datasetCache import Dataset, content_key
+
+# Rows a single /matches request may carry.
+MAX_BATCH = 100
+# Feeds kept in memory; an evicted feed is replayed from its log when next used.
+MAX_FEEDS = 16
+
+
+def clean_row(row):
+    """
+    Validates one posted row and returns it as {"team", "sample", "specimen",
+    "match"}. Raises ValueError on a bad row.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("each row must be an object")
+    team = str(row.get("team", "")).strip()
+    if not team:
+        raise ValueError("missing team")
+    values = []
+    for name in ("sample", "specimen"):
+        try:
+            value = float(row[name])
+        except KeyError:
+            raise ValueError(f"team {team} is missing {name}") from None
+        except (TypeError, ValueError):
+            raise ValueError(f"team {team} has a non-numeric {name}") from None
+        if not math.isfinite(value):
+            raise ValueError(f"team {team} has a non-finite {name}")
+        values.append(value)
+    match = row.get("match")
+    return {"team": team, "sample": values[0], "specimen": values[1], "match": None if match is None else str(match)}
+
+
+class MatchLog:
+    """
+    Append-only JSON-lines file of observation rows. With path None, rows
+    aren't kept anywhere (the data directory is turned off).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def append(self, rows):
+        """
+        Appends rows and syncs them to disk before returning.
+        """
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        received = time.time()
+        lines = "".join(json.dumps(dict(row, received=received)) + "\n" for row in rows)
+        with open(self.path, "a") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rows(self):
+        """
+        Every logged row, oldest first. A torn last line (a crash mid-write) is skipped.
+        """
+        if self.path is None or not os.path.isfile(self.path):
+            return []
+        rows = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    rows.append(clean_row(json.loads(line)))
+                except ValueError:
+                    continue
+        return rows
+
+
+class TeamAggregates:
+    """
+    Running observation count and sample/specimen sums per team.
+    """
+
+    def __init__(self):
+        self._totals = {}
+
+    def __len__(self):
+        return len(self._totals)
+
+    def add(self, team, sample, specimen):
+        """
+        Adds one observation and returns the team's (sample, specimen) means.
+        """
+        totals = self._totals.get(team)
+        if totals is None:
+            totals = self._totals[team] = [0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += sample
+        totals[2] += specimen
+        return totals[1] / totals[0], totals[2] / totals[0]
+
+    def count(self, team):
+        totals = self._totals.get(team)
+        return totals[0] if totals is not None else 0
+
+
+class MatchFeed:
+    """
+    A dataset with match observations applied on top of its sheet values.
+    Every batch builds a new Dataset and swaps it in, so requests reading
+    `dataset` never see it half updated. `version` is the number of logged
+    rows applied: it only grows, and a replay of the log gets the same one.
+    """
+
+    def __init__(self, base, log=None):
+        self.dataset = Dataset(base.teams, np.array(base.sample), np.array(base.specimen), base.all_teams)
+        self.log = log if log is not None else MatchLog()
+        self.aggregates = TeamAggregates()
+        self.rows = 0
+        self._lock = threading.Lock()
+        replayed = self.log.rows()
+        if replayed:
+            self._apply(replayed)
+
+    @property
+    def version(self):
+        return self.rows
+
+    def ingest(self, rows):
+        """
+        Validates, logs and applies posted rows. Returns the indices of the
+        teams they touched. Raises ValueError (nothing applied) on a bad row.
+        """
+        rows = [clean_row(row) for row in rows]
+        with self._lock:
+            self.log.append(rows)
+            return self._apply(rows)
+
+    def _apply(self, rows):
+        old = self.dataset
+        added = {}
+        indices = []
+        for row in rows:
+            i = old.lookup(row["team"])
+            if i is None:
+                i = added.setdefault(row["team"], len(old) + len(added))
+            indices.append(i)
+        teams = old.teams + list(added)
+        sample = np.concatenate((old.sample, np.zeros(len(added))))
+        specimen = np.concatenate((old.specimen, np.zeros(len(added))))
+        for i, row in zip(indices, rows):
+            sample[i], specimen[i] = self.aggregates.add(teams[i], row["sample"], row["specimen"])
+        changed = sorted(set(indices))
+        dataset = Dataset(teams, sample, specimen, sorted(old.all_teams + list(added)) if added else old.all_teams)
+
+        # The ranking carries over when only a few known teams changed; it is
+        # shared with the old dataset, which holds the same teams.
+        ranking = old.ranking
+        if ranking is not None and not added:
+            with ranking.lock:
+                if ranking.update_values(sample, specimen, changed):
+                    dataset.ranking = ranking
+        self.rows += len(rows)
+        self.dataset = dataset
+        return changed
+
+    def team_json(self, indices):
+        """
+        Current values and observation counts of the teams at `indices`.
+        """
+        dataset = self.dataset
+        return [
+            {
+                "team": dataset.teams[i],
+                "sample": float(dataset.sample[i]),
+                "specimen": float(dataset.specimen[i]),
+                "observations": self.aggregates.count(dataset.teams[i]),
+            }
+            for i in indices
+        ]
+
+
+class MatchFeeds:
+    """
+    MatchFeed per live channel, with logs under `root`/matches (kept in
+    memory only when root is None).
+    """
+
+    def __init__(self, root=None, max_feeds=MAX_FEEDS):
+        self.root = root
+        self.max_feeds = max_feeds
+        self._feeds = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _log(self, channel):
+        if self.root is None:
+            return MatchLog()
+        return MatchLog(os.path.join(self.root, "matches", content_key(channel.encode())[:32] + ".jsonl"))
+
+    def get(self, channel, base, create=False):
+        """
+        The channel's feed over `base`, replayed from its log if it isn't in
+        memory. None if the channel has no observations (unless `create`).
+        """
+        with self._lock:
+            feed = self._feeds.get(channel)
+            if feed is None:
+                log = self._log(channel)
+                if not create and (log.path is None or not os.path.isfile(log.path)):
+                    return None
+                feed = self._feeds[channel] = MatchFeed(base, log)
+                while len(self._feeds) > self.max_feeds:
+                    self._feeds.popitem(last=False)
+            self._feeds.move_to_end(channel)
+            return feed
+
+    def version(self, channel):
+        feed = self._feeds.get(channel)
+        return feed.version if feed is not None else 0
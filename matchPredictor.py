@@ -0,0 +1,98 @@
+"""
+Monte Carlo match predictions for candidate alliances.
+
+Combined OPR says how many points an alliance scores on average, not how often
+it wins. Here every team's sample and specimen points are drawn from a normal
+distribution around its OPR, with the spread measured from its match history
+(oprSolver.OprSolver.spread) or, for a plain scouting sheet, a fixed fraction
+of its OPR. Each alliance plays its best role assignment; all simulated
+matches are drawn in one batch of NumPy arrays.
+"""
+import numpy as np
+
+DEFAULT_SIMULATIONS = 20000
+MAX_SIMULATIONS = 200000
+
+# Without match history, a team's spread is this fraction of its OPR (at least MIN_SPREAD points).
+DEFAULT_SPREAD = 0.3
+MIN_SPREAD = 1.0
+
+
+def team_spread(dataset):
+    """
+    Returns (sample_spread, specimen_spread) arrays aligned with dataset.teams.
+    """
+    sample_spread = np.maximum(DEFAULT_SPREAD * np.abs(dataset.sample), MIN_SPREAD)
+    specimen_spread = np.maximum(DEFAULT_SPREAD * np.abs(dataset.specimen), MIN_SPREAD)
+    if dataset.solver is not None:
+        # Datasets built from match results list teams in the solver's order.
+        measured = dataset.solver.spread()
+        sample_spread = np.where(np.isnan(measured[:, 0]), sample_spread, np.maximum(measured[:, 0], MIN_SPREAD))
+        specimen_spread = np.where(np.isnan(measured[:, 1]), specimen_spread, np.maximum(measured[:, 1], MIN_SPREAD))
+    return sample_spread, specimen_spread
+
+
+def simulate_scores(sample, specimen, sample_spread, specimen_spread, alliances, simulations, rng, shared=True):
+    """
+    Simulated points of each alliance, as a (simulations, len(alliances)) array.
+    `alliances` holds (sample_team, specimen_team) index pairs. With `shared`,
+    a team in several alliances gets one draw per simulation, used by all of
+    them (one match); otherwise every alliance is drawn separately (different matches).
+    """
+    sample_teams = np.array([a for a, _ in alliances], dtype=np.int64)
+    specimen_teams = np.array([b for _, b in alliances], dtype=np.int64)
+    if not shared:
+        # Nobody scores negative points.
+        return (
+            rng.normal(sample[sample_teams], sample_spread[sample_teams], size=(simulations, len(alliances))).clip(min=0)
+            + rng.normal(specimen[specimen_teams], specimen_spread[specimen_teams], size=(simulations, len(alliances))).clip(min=0)
+        )
+    teams = np.unique(np.concatenate((sample_teams, specimen_teams)))
+    sample_draws = rng.normal(sample[teams], sample_spread[teams], size=(simulations, len(teams))).clip(min=0)
+    specimen_draws = rng.normal(specimen[teams], specimen_spread[teams], size=(simulations, len(teams))).clip(min=0)
+    return (
+        sample_draws[:, np.searchsorted(teams, sample_teams)]
+        + specimen_draws[:, np.searchsorted(teams, specimen_teams)]
+    )
+
+
+def win_probabilities(scores, alliances):
+    """
+    (k, k) matrix of how often alliance i outscores alliance j (ties count half).
+    Alliances sharing a team can't meet, so those entries (and the diagonal) are NaN.
+    """
+    k = scores.shape[1]
+    result = np.empty((k, k))
+    for i in range(k):
+        column = scores[:, i:i + 1]
+        result[i] = np.mean(column > scores, axis=0) + 0.5 * np.mean(column == scores, axis=0)
+    members = [set(alliance) for alliance in alliances]
+    for i in range(k):
+        for j in range(k):
+            if members[i] & members[j]:
+                result[i, j] = np.nan
+    return result
+
+
+def predict_matchups(sample, specimen, sample_spread, specimen_spread, alliances,
+                     simulations=DEFAULT_SIMULATIONS, seed=None):
+    """
+    Simulates every alliance `simulations` times and returns a dict with
+      mean, std  - simulated points per alliance
+      wins       - win_probabilities matrix (row beats column)
+      win_rate   - each alliance's average chance against the others it could meet
+    Pass `seed` for reproducible results.
+    """
+    rng = np.random.default_rng(seed)
+    scores = simulate_scores(sample, specimen, sample_spread, specimen_spread, alliances, simulations, rng)
+    wins = win_probabilities(scores, alliances)
+    possible = ~np.isnan(wins)
+    opponents = possible.sum(axis=1)
+    win_rate = np.where(possible, wins, 0.0).sum(axis=1) / np.maximum(opponents, 1)
+    win_rate[opponents == 0] = np.nan
+    return {
+        "mean": scores.mean(axis=0),
+        "std": scores.std(axis=0),
+        "wins": wins,
+        "win_rate": win_rate,
+    }
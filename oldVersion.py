@@ -1,29 +1,19 @@
-import pandas as pd
+import numpy as np
 from itertools import combinations
+from scoutingLoader import load_scouting_sheet
+from pairEngine import best_other
+from pairRanking import count_pairs_above
 
-# Use header=1 because the first row (row 0) is "2 Match1 ...", 
+# The loader uses header=1 because the first row (row 0) is "2 Match1 ...",
 # and the second row (row 1) is the actual header row with "Team #, Name, Highest NP OPR..."
-df = pd.read_csv("scouting.csv", header=1)
-
-# Clean up column names (remove extra spaces, etc. using pandas yay
-df.columns = df.columns.str.strip()
-
-# columns init
-team_col = "Team #"                 # team num
-sample_opr_col = "Observed SAMPLEOPR"      # sample opr
-specimen_opr_col = "Observed SPECIMEN OPR" # spec opr
-
-# opr to numbers
-df[sample_opr_col] = pd.to_numeric(df[sample_opr_col], errors='coerce').fillna(0)
-df[specimen_opr_col] = pd.to_numeric(df[specimen_opr_col], errors='coerce').fillna(0)
+# It only reads the team number and the two OPR columns, turning bad OPR cells into 0.
+sheet = load_scouting_sheet("scouting.csv")
 
 # find and set best opr between spec and sample
-df["Best OPR"] = df[[sample_opr_col, specimen_opr_col]].max(axis=1)
+best_opr = np.maximum(sheet.sample, sheet.specimen)
 
-# pair best oprs with team numbers
-# convert strings to numbers so if scouter makes mistake by adding something
-df[team_col] = df[team_col].astype(str)
-teams_dict = dict(zip(df[team_col], df["Best OPR"]))
+# pair best oprs with team numbers (team numbers come back as strings)
+teams_dict = dict(zip(sheet.teams, best_opr))
 
 # make every single pair possible (a little more than 800 for regionals)
 all_pairs = list(combinations(teams_dict.keys(), 2))
@@ -78,42 +68,31 @@ if is_top_pair_unbeatable(pair_scores):
 else:
     print("Another team combination can beat the top pair.")
 
-def get_team_pair_rank(my_team, pair_scores, teams_dict):
+def get_team_pair_rank(my_team, teams_dict):
     """
     Returns the rank (1-indexed) of the pairing of my_team with its best partner
-    among all team combinations. The best partner is determined by the highest combined OPR.
+    among all team combinations. The best partner is determined by the highest combined OPR,
+    and the rank is 1 + the number of pairs with a strictly higher combined OPR.
     
     Parameters:
         my_team (str): The team number as a string (e.g., "11770").
-        pair_scores (list of tuples): Each tuple is (team1, team2, combined_OPR)
-            and the list is sorted in descending order by combined_OPR.
         teams_dict (dict): Dictionary mapping team numbers (as strings) to their Best OPR.
     
     Returns:
         int or None: Rank (starting at 1) of the my_team-best partner pair among all pairs,
-                     or None if my_team is not in teams_dict.
+                     or None if my_team is not in teams_dict (or has no possible partner).
     """
-    if my_team not in teams_dict:
+    if my_team not in teams_dict or len(teams_dict) < 2:
         return None
 
-    # Find the best partner for my_team by maximizing the combined OPR.
-    best_partner = None
-    best_score = -float('inf')
-    for team, opr in teams_dict.items():
-        if team == my_team:
-            continue
-        combined = teams_dict[my_team] + opr
-        if combined > best_score:
-            best_score = combined
-            best_partner = team
-
-    # Search through the sorted pair_scores for the pair that matches {my_team, best_partner}.
-    for rank, (t1, t2, score) in enumerate(pair_scores, start=1):
-        if {t1, t2} == {my_team, best_partner}:
-            return rank
-
-    return None  # Should not reach here if the team is present and pair_scores is complete.
-rank = get_team_pair_rank(my_team, pair_scores, teams_dict)
+    # Best partner comes from the top two values; the rank is counted from the
+    # sorted values with binary search instead of scanning the sorted pair list.
+    values = np.array(list(teams_dict.values()), dtype=float)
+    i = list(teams_dict).index(my_team)
+    _, partner_values = best_other(values)
+    return count_pairs_above(values[i] + partner_values[i], values) + 1
+
+rank = get_team_pair_rank(my_team, teams_dict)
 if rank is not None:
     print(f"The pairing of team {my_team} with its best partner is ranked #{rank} in combined OPR.")
 else:
@@ -0,0 +1,241 @@
+"""
+Sample and specimen OPR computed from raw match results.
+
+Each alliance in a played match gives one equation: the sum of its teams' OPRs
+equals the points the alliance scored. Sample and specimen points are two
+right-hand sides of the same system, so they are solved together.
+
+The system is solved once as (ridge-regularized) least squares through the
+normal equations. Each alliance row has only 2-3 nonzeros, so A^T A is built
+straight from the team indices. After that, every new alliance row is folded
+in with a recursive least-squares (Sherman-Morrison) update of the inverse
+normal matrix in O(n^2), instead of re-solving from scratch in O(n^3). Both
+paths give the same ridge solution, up to rounding.
+
+A small ridge term keeps the system solvable before every team has played
+enough matches, and leaves unplayed teams at 0.
+"""
+import io
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from scoutingLoader import ScoutingSheet
+
+# Regularization added to the diagonal of A^T A.
+RIDGE = 1e-3
+
+# Match results export: one row per match, "Red 1", "Red 2", ("Red 3"), "Blue 1", ...
+# team columns, plus each alliance's sample and specimen points. Matches with
+# blank scores haven't been played yet.
+TEAM_COL_PATTERN = re.compile(r"^(Red|Blue) (\d+)$")
+SCORE_COLS = {
+    "Red": ("Red Sample", "Red Specimen"),
+    "Blue": ("Blue Sample", "Blue Specimen"),
+}
+
+# alliances - one list of team IDs per scored alliance (two per played match)
+# sample    - float array of each alliance's sample points
+# specimen  - float array of each alliance's specimen points
+# played    - (red teams, blue teams, red points, blue points) for every scored match
+# unplayed  - (red teams, blue teams) for every match without scores
+MatchResults = namedtuple("MatchResults", ["alliances", "sample", "specimen", "played", "unplayed"])
+
+
+def load_match_results(source, header=0):
+    """
+    Reads a match results CSV (path, file object or buffer) into MatchResults.
+    Raises KeyError if the team or score columns are missing.
+    """
+    df = pd.read_csv(source, header=header, dtype=str)
+    df.columns = df.columns.str.strip()
+    team_cols = {"Red": [], "Blue": []}
+    for col in df.columns:
+        found = TEAM_COL_PATTERN.match(col)
+        if found:
+            team_cols[found.group(1)].append((int(found.group(2)), col))
+    missing = [c for cols in SCORE_COLS.values() for c in cols if c not in df.columns]
+    missing += [f"{color} 1" for color, cols in team_cols.items() if not cols]
+    if missing:
+        raise KeyError(f"Missing column(s): {', '.join(missing)}")
+
+    alliances, sample, specimen, played_matches, unplayed = [], [], [], [], []
+    sides = {}
+    for color, cols in team_cols.items():
+        teams = df[[col for _, col in sorted(cols)]].to_numpy(dtype=object)
+        scores = df[list(SCORE_COLS[color])].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        sides[color] = (teams, scores)
+    for row in range(len(df)):
+        match = {}
+        for color, (teams, scores) in sides.items():
+            match[color] = [str(t).strip() for t in teams[row] if isinstance(t, str) and t.strip()]
+        if not match["Red"] and not match["Blue"]:
+            continue
+        played = all(not np.isnan(sides[color][1][row]).any() for color in sides)
+        if not played:
+            unplayed.append((match["Red"], match["Blue"]))
+            continue
+        for color, (_, scores) in sides.items():
+            if match[color]:
+                alliances.append(match[color])
+                sample.append(scores[row, 0])
+                specimen.append(scores[row, 1])
+        totals = [float(sides[color][1][row].sum()) for color in ("Red", "Blue")]
+        played_matches.append((match["Red"], match["Blue"], *totals))
+    return MatchResults(
+        alliances, np.array(sample, dtype=float), np.array(specimen, dtype=float), played_matches, unplayed
+    )
+
+
+class OprSolver:
+    """
+    Least-squares sample/specimen OPR that can take new alliance rows one at a time.
+    """
+
+    def __init__(self, ridge=RIDGE):
+        self.ridge = ridge
+        self.teams = []
+        self.index = {}
+        self.rows = 0
+        # Inverse of (A^T A + ridge I), and the current OPRs (sample, specimen columns).
+        self._inverse = np.zeros((0, 0))
+        self._opr = np.zeros((0, 2))
+        # Every alliance row so far (team indices, (sample, specimen) points), for spread().
+        self._history = []
+
+    @classmethod
+    def from_results(cls, results, ridge=RIDGE):
+        """
+        Solves the whole system at once from MatchResults (or anything with
+        alliances/sample/specimen).
+        """
+        solver = cls(ridge)
+        solver.fit(results.alliances, np.column_stack((results.sample, results.specimen)))
+        return solver
+
+    def __len__(self):
+        return len(self.teams)
+
+    def copy(self):
+        """
+        An independent copy, so a cached solution stays as it was while the copy is updated.
+        """
+        other = OprSolver(self.ridge)
+        other.teams = list(self.teams)
+        other.index = dict(self.index)
+        other.rows = self.rows
+        other._inverse = self._inverse.copy()
+        other._opr = self._opr.copy()
+        other._history = list(self._history)
+        return other
+
+    @property
+    def nbytes(self):
+        return self._inverse.nbytes + self._opr.nbytes + 64 * len(self._history)
+
+    def team_indices(self, teams):
+        """
+        Indices of `teams`, adding any team not seen yet with an OPR of 0.
+        """
+        new = [t for t in dict.fromkeys(teams) if t not in self.index]
+        if new:
+            n, grow = len(self.teams), len(new)
+            inverse = np.zeros((n + grow, n + grow))
+            inverse[:n, :n] = self._inverse
+            # A new team has no rows yet, so its block of the inverse is 1 / ridge.
+            inverse[n:, n:] = np.eye(grow) / self.ridge
+            self._inverse = inverse
+            self._opr = np.vstack((self._opr, np.zeros((grow, 2))))
+            for team in new:
+                self.index[team] = len(self.teams)
+                self.teams.append(team)
+        return np.array([self.index[t] for t in teams], dtype=np.int64)
+
+    def fit(self, alliances, scores):
+        """
+        Replaces the solution with the least-squares fit of `alliances` (lists
+        of team IDs) to `scores` (one row of (sample, specimen) points each).
+        """
+        scores = np.asarray(scores, dtype=float).reshape(-1, 2)
+        rows = [self.team_indices(teams) for teams in alliances]
+        n = len(self.teams)
+        normal = np.eye(n) * self.ridge
+        rhs = np.zeros((n, 2))
+        # Group rows by alliance size so each group is one scatter-add.
+        for size in {len(r) for r in rows}:
+            picked = [i for i, r in enumerate(rows) if len(r) == size]
+            members = np.array([rows[i] for i in picked], dtype=np.int64).reshape(-1, size)
+            for a in range(size):
+                np.add.at(rhs, members[:, a], scores[picked])
+                for b in range(size):
+                    np.add.at(normal, (members[:, a], members[:, b]), 1.0)
+        factor_inverse = np.linalg.inv(np.linalg.cholesky(normal))
+        self._inverse = factor_inverse.T @ factor_inverse
+        self._opr = self._inverse @ rhs
+        self.rows = len(rows)
+        self._history = list(zip(rows, scores))
+
+    def add_alliance(self, teams, sample_points, specimen_points):
+        """
+        Folds one alliance's result into the solution (recursive least squares).
+        """
+        members = self.team_indices(teams)
+        # With a = indicator of the alliance's teams: P a, a^T P a and the residual.
+        projected = self._inverse[:, members].sum(axis=1)
+        gain = 1.0 + projected[members].sum()
+        residual = np.array([sample_points, specimen_points]) - self._opr[members].sum(axis=0)
+        self._opr += np.outer(projected / gain, residual)
+        self._inverse -= np.outer(projected, projected) / gain
+        self.rows += 1
+        self._history.append((members, np.array([sample_points, specimen_points], dtype=float)))
+
+    def add_match(self, red, blue, red_points, blue_points):
+        """
+        Adds one played match: team lists and (sample, specimen) points per alliance.
+        """
+        for teams, points in ((red, red_points), (blue, blue_points)):
+            if teams:
+                self.add_alliance(teams, *points)
+
+    @property
+    def sample(self):
+        return self._opr[:, 0].copy()
+
+    @property
+    def specimen(self):
+        return self._opr[:, 1].copy()
+
+    def spread(self):
+        """
+        Per-team standard deviation of (sample, specimen) points around the OPRs,
+        as an (n, 2) array. Each alliance's squared residual is shared equally by
+        its teams. Teams without matches get NaN.
+        """
+        n = len(self.teams)
+        squared = np.zeros((n, 2))
+        matches = np.zeros(n)
+        for members, points in self._history:
+            residual = points - self._opr[members].sum(axis=0)
+            squared[members] += residual ** 2 / len(members)
+            matches[members] += 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(squared / matches[:, None])
+
+    def sheet(self):
+        """
+        The current OPRs as a scoutingLoader.ScoutingSheet, ready for Dataset.from_sheet
+        and the pair rankings.
+        """
+        teams = list(self.teams)
+        index = dict(self.index)
+        return ScoutingSheet(teams, self.sample, self.specimen, index, sorted(teams))
+
+
+def solve_match_results(data):
+    """
+    OprSolver for the raw bytes of a match results CSV. Top-level so it can
+    run in a worker process (jobQueue).
+    """
+    return OprSolver.from_results(load_match_results(io.BytesIO(data)))
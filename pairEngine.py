@@ -0,0 +1,339 @@
+"""
+NumPy pair-scoring engine used by MainScouter.
+
+Every two-team pairing can be played two ways:
+  Option A: team1 plays SAMPLE and team2 plays SPECIMEN  (s1 + p2)
+  Option B: team1 plays SPECIMEN and team2 plays SAMPLE  (p1 + s2)
+The pair's best score is whichever option is higher (Option A wins ties).
+
+Pairs are always (i, j) with i < j in team order, the same order that
+itertools.combinations produces, and results come back as the same 7-tuples
+analyze() has always used:
+  (team1, team2, team1_role, team2_role, best_score, optionA, optionB)
+"""
+import heapq
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+# Roughly how many pair scores to hold in memory at once while searching.
+BLOCK_SIZE = 2_000_000
+
+
+def score_pairs(sample, specimen):
+    """
+    Scores every pairing (i < j) as upper-triangle array operations.
+    Returns (first, second, option_a, option_b, best) arrays in combinations order.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    first, second = np.triu_indices(len(sample), k=1)
+    option_a = sample[first] + specimen[second]
+    option_b = specimen[first] + sample[second]
+    best = np.maximum(option_a, option_b)
+    return first, second, option_a, option_b, best
+
+
+def pair_index(first, second, n):
+    """
+    Position of pair (first, second) in combinations order for n teams.
+    Used to break score ties the same way a stable sort over combinations would.
+    """
+    first = np.asarray(first, dtype=np.int64)
+    second = np.asarray(second, dtype=np.int64)
+    return first * n - first * (first + 1) // 2 + (second - first - 1)
+
+
+def top_k_order(scores, k, tiebreak=None):
+    """
+    Indices of the k highest scores, highest first, using a partial sort.
+    Equal scores are ordered by `tiebreak` (defaults to their position).
+    """
+    scores = np.asarray(scores)
+    if tiebreak is None:
+        tiebreak = np.arange(len(scores))
+    if k <= 0 or len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        # Everything tied with the k-th best is kept so ties are resolved exactly.
+        cutoff = -np.partition(-scores, k - 1)[k - 1]
+        candidates = np.flatnonzero(scores >= cutoff)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.lexsort((tiebreak[candidates], -scores[candidates]))
+    return candidates[order][:k]
+
+
+def top_pair_arrays(sample, specimen, k=10, alive=None):
+    """
+    Finds the k best pairs without sorting (or holding) every pair.
+    Rows of the upper triangle are scored in blocks and only each block's
+    top k survive, so memory stays around BLOCK_SIZE scores.
+    `alive` is an optional boolean mask of teams still in the pool.
+    Returns (first, second, option_a, option_b, best) arrays, best pair first.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    n = len(sample)
+    if alive is None:
+        alive = np.ones(n, dtype=bool)
+    kept = [np.empty(0, dtype=np.int64)] * 2
+
+    rows_per_block = max(1, BLOCK_SIZE // max(n, 1))
+    for start in range(0, n, rows_per_block):
+        stop = min(n, start + rows_per_block)
+        rows = np.arange(start, stop)
+        option_a = sample[rows, None] + specimen[None, :]
+        option_b = specimen[rows, None] + sample[None, :]
+        best = np.maximum(option_a, option_b)
+        # Only the upper triangle (j > i) between teams still in the pool counts.
+        valid = (np.arange(n)[None, :] > rows[:, None]) & alive[None, :] & alive[rows, None]
+        block_first, block_second = np.nonzero(valid)
+        block_first += start
+        if len(block_first) == 0:
+            continue
+        block_best = best[valid]
+        keep = top_k_order(block_best, k, pair_index(block_first, block_second, n))
+        kept = [np.concatenate((kept[0], block_first[keep])),
+                np.concatenate((kept[1], block_second[keep]))]
+
+    first, second = kept
+    option_a = sample[first] + specimen[second]
+    option_b = specimen[first] + sample[second]
+    best = np.maximum(option_a, option_b)
+    order = top_k_order(best, k, pair_index(first, second, n))
+    return first[order], second[order], option_a[order], option_b[order], best[order]
+
+
+def team_pair_arrays(sample, specimen, team, k=10, alive=None):
+    """
+    Finds the k best pairs that include `team` (an index), in O(n).
+    Returns the same arrays as top_pair_arrays.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    n = len(sample)
+    others = np.arange(n)
+    mask = others != team
+    if alive is not None:
+        mask &= alive
+    others = others[mask]
+    first = np.minimum(others, team)
+    second = np.maximum(others, team)
+    option_a = sample[first] + specimen[second]
+    option_b = specimen[first] + sample[second]
+    best = np.maximum(option_a, option_b)
+    order = top_k_order(best, k, pair_index(first, second, n))
+    return first[order], second[order], option_a[order], option_b[order], best[order]
+
+
+def best_other(values):
+    """
+    For every team, the best value among all *other* teams and whose it is,
+    from the top two values in O(n). Ties go to the earliest team.
+    Returns (index, value) arrays; index is -1 when there is no other team.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < 2:
+        return np.full(n, -1, dtype=np.int64), np.full(n, -np.inf)
+    first = int(np.argmax(values))
+    rest = values.copy()
+    rest[first] = -np.inf
+    second = int(np.argmax(rest))
+    index = np.full(n, first, dtype=np.int64)
+    index[first] = second
+    return index, values[index]
+
+
+# teams            - indices of the teams in the pool
+# sample_partner   - best partner index when the team plays SAMPLE (-1 if none)
+# sample_score     - team's sample OPR + that partner's specimen OPR
+# specimen_partner - best partner index when the team plays SPECIMEN (-1 if none)
+# specimen_score   - team's specimen OPR + that partner's sample OPR
+BestPartners = namedtuple(
+    "BestPartners", ["teams", "sample_partner", "sample_score", "specimen_partner", "specimen_score"]
+)
+
+
+def best_partners(sample, specimen, alive=None):
+    """
+    Best partner in each role for every team in the pool, in O(n) total.
+    Built from the top two specimen and top two sample values, so a team is
+    never paired with itself. Ties go to the earliest team in sheet order.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    teams = np.arange(len(sample)) if alive is None else np.flatnonzero(alive)
+    specimen_local, specimen_best = best_other(specimen[teams])
+    sample_local, sample_best = best_other(sample[teams])
+    # Map positions within the pool back to dataset indices (keeping -1 as "none").
+    sample_partner = np.where(specimen_local >= 0, teams[np.maximum(specimen_local, 0)], -1)
+    specimen_partner = np.where(sample_local >= 0, teams[np.maximum(sample_local, 0)], -1)
+    return BestPartners(
+        teams,
+        sample_partner,
+        sample[teams] + specimen_best,
+        specimen_partner,
+        specimen[teams] + sample_best,
+    )
+
+
+# unbeatable - True if no other pair matches or exceeds the top pair
+# best_pair  - (first, second, score) of the top pair, or None with fewer than 2 teams
+# runner_up  - (first, second, score) of the next best pair, or None if there isn't one
+# margin     - top score minus runner-up score (0 means the runner-up ties it)
+TopPairCheck = namedtuple("TopPairCheck", ["unbeatable", "best_pair", "runner_up", "margin"])
+
+# Teams taken from the top of each role when looking for the two best pairs.
+TOP_PAIR_CANDIDATES = 4
+
+
+def top_pair_check(sample, specimen, alive=None):
+    """
+    Checks whether the top pair is unbeatable straight from the team arrays, in O(n).
+
+    The two best pairs always pair a top-few SAMPLE value with a top-few SPECIMEN
+    value, so only the pairs among the best TOP_PAIR_CANDIDATES teams of each role
+    are scored. The scores and margin are exact; when several pairs tie exactly,
+    the one named prefers earlier teams, like the sorted pair list.
+    For the Best-OPR model, pass the same array as sample and specimen.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    teams = np.arange(len(sample)) if alive is None else np.flatnonzero(alive)
+    if len(teams) < 2:
+        return TopPairCheck(False, None, None, None)
+
+    picks = set()
+    for values in (sample[teams], specimen[teams]):
+        # Equal values prefer earlier teams, matching combinations order.
+        picks.update(teams[top_k_order(values, TOP_PAIR_CANDIDATES)].tolist())
+    picks = np.array(sorted(picks))
+    local_first, local_second, _, _, best = score_pairs(sample[picks], specimen[picks])
+    first, second = picks[local_first], picks[local_second]
+    order = np.lexsort((pair_index(first, second, len(sample)), -best))[:2]
+
+    top = (int(first[order[0]]), int(second[order[0]]), best[order[0]])
+    if len(order) < 2:
+        return TopPairCheck(True, top, None, None)
+    runner_up = (int(first[order[1]]), int(second[order[1]]), best[order[1]])
+    margin = top[2] - runner_up[2]
+    return TopPairCheck(bool(margin > 0), top, runner_up, margin)
+
+
+def pair_tuples(teams, first, second, option_a, option_b, best):
+    """
+    Turns pair arrays into the 7-tuples the HTML boxes expect.
+    """
+    pairs = []
+    for i, j, opt_a, opt_b, score in zip(first, second, option_a, option_b, best):
+        if opt_a >= opt_b:
+            team1_role, team2_role = "SAMPLE", "SPECIMEN"
+        else:
+            team1_role, team2_role = "SPECIMEN", "SAMPLE"
+        pairs.append((teams[i], teams[j], team1_role, team2_role, score, opt_a, opt_b))
+    return pairs
+
+
+def top_pairs(teams, sample, specimen, k=10, alive=None):
+    """
+    The k best pairings overall as 7-tuples, best first.
+    """
+    return pair_tuples(teams, *top_pair_arrays(sample, specimen, k, alive))
+
+
+def team_pairs(teams, sample, specimen, team, k=10, alive=None):
+    """
+    The k best pairings that include `team` (an index) as 7-tuples, best first.
+    """
+    return pair_tuples(teams, *team_pair_arrays(sample, specimen, team, k, alive))
+
+
+def iter_best_pairs(sample, specimen, alive=None):
+    """
+    Yields (first, second, option_a, option_b, best) for every pair, best first,
+    without ever building the full pair list.
+
+    A pair's best score is the larger of its two role assignments, so it equals the
+    best "SAMPLE team + SPECIMEN team" sum over its two orderings. Walking the
+    sample and specimen values in descending order with a heap (the classic
+    k-best-sums search) visits those ordered sums from the top down. The first
+    time a pair shows up is its best assignment; the second is skipped.
+    Getting the first k pairs costs about O(n log n + k log k), using O(n + k) memory.
+    Pairs with equal scores can come out in any order.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    teams = np.arange(len(sample)) if alive is None else np.flatnonzero(alive)
+    if len(teams) < 2:
+        return
+    by_sample = teams[np.argsort(-sample[teams], kind="stable")].tolist()
+    by_specimen = teams[np.argsort(-specimen[teams], kind="stable")].tolist()
+    sample_sorted = sample[by_sample].tolist()
+    specimen_sorted = specimen[by_specimen].tolist()
+    count = len(teams)
+
+    # Each (i, j) is pushed exactly once: down the first column, then along each row.
+    heap = [(-(sample_sorted[0] + specimen_sorted[0]), 0, 0)]
+    seen_once = set()
+    while heap:
+        _, i, j = heapq.heappop(heap)
+        if j == 0 and i + 1 < count:
+            heapq.heappush(heap, (-(sample_sorted[i + 1] + specimen_sorted[0]), i + 1, 0))
+        if j + 1 < count:
+            heapq.heappush(heap, (-(sample_sorted[i] + specimen_sorted[j + 1]), i, j + 1))
+
+        sample_team, specimen_team = by_sample[i], by_specimen[j]
+        if sample_team == specimen_team:
+            continue
+        first, second = min(sample_team, specimen_team), max(sample_team, specimen_team)
+        if (first, second) in seen_once:
+            # Second (worse or equal) role assignment of a pair we already yielded.
+            seen_once.discard((first, second))
+            continue
+        seen_once.add((first, second))
+        option_a = sample[first] + specimen[second]
+        option_b = specimen[first] + sample[second]
+        yield first, second, option_a, option_b, max(option_a, option_b)
+
+
+class PairPager:
+    """
+    Pages through pairs best-first, pulling from iter_best_pairs only as far as
+    the deepest page asked for. Earlier pages are kept, so scrolling back or
+    deeper never recomputes.
+    """
+
+    def __init__(self, teams, sample, specimen, alive=None):
+        self.teams = teams
+        self._pairs = iter_best_pairs(sample, specimen, alive)
+        self._seen = []
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def _fill(self, count):
+        while len(self._seen) < count and not self.exhausted:
+            try:
+                self._seen.append(next(self._pairs))
+            except StopIteration:
+                self.exhausted = True
+
+    def page(self, number, size=10):
+        """
+        The 7-tuples for page `number` (0-indexed) of `size` pairs.
+        """
+        start = number * size
+        with self._lock:
+            self._fill(start + size)
+            rows = self._seen[start:start + size]
+        return pair_tuples(self.teams, *zip(*rows)) if rows else []
+
+    def has_more(self, number, size=10):
+        """
+        True if there is at least one pair after page `number`.
+        """
+        with self._lock:
+            self._fill((number + 1) * size + 1)
+            return len(self._seen) > (number + 1) * size
@@ -0,0 +1,414 @@
+"""
+Incremental pair ranking for live alliance selection.
+
+All pairs of a dataset are scored and sorted once. After that, removing a team
+only switches off its n - 1 pairs in a Fenwick tree (binary indexed tree) over
+the sorted order, and restoring it switches them back on. Each change costs
+O(n log n) and reading the top k costs O(k log n), so "Run Analysis" after
+every pick no longer regenerates and re-sorts every pair.
+
+New values for a few teams (match observations coming in) are handled the same
+way: the changed teams' sorted pairs are switched off, and their pairs are
+scored fresh from the current values on each query and merged with the sorted
+ones. Past MAX_CHANGED teams the caller rebuilds the ranking instead.
+"""
+import math
+import threading
+
+import numpy as np
+
+from pairEngine import score_pairs, pair_tuples, pair_index, best_other, best_partners
+
+# Thresholds are counted this many at a time in the batched rank queries.
+RANK_CHUNK = 256
+# Smallest block of teams the role-model rank count compares directly.
+RANK_BLOCK = 32
+
+# Scores within this (relative) distance count as tied. Rank queries compare
+# p_b > x - s_a instead of s_a + p_b > x, which can round differently.
+RANK_TOLERANCE = 1e-9
+
+# Teams with changed values a ranking takes before it should be rebuilt.
+MAX_CHANGED = 32
+
+
+class FenwickTree:
+    """
+    Prefix sums over a list of counts with O(log n) updates and searches.
+    """
+
+    def __init__(self, counts):
+        self.size = len(counts)
+        self.tree = [0] + list(counts)
+        # Linear-time build: push each node's total up to its parent.
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(counts)
+
+    def add(self, position, delta):
+        """
+        Adds `delta` to the count at `position` (0-indexed).
+        """
+        self.total += delta
+        i = position + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, position):
+        """
+        Sum of the counts before `position`.
+        """
+        total = 0
+        i = position
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, k):
+        """
+        Position of the (k + 1)-th unit of count, i.e. the k-th (0-indexed) live entry.
+        """
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] <= k:
+                position = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return position
+
+
+class PairRanking:
+    """
+    Every pair of one dataset in descending best-score order (ties in
+    combinations order), with teams switched in and out of the pool.
+    Hold `lock` while changing the removed set and reading results.
+    """
+
+    def __init__(self, sample, specimen):
+        # Current values; pairs of `changed` teams are scored from these, not the sorted arrays.
+        self.sample = np.array(sample, dtype=float)
+        self.specimen = np.array(specimen, dtype=float)
+        first, second, option_a, option_b, best = score_pairs(self.sample, self.specimen)
+        order = np.argsort(-best, kind="stable")
+        self.first = first[order]
+        self.second = second[order]
+        self.option_a = option_a[order]
+        self.option_b = option_b[order]
+        self.best = best[order]
+        self.n = len(sample)
+        self.alive = np.ones(self.n, dtype=bool)
+        self.changed = np.zeros(self.n, dtype=bool)
+        self.lock = threading.Lock()
+
+        # Group the ranked positions by team so a team's pairs can be found in O(n).
+        m = len(order)
+        owners = np.concatenate((self.first, self.second))
+        positions = np.tile(np.arange(m), 2)
+        grouped = np.lexsort((positions, owners))
+        self._positions = positions[grouped]
+        self._starts = np.searchsorted(owners[grouped], np.arange(self.n + 1))
+        self._tree = FenwickTree([1] * m)
+
+    def __len__(self):
+        """
+        Number of pairs between teams still in the pool.
+        """
+        if self.changed.any():
+            return self._tree.total + len(self._fresh_pairs()[0])
+        return self._tree.total
+
+    @property
+    def nbytes(self):
+        """
+        Rough memory footprint, used to bound the dataset cache.
+        """
+        arrays = (
+            self.first, self.second, self.option_a, self.option_b, self.best, self._positions,
+            self.sample, self.specimen,
+        )
+        return sum(a.nbytes for a in arrays) + 8 * len(self._tree.tree)
+
+    def team_positions(self, team):
+        """
+        Ranked positions of every pair that includes `team`, best first.
+        """
+        return self._positions[self._starts[team]:self._starts[team + 1]]
+
+    def _partners(self, team, positions):
+        return np.where(self.first[positions] == team, self.second[positions], self.first[positions])
+
+    def _sorted_live(self, team, positions):
+        """
+        Which of `team`'s sorted pairs are switched on: partner in the pool and unchanged.
+        """
+        partners = self._partners(team, positions)
+        return self.alive[partners] & ~self.changed[partners]
+
+    def _switch(self, team, delta):
+        if self.changed[team]:
+            return
+        positions = self.team_positions(team)
+        for position in positions[self._sorted_live(team, positions)].tolist():
+            self._tree.add(position, delta)
+
+    def remove_team(self, team):
+        """
+        Takes `team` out of the pool by switching off its live pairs.
+        """
+        if not self.alive[team]:
+            return
+        self._switch(team, -1)
+        self.alive[team] = False
+
+    def restore_team(self, team):
+        """
+        Puts `team` back in the pool, reviving its pairs with teams still in it.
+        """
+        if self.alive[team]:
+            return
+        self._switch(team, 1)
+        self.alive[team] = True
+
+    def update_values(self, sample, specimen, teams):
+        """
+        Takes the current `sample` and `specimen` arrays, where only `teams`
+        (indices) changed. Costs O(n log n) per newly changed team. Returns
+        False, changing nothing, if that would leave more than MAX_CHANGED
+        changed teams; build a new ranking then.
+        """
+        teams = np.unique(np.asarray(teams, dtype=np.int64))
+        new = teams[~self.changed[teams]]
+        if self.changed.sum() + len(new) > MAX_CHANGED:
+            return False
+        for team in new.tolist():
+            if self.alive[team]:
+                self._switch(team, -1)
+            self.changed[team] = True
+        self.sample[teams] = np.asarray(sample, dtype=float)[teams]
+        self.specimen[teams] = np.asarray(specimen, dtype=float)[teams]
+        return True
+
+    def _fresh_pairs(self, team=None):
+        """
+        (first, second, option_a, option_b, best) of the live pairs that have a
+        changed team (only those with `team`, if given), scored from the current
+        values, best first with ties in combinations order.
+        """
+        alive = np.flatnonzero(self.alive)
+        if team is None:
+            owners = np.flatnonzero(self.changed & self.alive)
+        else:
+            owners = np.array([team] if self.alive[team] else [], dtype=np.int64)
+        firsts, seconds = [], []
+        for owner in owners.tolist():
+            others = alive[alive != owner]
+            if team is None:
+                # A pair of two changed teams is listed once, by its lower team.
+                others = others[~self.changed[others] | (others > owner)]
+            elif not self.changed[owner]:
+                others = others[self.changed[others]]
+            firsts.append(np.minimum(others, owner))
+            seconds.append(np.maximum(others, owner))
+        first = np.concatenate(firsts) if firsts else np.empty(0, dtype=np.int64)
+        second = np.concatenate(seconds) if seconds else np.empty(0, dtype=np.int64)
+        option_a = self.sample[first] + self.specimen[second]
+        option_b = self.specimen[first] + self.sample[second]
+        best = np.maximum(option_a, option_b)
+        order = np.lexsort((pair_index(first, second, self.n), -best))
+        return first[order], second[order], option_a[order], option_b[order], best[order]
+
+    def _merged_tuples(self, teams, positions, fresh, k, start=0):
+        """
+        Merges sorted `positions` with `fresh` pair arrays, best first (ties in
+        combinations order), and returns 7-tuples for ranks start .. start + k.
+        """
+        arrays = [
+            np.concatenate((column[positions], extra))
+            for column, extra in zip((self.first, self.second, self.option_a, self.option_b, self.best), fresh)
+        ]
+        first, second, best = arrays[0], arrays[1], arrays[4]
+        order = np.lexsort((pair_index(first, second, self.n), -best))[start:start + k]
+        return pair_tuples(teams, *(column[order] for column in arrays))
+
+    def set_removed(self, removed):
+        """
+        Brings the pool in line with `removed` (team indices), touching only
+        the teams whose state actually changed.
+        """
+        wanted = np.ones(self.n, dtype=bool)
+        wanted[list(removed)] = False
+        for team in np.flatnonzero(self.alive & ~wanted).tolist():
+            self.remove_team(team)
+        for team in np.flatnonzero(~self.alive & wanted).tolist():
+            self.restore_team(team)
+
+    def top_positions(self, k=10, start=0):
+        """
+        Ranked positions of the k best live pairs, skipping the first `start`.
+        """
+        stop = min(start + k, self._tree.total)
+        return np.array([self._tree.find(r) for r in range(start, stop)], dtype=np.int64)
+
+    def team_top_positions(self, team, k=10):
+        """
+        Ranked positions of the k best live pairs that include `team`.
+        """
+        if not self.alive[team] or self.changed[team]:
+            return np.empty(0, dtype=np.int64)
+        positions = self.team_positions(team)
+        return positions[self._sorted_live(team, positions)][:k]
+
+    def pair_tuples(self, teams, positions):
+        """
+        Turns ranked positions into the 7-tuples the HTML boxes expect.
+        """
+        return pair_tuples(
+            teams,
+            self.first[positions],
+            self.second[positions],
+            self.option_a[positions],
+            self.option_b[positions],
+            self.best[positions],
+        )
+
+    def top_pairs(self, teams, k=10, start=0):
+        """
+        The k best live pairings as 7-tuples, best first, skipping the first `start`.
+        """
+        if self.changed.any():
+            return self._merged_tuples(teams, self.top_positions(start + k), self._fresh_pairs(), k, start)
+        return self.pair_tuples(teams, self.top_positions(k, start))
+
+    def team_pairs(self, teams, team, k=10):
+        """
+        The k best live pairings that include `team` (an index) as 7-tuples.
+        """
+        if self.changed.any():
+            return self._merged_tuples(teams, self.team_top_positions(team, k), self._fresh_pairs(team), k)
+        return self.pair_tuples(teams, self.team_top_positions(team, k))
+
+
+def count_pairs_above(threshold, values):
+    """
+    Best-OPR model: how many pairs i < j have values[i] + values[j] > threshold.
+    Sort once, then binary-search each team's partner cutoff: O(n log n).
+    Scores within RANK_TOLERANCE of the threshold count as ties, not above.
+    """
+    return int(count_pairs_above_many([threshold], values)[0])
+
+
+def count_pairs_above_many(thresholds, values):
+    """
+    count_pairs_above for several thresholds at once.
+    """
+    ordered = np.sort(np.asarray(values, dtype=float))
+    thresholds = np.asarray(thresholds, dtype=float)
+    thresholds = thresholds + RANK_TOLERANCE * np.maximum(1.0, np.abs(thresholds))
+    n = len(ordered)
+    counts = np.zeros(len(thresholds), dtype=np.int64)
+    own = np.arange(n)
+    for start in range(0, len(thresholds), RANK_CHUNK):
+        chunk = thresholds[start:start + RANK_CHUNK]
+        # First partner position whose value pushes the sum past the threshold,
+        # only counting partners after i so each pair is counted once.
+        cut = np.searchsorted(ordered, chunk[:, None] - ordered[None, :], side="right")
+        cut = np.maximum(cut, own[None, :] + 1)
+        counts[start:start + RANK_CHUNK] = np.sum(n - cut, axis=1)
+    return counts
+
+
+def count_role_pairs_above(threshold, sample, specimen):
+    """
+    Role model: how many pairs score more than `threshold`, where a pair scores
+    max(s1 + p2, p1 + s2). Runs without listing any pairs.
+    Like count_pairs_above, scores within RANK_TOLERANCE of the threshold are ties.
+    """
+    return int(count_role_pairs_above_many([threshold], sample, specimen)[0])
+
+
+def count_role_pairs_above_many(thresholds, sample, specimen):
+    """
+    count_role_pairs_above for several thresholds at once.
+
+    A pair's best score puts the team leaning more towards SAMPLE (larger
+    s - p) on SAMPLE. With teams in that order, the count is the pairs a < b
+    with p_a + s_b above the threshold. It is done a block of teams at a time:
+    pairs with b in a later block are binary searches over that block onwards
+    (sorted once), and pairs inside the block are compared directly. Memory is
+    about n * sqrt(n), never the n^2 pair list.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+    thresholds = thresholds + RANK_TOLERANCE * np.maximum(1.0, np.abs(thresholds))
+    n = len(sample)
+    counts = np.zeros(len(thresholds), dtype=np.int64)
+    if n < 2:
+        return counts
+    order = np.argsort(sample - specimen, kind="stable")
+    as_specimen, as_sample = specimen[order], sample[order]
+    block = max(RANK_BLOCK, math.isqrt(n))
+    starts = range(0, n, block)
+    # SAMPLE values from each block's start to the end, sorted.
+    later = [np.sort(as_sample[start:]) for start in starts]
+    # Per block, row a holds the SAMPLE values of the teams after a in it (-inf elsewhere).
+    after = ~np.triu(np.ones((block, block), dtype=bool), k=1)
+    within = [
+        np.where(after[:stop - start, :stop - start], -np.inf, as_sample[None, start:stop])
+        for start, stop in ((start, min(start + block, n)) for start in starts)
+    ]
+    for first in range(0, len(thresholds), RANK_CHUNK):
+        chunk = thresholds[first:first + RANK_CHUNK]
+        for k, start in enumerate(starts):
+            stop = min(start + block, n)
+            cutoffs = chunk[:, None] - as_specimen[None, start:stop]
+            if k + 1 < len(later):
+                rest = later[k + 1]
+                counts[first:first + RANK_CHUNK] += np.sum(
+                    len(rest) - np.searchsorted(rest, cutoffs, side="right"), axis=1
+                )
+            above = within[k][None, :, :] > cutoffs[:, :, None]
+            counts[first:first + RANK_CHUNK] += np.count_nonzero(above.reshape(len(chunk), -1), axis=1)
+    return counts
+
+
+def best_opr_pair_ranks(values):
+    """
+    Best-OPR model, for every team at once: its best partner (index), that
+    pair's combined OPR, and the pair's rank among all pairs (1 + the number of
+    pairs scoring strictly more). No pair list is built.
+    """
+    values = np.asarray(values, dtype=float)
+    partners, partner_values = best_other(values)
+    scores = values + partner_values
+    ranks = np.zeros(len(values), dtype=np.int64)
+    if len(values) >= 2:
+        unique, inverse = np.unique(scores, return_inverse=True)
+        ranks = count_pairs_above_many(unique, values)[inverse] + 1
+    return partners, scores, ranks
+
+
+def role_pair_ranks(sample, specimen):
+    """
+    Role model (MainScouter), for every team at once: its best partner (index),
+    that pair's best score and the pair's rank among all pairs. No pair list
+    is built.
+    """
+    sample = np.asarray(sample, dtype=float)
+    specimen = np.asarray(specimen, dtype=float)
+    index = best_partners(sample, specimen)
+    as_sample = index.sample_score >= index.specimen_score
+    partners = np.where(as_sample, index.sample_partner, index.specimen_partner)
+    scores = np.maximum(index.sample_score, index.specimen_score)
+    ranks = np.zeros(len(sample), dtype=np.int64)
+    if len(sample) >= 2:
+        # Teams sharing a best score share a rank, so each score is counted once.
+        unique, inverse = np.unique(scores, return_inverse=True)
+        ranks = count_role_pairs_above_many(unique, sample, specimen)[inverse] + 1
+    return partners, scores, ranks
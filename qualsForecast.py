@@ -0,0 +1,139 @@
+"""
+Forecast of the final qualification rankings.
+
+Starting from the current standings (ranking points, tiebreaker points and
+matches played per team), every remaining match is simulated with
+matchPredictor's per-team distributions: the higher alliance score wins 2
+ranking points, a tie gives both alliances 1, and each alliance adds its score
+to its teams' tiebreaker points. Teams are ranked by average ranking points,
+then average tiebreaker points.
+
+All simulations run together: one (simulations, alliances) batch of scores,
+turned into per-team totals with a single matrix product against the
+alliance/team incidence matrix.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from allianceOptimizer import best_roles
+from matchPredictor import simulate_scores
+
+DEFAULT_SIMULATIONS = 10000
+MAX_SIMULATIONS = 100000
+
+# Top-ranked teams become alliance captains.
+CAPTAINS = 4
+
+# teams          - team IDs
+# ranking_points - float array of ranking points so far, aligned with teams
+# tiebreaker     - float array of tiebreaker points (own alliance scores) so far
+# played         - int array of matches played so far
+Standings = namedtuple("Standings", ["teams", "ranking_points", "tiebreaker", "played"])
+
+
+def standings_from_results(results, teams=()):
+    """
+    Current Standings from the played matches of oprSolver.MatchResults,
+    including every team in `teams`, the played matches and the remaining schedule.
+    """
+    everyone = (
+        list(teams)
+        + [t for red, blue, *_ in results.played for t in red + blue]
+        + [t for red, blue in results.unplayed for t in red + blue]
+    )
+    empty = Standings([], np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64))
+    names, ranking_points, tiebreaker, played = add_teams(empty, everyone)
+    index = {team: i for i, team in enumerate(names)}
+    for red, blue, red_points, blue_points in results.played:
+        for own, points, other in ((red, red_points, blue_points), (blue, blue_points, red_points)):
+            for team in own:
+                i = index[team]
+                ranking_points[i] += 2 if points > other else 1 if points == other else 0
+                tiebreaker[i] += points
+                played[i] += 1
+    return Standings(names, ranking_points, tiebreaker, played)
+
+
+def add_teams(standings, teams):
+    """
+    Standings extended with any of `teams` not in them yet (no matches played).
+    """
+    known = set(standings.teams)
+    new = [t for t in dict.fromkeys(teams) if t not in known]
+    if not new:
+        return standings
+    return Standings(
+        list(standings.teams) + new,
+        np.concatenate((standings.ranking_points, np.zeros(len(new)))),
+        np.concatenate((standings.tiebreaker, np.zeros(len(new)))),
+        np.concatenate((standings.played, np.zeros(len(new), dtype=np.int64))),
+    )
+
+
+def rank_order(ranking_score, tiebreak):
+    """
+    Ranks (0 = first) of every team in every row: by ranking score, then
+    tiebreaker, then team order.
+    """
+    n = ranking_score.shape[-1]
+    position = np.broadcast_to(np.arange(n), ranking_score.shape)
+    order = np.lexsort((position, -tiebreak, -ranking_score), axis=-1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(n), order.shape), axis=-1)
+    return ranks
+
+
+def forecast_rankings(standings, schedule, sample, specimen, sample_spread, specimen_spread,
+                      simulations=DEFAULT_SIMULATIONS, seed=None):
+    """
+    Simulates the remaining `schedule` ((red, blue) lists of indices into
+    standings.teams, two teams per alliance) and returns a dict with
+      current      - each team's rank (0-based) right now
+      distribution - (teams, ranks) array: chance of finishing at each rank
+      expected     - expected final rank (0-based)
+    `sample`, `specimen` and the spreads are aligned with standings.teams.
+    """
+    n = len(standings.teams)
+    ranking_points = np.asarray(standings.ranking_points, dtype=float)
+    tiebreaker = np.asarray(standings.tiebreaker, dtype=float)
+    played = np.asarray(standings.played, dtype=float)
+
+    def averages(points, bonus, matches):
+        return points / np.maximum(matches, 1), bonus / np.maximum(matches, 1)
+
+    current = rank_order(*averages(ranking_points, tiebreaker, played))
+    if not schedule:
+        distribution = np.zeros((n, n))
+        distribution[np.arange(n), current] = 1.0
+        return {"current": current, "distribution": distribution, "expected": current.astype(float)}
+
+    alliances, incidence = [], np.zeros((2 * len(schedule), n))
+    for m, (red, blue) in enumerate(schedule):
+        for side, teams in enumerate((red, blue)):
+            if len(teams) != 2:
+                raise ValueError("Quals alliances must have exactly two teams")
+            alliances.append(best_roles(sample, specimen, *teams))
+            incidence[2 * m + side, list(teams)] = 1
+
+    rng = np.random.default_rng(seed)
+    scores = simulate_scores(
+        sample, specimen, sample_spread, specimen_spread, alliances, simulations, rng, shared=False
+    )
+    red, blue = scores[:, 0::2], scores[:, 1::2]
+    earned = np.empty_like(scores)
+    earned[:, 0::2] = 2.0 * (red > blue) + (red == blue)
+    earned[:, 1::2] = 2.0 * (blue > red) + (red == blue)
+
+    final = rank_order(*averages(
+        ranking_points + earned @ incidence,
+        tiebreaker + scores @ incidence,
+        played + incidence.sum(axis=0),
+    ))
+    counts = np.bincount((np.arange(n) * n + final).ravel(), minlength=n * n).reshape(n, n)
+    distribution = counts / simulations
+    return {
+        "current": current,
+        "distribution": distribution,
+        "expected": distribution @ np.arange(n),
+    }
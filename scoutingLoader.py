@@ -0,0 +1,184 @@
+"""
+Shared loader for our scouting spreadsheet.
+
+The sheet has an extra first row, so the real headers are on row 1 (header=1).
+Only the three columns the scouters use are read:
+  - "Team #"
+  - "Observed SAMPLEOPR"
+  - "Observed SPECIMEN OPR"
+Header names are matched after stripping spaces, like df.columns.str.strip() did.
+
+Big season-long exports can be streamed instead (stream_scouting_sheets):
+the file is read in chunks and only per-(event, team) values are kept, so
+memory doesn't grow with the number of rows. An optional "Event" column splits
+the sheet into one ScoutingSheet per event.
+"""
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+TEAM_COL = "Team #"
+SAMPLE_OPR_COL = "Observed SAMPLEOPR"
+SPECIMEN_OPR_COL = "Observed SPECIMEN OPR"
+COLUMNS = (TEAM_COL, SAMPLE_OPR_COL, SPECIMEN_OPR_COL)
+EVENT_COL = "Event"
+
+# Rows per chunk when streaming.
+CHUNK_ROWS = 50000
+
+# teams     - team numbers as strings (e.g. "11770.0"), one per team, in sheet order
+# sample    - float64 array of sample OPR aligned with teams (blank/bad cells are 0)
+# specimen  - float64 array of specimen OPR aligned with teams
+# index     - {team: position in teams}
+# all_teams - sorted team list for dropdowns
+ScoutingSheet = namedtuple("ScoutingSheet", ["teams", "sample", "specimen", "index", "all_teams"])
+
+
+def load_scouting_sheet(source, header=1):
+    """
+    Reads a scouting sheet (path, file object or buffer) into a ScoutingSheet.
+    Raises KeyError if one of the required columns is missing.
+    """
+    return sheet_from_frame(read_scouting_columns(source, header))
+
+
+def read_scouting_columns(source, header=1):
+    """
+    Reads just the three scouting columns into a DataFrame with stripped headers.
+    Raises KeyError if one of them is missing.
+    """
+    df = pd.read_csv(source, header=header, usecols=lambda c: str(c).strip() in COLUMNS)
+    df.columns = df.columns.str.strip()
+    missing = [c for c in COLUMNS if c not in df.columns]
+    if missing:
+        raise KeyError(f"Missing column(s): {', '.join(missing)}")
+    return df
+
+
+def sheet_from_frame(df):
+    """
+    Builds a ScoutingSheet from a DataFrame that has the three scouting columns.
+    A team listed more than once keeps its first position and its last values,
+    the same as building a dict row by row.
+    """
+    # Team numbers are formatted like str(value) (e.g. "11770.0" when the column has blanks,
+    # "nan" for an empty cell); newer pandas would keep NaN as missing with astype(str).
+    team_ids = np.char.strip(np.asarray(df[TEAM_COL], dtype=object).astype(str))
+    sample = pd.to_numeric(df[SAMPLE_OPR_COL], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+    specimen = pd.to_numeric(df[SPECIMEN_OPR_COL], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+    codes, teams = pd.factorize(team_ids)
+    last = ~pd.Series(codes).duplicated(keep="last").to_numpy()
+    team_sample = np.zeros(len(teams), dtype=np.float64)
+    team_specimen = np.zeros(len(teams), dtype=np.float64)
+    team_sample[codes[last]] = sample[last]
+    team_specimen[codes[last]] = specimen[last]
+
+    teams = [str(t) for t in teams]
+    index = {team: i for i, team in enumerate(teams)}
+    return ScoutingSheet(teams, team_sample, team_specimen, index, sorted(teams))
+
+
+def _latest_rows(latest, part, keys):
+    """
+    Folds a chunk's rows into the running per-key aggregate: each key keeps
+    the row number where it first appeared and the values of its latest row.
+    """
+    part = part.assign(first=part["row"])
+    combined = pd.concat([latest, part], ignore_index=True) if latest is not None else part
+    first = combined.groupby(keys, dropna=False, sort=False)["first"].transform("min")
+    combined = combined.assign(first=first)
+    # Chunk rows come after every aggregated row, so the last duplicate is the latest.
+    return combined.drop_duplicates(keys, keep="last")
+
+
+def _sheet_from_latest(latest, format_team):
+    """
+    ScoutingSheet from an aggregate made by _latest_rows, with raw team cells
+    turned into IDs by format_team. Cells that format to the same ID (e.g.
+    "7" and "07") are one team, again keeping first position and latest values.
+    """
+    latest = latest.assign(team=[format_team(t) for t in latest["team"].tolist()])
+    first = latest.groupby("team", sort=False)["first"].transform("min")
+    latest = latest.assign(first=first).sort_values("row", kind="stable")
+    latest = latest.drop_duplicates("team", keep="last").sort_values("first", kind="stable")
+    teams = latest["team"].tolist()
+    index = {team: i for i, team in enumerate(teams)}
+    return ScoutingSheet(
+        teams,
+        latest["sample"].to_numpy(dtype=np.float64),
+        latest["specimen"].to_numpy(dtype=np.float64),
+        index,
+        sorted(teams),
+    )
+
+
+def stream_scouting_sheets(source, header=1, event=None, chunksize=CHUNK_ROWS):
+    """
+    Reads a scouting sheet in chunks and returns {event: ScoutingSheet}.
+    The None entry covers every row and matches load_scouting_sheet for the
+    same file; the others are one per value of the optional "Event" column
+    (rows without an event only count towards None). With `event`, only that
+    event's rows are kept and the result has just that entry (if it exists).
+    Raises KeyError if one of the required columns is missing.
+    """
+    wanted = COLUMNS + (EVENT_COL,)
+    reader = pd.read_csv(
+        source, header=header, chunksize=chunksize, dtype=str,
+        usecols=lambda c: str(c).strip() in wanted,
+    )
+    everyone = by_event = None
+    # Team cells are formatted at the end the way a single read_csv would
+    # have typed the whole column: int, float, or text if anything isn't a number.
+    has_blank, all_integer, all_numeric = False, True, True
+    offset = 0
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip()
+        missing = [c for c in COLUMNS if c not in chunk.columns]
+        if missing:
+            raise KeyError(f"Missing column(s): {', '.join(missing)}")
+        teams = chunk[TEAM_COL].str.strip()
+        text = teams.dropna()
+        has_blank = has_blank or len(text) < len(teams)
+        if all_numeric and len(text):
+            # to_numeric types the cells like read_csv would: int only if every cell is an integer.
+            numbers = pd.to_numeric(text, errors="coerce")
+            all_numeric = not numbers.isna().any()
+            all_integer = all_integer and numbers.dtype.kind in "iu"
+        if EVENT_COL in chunk.columns:
+            events = chunk[EVENT_COL].str.strip().replace("", None)
+        else:
+            events = pd.Series(None, index=chunk.index, dtype=object)
+
+        part = pd.DataFrame({
+            "event": events.to_numpy(dtype=object),
+            "team": teams.to_numpy(dtype=object),
+            "row": np.arange(offset, offset + len(chunk)),
+            "sample": pd.to_numeric(chunk[SAMPLE_OPR_COL], errors="coerce").fillna(0).to_numpy(dtype=np.float64),
+            "specimen": pd.to_numeric(chunk[SPECIMEN_OPR_COL], errors="coerce").fillna(0).to_numpy(dtype=np.float64),
+        })
+        offset += len(chunk)
+        if event is None:
+            everyone = _latest_rows(everyone, part.drop(columns="event"), ["team"])
+            part = part[part["event"].notna()]
+        else:
+            part = part[part["event"] == event]
+        by_event = _latest_rows(by_event, part, ["event", "team"])
+
+    def format_team(raw):
+        if raw is None or raw is np.nan:
+            return "nan"
+        if not all_numeric:
+            return raw
+        if all_integer and not has_blank:
+            return str(int(raw))
+        return str(float(raw))
+
+    sheets = OrderedDict()
+    if everyone is not None:
+        sheets[None] = _sheet_from_latest(everyone, format_team)
+    if by_event is not None:
+        for name, group in by_event.groupby("event", sort=False):
+            sheets[name] = _sheet_from_latest(group, format_team)
+    return sheets
@@ -0,0 +1,211 @@
+"""
+Server-side sessions for the Flask apps.
+
+Flask's default session is a signed cookie holding all of the session's data,
+sent with every request. Here the cookie only holds a random session ID; the
+data (dataset key, removed teams, my team, ...) lives on the server in a backend:
+  MemorySessionBackend - in-process dict, least recently used sessions evicted
+                         past max_entries, and any session idle longer than ttl
+  SqliteSessionBackend - a local SQLite file, so sessions survive restarts
+                         and can be shared by several worker processes
+
+The backend is picked with SCOUTER_SESSION_BACKEND: "sqlite" (the default) or
+"memory" (for tests). The SQLite file is SCOUTER_SESSION_DB, or sessions.sqlite3
+in the dataset store's data directory, so a restart keeps both the uploads and
+the sessions pointing at them. With the store turned off (SCOUTER_DATA_DIR set
+to an empty string) and no SCOUTER_SESSION_DB, sessions stay in memory.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from datasetStore import DEFAULT_DIR
+
+# Sessions idle longer than this (seconds) are dropped: a long event day.
+SESSION_TTL = 16 * 60 * 60
+MAX_SESSIONS = 1000
+
+
+class MemorySessionBackend:
+    """
+    Sessions in a dict, bounded by count (LRU) and idle time (TTL).
+    Data is stored as JSON text so requests never share mutable objects.
+    """
+
+    def __init__(self, max_entries=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, sid):
+        """
+        The session's data as a dict, or None if it doesn't exist or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            expires, text = entry
+            if expires < now:
+                del self._entries[sid]
+                return None
+            self._entries[sid] = (now + self.ttl, text)
+            self._entries.move_to_end(sid)
+        return json.loads(text)
+
+    def save(self, sid, data):
+        text = json.dumps(data)
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(sid, None)
+            self._entries[sid] = (now + self.ttl, text)
+            # Entries are in last-used order, so expired ones are at the front.
+            while self._entries and (
+                len(self._entries) > self.max_entries or next(iter(self._entries.values()))[0] < now
+            ):
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+
+class SqliteSessionBackend:
+    """
+    Sessions in a SQLite table, dropped after `ttl` seconds idle.
+    """
+
+    def __init__(self, path, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections can't be shared between threads.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def load(self, sid):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT data, expires FROM sessions WHERE id = ?", (sid,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                db.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+                return None
+            db.execute("UPDATE sessions SET expires = ? WHERE id = ?", (now + self.ttl, sid))
+        return json.loads(row[0])
+
+    def save(self, sid, data):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)",
+                (sid, json.dumps(data), now + self.ttl),
+            )
+            db.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+    def delete(self, sid):
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+
+def backend_from_env():
+    """
+    The session backend chosen by SCOUTER_SESSION_BACKEND / SCOUTER_SESSION_DB.
+    """
+    kind = os.environ.get("SCOUTER_SESSION_BACKEND", "sqlite")
+    if kind == "memory":
+        return MemorySessionBackend()
+    if kind == "sqlite":
+        path = os.environ.get("SCOUTER_SESSION_DB")
+        if not path:
+            data_dir = os.environ.get("SCOUTER_DATA_DIR", DEFAULT_DIR)
+            if not data_dir:
+                return MemorySessionBackend()
+            path = os.path.join(data_dir, "sessions.sqlite3")
+        return SqliteSessionBackend(path)
+    raise ValueError(f"Unknown SCOUTER_SESSION_BACKEND {kind!r}; use memory or sqlite")
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    Session data kept on the server; the cookie only carries `sid`.
+    """
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Flask session interface storing sessions in a backend (see the module
+    docstring). Install with `app.session_interface = ServerSessionInterface()`.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else backend_from_env()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        data = self.backend.load(sid) if sid else None
+        if data is None:
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+        return ServerSession(data, sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.modified:
+            self.backend.save(session.sid, dict(session))
+        if session.new or session.modified or self.should_set_cookie(app, session):
+            response.vary.add("Cookie")
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
@@ -0,0 +1,177 @@
+"""
+Lightweight per-stage timing for the Flask apps.
+
+Wrap the slow parts of a request in `with timer.stage("parse", bytes=n):`.
+When timing is on, every request gets a Server-Timing header listing its stages
+(wall time plus item counts), and /metrics (local requests only) reports the
+rolling p50/p95/p99 of each stage.
+
+Timing is off unless SCOUTER_TIMING=1 is set (or StageTimer(enabled=True)).
+When off, stage() hands back one shared do-nothing object, so the cost is a
+method call per stage.
+"""
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+from flask import g, has_request_context, request
+
+# How many recent timings per stage the percentiles are computed over.
+WINDOW = 500
+
+LOCAL_ADDRESSES = ("127.0.0.1", "::1", "localhost")
+
+
+class _NullStage:
+    """
+    Stand-in used while timing is off.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, **counts):
+        pass
+
+    def stop(self, **counts):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """
+    One timed stage of the current request.
+    """
+
+    def __init__(self, timer, name, counts):
+        self.timer = timer
+        self.name = name
+        self.counts = counts
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        self.timer.record(self.name, elapsed_ms, self.counts)
+        return False
+
+    def count(self, **counts):
+        """
+        Adds item counts (pairs generated, bytes parsed, ...) found out mid-stage.
+        """
+        self.counts.update(counts)
+
+    def stop(self, **counts):
+        """
+        Ends a stage begun with StageTimer.start, for stages that don't fit a with block.
+        """
+        self.counts.update(counts)
+        self.__exit__(None, None, None)
+
+
+class StageTimer:
+    """
+    Records stage timings for the current request and keeps rolling samples per stage.
+    """
+
+    def __init__(self, enabled=None, window=WINDOW):
+        if enabled is None:
+            enabled = os.environ.get("SCOUTER_TIMING", "") not in ("", "0")
+        self.enabled = enabled
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def stage(self, name, **counts):
+        """
+        Context manager timing one stage; `counts` are reported alongside it.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, counts)
+
+    def start(self, name, **counts):
+        """
+        Starts timing a stage now; call .stop() on the result to record it.
+        """
+        return self.stage(name, **counts).__enter__()
+
+    def record(self, name, elapsed_ms, counts=None):
+        """
+        Stores one stage timing for the current request and the rolling stats.
+        """
+        with self._lock:
+            self._samples[name].append(elapsed_ms)
+        if has_request_context():
+            g.setdefault("stage_timings", []).append((name, elapsed_ms, counts or {}))
+
+    def summary(self):
+        """
+        Rolling p50/p95/p99 (ms) and sample count for every stage seen so far.
+        """
+        with self._lock:
+            samples = {name: np.array(values) for name, values in self._samples.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50": round(float(np.percentile(values, 50)), 3),
+                "p95": round(float(np.percentile(values, 95)), 3),
+                "p99": round(float(np.percentile(values, 99)), 3),
+            }
+            for name, values in samples.items() if len(values)
+        }
+
+    def init_app(self, app):
+        """
+        Adds the Server-Timing header to responses and the /metrics endpoint.
+        """
+
+        @app.after_request
+        def add_server_timing(response):
+            timings = g.pop("stage_timings", None) if self.enabled else None
+            if timings:
+                response.headers["Server-Timing"] = server_timing_header(timings)
+            return response
+
+        @app.route("/metrics")
+        def metrics():
+            if request.remote_addr not in LOCAL_ADDRESSES:
+                return {"error": "Metrics are only available locally."}, 403
+            return {"enabled": self.enabled, "stages": self.summary()}
+
+        return self
+
+
+def server_timing_header(timings):
+    """
+    Formats [(name, ms, counts), ...] as a Server-Timing header value, e.g.
+    parse;dur=1.234;desc="bytes=5120"
+    """
+    entries = []
+    for name, elapsed_ms, counts in timings:
+        entry = f"{name};dur={elapsed_ms:.3f}"
+        if counts:
+            entry += ';desc="' + " ".join(f"{k}={v}" for k, v in counts.items()) + '"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+
+def parse_server_timing(header):
+    """
+    Reads a Server-Timing header back into {name: ms} (used by benchmark.py).
+    """
+    timings = {}
+    for entry in filter(None, (e.strip() for e in (header or "").split(","))):
+        name, *params = entry.split(";")
+        for param in params:
+            if param.startswith("dur="):
+                timings[name] = timings.get(name, 0.0) + float(param[4:])
+    return timings
@@ -0,0 +1,91 @@
+"""
+Regression checks for the search and loading code. Run with `python -m pytest -q`.
+"""
+import io
+import itertools
+import time
+
+import numpy as np
+
+from allianceOptimizer import alliance_score, top_alliances
+from pairEngine import score_pairs
+from pairRanking import best_opr_pair_ranks, role_pair_ranks
+from scoutingLoader import load_scouting_sheet, stream_scouting_sheets
+
+# Seconds a search may take on a pool that used to defeat its pruning.
+TIME_LIMIT = 1.0
+
+
+def brute_force_scores(sample, specimen, k, size, team=None):
+    scores = [
+        alliance_score(sample, specimen, teams)
+        for teams in itertools.combinations(range(len(sample)), size)
+        if team is None or team in teams
+    ]
+    return sorted(scores, reverse=True)[:k]
+
+
+def test_top_alliances_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for trial in range(300):
+        n = int(rng.integers(4, 12))
+        sample = rng.integers(0, 4, n).astype(float)
+        specimen = sample * 0.5 if trial % 3 == 0 else rng.integers(0, 4, n).astype(float)
+        size = int(rng.integers(2, 5))
+        team = int(rng.integers(n)) if trial % 2 else None
+        found = top_alliances(sample, specimen, 5, size, team=team)
+        assert [score for score, _ in found] == brute_force_scores(sample, specimen, 5, size, team)
+        for score, teams in found:
+            assert score == alliance_score(sample, specimen, teams)
+
+
+def test_top_alliances_fast_on_tied_pools():
+    rng = np.random.default_rng(1)
+    levels = rng.integers(0, 3, 600).astype(float)
+    pools = [
+        (np.zeros(600), np.zeros(600), 4),
+        (np.full(200, 5.0), np.full(200, 5.0), 3),
+        # Everyone better at SAMPLE, so every alliance has a team switching.
+        (levels, levels * 0.5, 4),
+    ]
+    for sample, specimen, size in pools:
+        for team in (None, 7):
+            started = time.perf_counter()
+            found = top_alliances(sample, specimen, 10, size, team=team)
+            assert time.perf_counter() - started < TIME_LIMIT
+            assert len(found) == 10
+
+
+def test_streaming_loader_matches_single_read():
+    sheets = [
+        # Blank and non-numeric OPR cells, a repeated team and a trailing empty row.
+        "x,,\nTeam #, Observed SAMPLEOPR ,Observed SPECIMEN OPR\n11770,4,\n7,,n/a\n11770,5,2\n,,\n",
+        # A team cell that isn't a number keeps every team as text.
+        "x,,\nTeam #,Observed SAMPLEOPR,Observed SPECIMEN OPR\n11770,4,x\n7,,3\n07,1,1\nabc,2,?\n",
+    ]
+    for text in sheets:
+        expected = load_scouting_sheet(io.StringIO(text))
+        for chunksize in (1, 2, 1000):
+            sheet = stream_scouting_sheets(io.StringIO(text), chunksize=chunksize)[None]
+            assert sheet.teams == expected.teams
+            assert sheet.all_teams == expected.all_teams
+            assert np.array_equal(sheet.sample, expected.sample)
+            assert np.array_equal(sheet.specimen, expected.specimen)
+
+
+def brute_force_ranks(pair_scores, scores):
+    return [int(np.sum(pair_scores > x + 1e-9 * max(1.0, abs(x)))) + 1 for x in scores]
+
+
+def test_batch_pair_ranks_match_brute_force():
+    rng = np.random.default_rng(2)
+    for trial in range(100):
+        # Past 32 teams the role count splits the teams into blocks.
+        n = int(rng.integers(2, 90))
+        # Whole numbers give plenty of tied pair scores.
+        sample = rng.integers(0, 5, n).astype(float) if trial % 2 else rng.random(n) * 30
+        specimen = rng.integers(0, 5, n).astype(float) if trial % 2 else rng.random(n) * 30
+        _, scores, ranks = best_opr_pair_ranks(sample)
+        assert ranks.tolist() == brute_force_ranks(score_pairs(sample, sample)[2], scores)
+        _, scores, ranks = role_pair_ranks(sample, specimen)
+        assert ranks.tolist() == brute_force_ranks(score_pairs(sample, specimen)[4], scores)